@@ -34,7 +34,8 @@ def check_auctions(app):
                 now = datetime.utcnow()
 
                 from app.models import db, Item, Bid, Notification, ItemStatus, User
-                from sqlalchemy import or_
+                from app.stats import record_settlement
+                from sqlalchemy import or_, func
 
                 # Find items whose auction has ended but still marked as ACTIVE
                 expired_items = Item.query.filter(Item.end_time <= now,or_(Item.status == ItemStatus.ACTIVE.value, Item.status == ItemStatus.PENDING.value)).all()
@@ -42,6 +43,8 @@ def check_auctions(app):
                 for item in expired_items:
                     # Find the highest bid
                     highest_bid = Bid.query.filter(Bid.item_id == item.id).order_by(Bid.amount.desc()).first()
+                    first_bid_at = db.session.query(func.min(Bid.created_at)).filter(Bid.item_id == item.id).scalar()
+                    record_settlement(item, highest_bid.amount if highest_bid else None, first_bid_at)
 
                     if highest_bid:
                         winner = User.query.get(highest_bid.user_id)
@@ -92,7 +95,7 @@ def check_auctions(app):
 
         time.sleep(60)  # Run every 60 seconds
         
-def create_app():
+def create_app(config_overrides=None):
     import os
     app = Flask(__name__,)
     #app.config.from_object('config')
@@ -102,6 +105,9 @@ def create_app():
 
     # Load the appropriate configuration
     app.config.from_object(config_dict.get(env, 'development'))
+    # Settings that must be in place before the extensions read them, such as the tests' database
+    if config_overrides:
+        app.config.update(config_overrides)
 
     mail.init_app(app)
 
@@ -114,17 +120,47 @@ def create_app():
     login_manager = LoginManager(app)
     login_manager.init_app(app)
 
+    from app.identity import load_identity, clear_identity_cache
+    clear_identity_cache()
+
     @login_manager.user_loader
     def load_user(user_id):
-        return models.User.query.get(int(user_id))
+        return load_identity(int(user_id))
 
     from app import models
+    from app.categories import category_name, invalidate_category_registry
+    invalidate_category_registry()
+    from app.configuration import invalidate_configuration
+    invalidate_configuration()
+    app.jinja_env.globals['category_name'] = category_name
+
     from app.views import views  # Import blueprint
     app.register_blueprint(views, url_prefix='/')
 
-    # Start background thread
+    # Register flask CLI commands
+    from app.commands import notifications_cli, reports_cli, experts_cli, users_cli, bench_cli, export_command
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(experts_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(bench_cli)
+    app.cli.add_command(export_command)
+
+    # Start background threads
     thread = threading.Thread(target=check_auctions, args=(app,), daemon=True)
     thread.start()
 
+    from app.reminders import run_reminder_scheduler
+    reminder_thread = threading.Thread(target=run_reminder_scheduler, args=(app,), daemon=True)
+    reminder_thread.start()
+
+    from app.assignment import run_assignment_engine
+    assignment_thread = threading.Thread(target=run_assignment_engine, args=(app,), daemon=True)
+    assignment_thread.start()
+
+    from app.ledger import run_ledger_snapshots
+    ledger_thread = threading.Thread(target=run_ledger_snapshots, args=(app,), daemon=True)
+    ledger_thread.start()
+
 
     return app
@@ -0,0 +1,171 @@
+import heapq
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, bindparam
+from app import db
+from .models import (User, UserPriority, Item, ItemStatus, ExpertCategory, AuthenticationRequest,
+                     AuthenticationStatus, Notification)
+from .availability import availability_index
+from .identity import invalidate_identity
+
+# Experts are only given work if they are free at some point within this horizon
+ASSIGNMENT_HORIZON = timedelta(days=2)
+# No expert is assigned more than this many open requests by the engine
+MAX_OPEN_REQUESTS = 25
+# How often the background thread runs a pass over the backlog
+ASSIGNMENT_INTERVAL = timedelta(minutes=5)
+# Rows written per statement when saving a plan
+WRITE_BATCH_SIZE = 1000
+
+
+def plan_assignments(backlog, expertise, loads, free_now, free_soon, max_open=MAX_OPEN_REQUESTS):
+    """
+    Match requests to experts in one pass.
+    `backlog` is [(request_id, category, ...)] oldest first and `expertise` maps each expert to the
+    categories they cover. Every category keeps a heap of its experts ordered by open requests,
+    preferring experts free now, so each request goes to the least loaded eligible expert in
+    O(log experts). Heap entries left stale by an assignment made through another category are
+    refreshed when they reach the top. Returns [(request_id, expert_id)].
+    """
+    loads = defaultdict(int, loads)
+    heaps = defaultdict(list)
+    for expert_id, categories in expertise.items():
+        if expert_id in free_soon:
+            for category in categories:
+                heaps[category].append((loads[expert_id], expert_id not in free_now, expert_id))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    plan = []
+    for request_id, category, *_ in backlog:
+        heap = heaps.get(category)
+        while heap:
+            load, later, expert_id = heap[0]
+            if load != loads[expert_id]:
+                heapq.heapreplace(heap, (loads[expert_id], later, expert_id))
+                continue
+            if load >= max_open:
+                heap.clear()  # every expert in this category is full
+                break
+            loads[expert_id] = load + 1
+            heapq.heapreplace(heap, (load + 1, later, expert_id))
+            plan.append((request_id, expert_id))
+            break
+    return plan
+
+
+def load_backlog(session):
+    """Unassigned pending requests, oldest first, as (request id, category id, item id, item name)"""
+    rows = session.execute(
+        select(AuthenticationRequest.id, Item.category_id, Item.id, Item.name)
+        .join(Item, AuthenticationRequest.item_id == Item.id)
+        .where(AuthenticationRequest.expert_id.is_(None),
+               Item.category_id.isnot(None),
+               AuthenticationRequest.status == AuthenticationStatus.PENDING.value,
+               Item.status == ItemStatus.PENDING.value)
+        .order_by(AuthenticationRequest.created_at, AuthenticationRequest.id)
+    )
+    return [tuple(row) for row in rows]
+
+def load_experts(session):
+    """Each expert's categories and their cached number of open requests, in two queries"""
+    expertise = defaultdict(set)
+    rows = session.execute(
+        select(ExpertCategory.user_id, ExpertCategory.category_id)
+        .join(User, ExpertCategory.user_id == User.id)
+        .where(User.priority == UserPriority.EXPERT.value, ExpertCategory.category_id.isnot(None))
+    )
+    for expert_id, category_id in rows:
+        expertise[expert_id].add(category_id)
+    loads = dict(session.execute(
+        select(User.id, User.open_requests).where(User.priority == UserPriority.EXPERT.value, User.open_requests > 0)
+    ).all())
+    return expertise, loads
+
+def save_assignments(session, plan, items, now):
+    """
+    Write a plan with one executemany per batch: set each request's expert (only if it is still
+    unassigned, so a manager's manual choice made meanwhile wins), notify the experts and bump
+    their unread counters. `items` maps request ids to (item id, item name).
+    """
+    requests = AuthenticationRequest.__table__
+    users = User.__table__
+    assigned = 0
+    for start in range(0, len(plan), WRITE_BATCH_SIZE):
+        batch = plan[start:start + WRITE_BATCH_SIZE]
+        session.execute(
+            update(requests)
+            .where(requests.c.id == bindparam('request_id'), requests.c.expert_id.is_(None))
+            .values(expert_id=bindparam('assigned_expert_id'), updated_at=now),
+            [{'request_id': request_id, 'assigned_expert_id': expert_id} for request_id, expert_id in batch]
+        )
+        # Drop any request that someone else assigned between planning and writing
+        written = set(map(tuple, session.execute(
+            select(requests.c.id, requests.c.expert_id).where(requests.c.id.in_([request_id for request_id, _ in batch]))
+        )))
+        batch = [assignment for assignment in batch if assignment in written]
+        if not batch:
+            session.commit()
+            continue
+        assigned += len(batch)
+        session.execute(insert(Notification.__table__), [
+            {'user_id': expert_id, 'item_id': items[request_id][0], 'type': 'authentication',
+             'message': "Please review this item: " + items[request_id][1], 'is_read': False,
+             'occurrences': 1, 'created_at': now}
+            for request_id, expert_id in batch
+        ])
+        # Core statements skip the model events, so the unread and open request counters are updated here
+        counts = defaultdict(int)
+        for _, expert_id in batch:
+            counts[expert_id] += 1
+        session.execute(
+            update(users).where(users.c.id == bindparam('notified_user_id'))
+            .values(unread_notifications=users.c.unread_notifications + bindparam('added'),
+                    open_requests=users.c.open_requests + bindparam('added')),
+            [{'notified_user_id': expert_id, 'added': count} for expert_id, count in counts.items()]
+        )
+        invalidate_identity(*counts)
+        session.commit()
+    return assigned
+
+def assign_backlog(now=None, index=None, session=None, max_open=MAX_OPEN_REQUESTS):
+    """
+    Run one assignment pass over the whole pending backlog.
+    Returns a report with the number of requests assigned, left waiting and the seconds taken.
+    """
+    session = session or db.session
+    now = now or datetime.utcnow()
+    index = index or availability_index()
+    started = time.perf_counter()
+    backlog = load_backlog(session)
+    expertise, loads = load_experts(session)
+    plan = plan_assignments(backlog, expertise, loads, index.free_at(now),
+                            index.free_during(now, now + ASSIGNMENT_HORIZON), max_open)
+    planned = time.perf_counter()
+    items = {request_id: (item_id, name) for request_id, _, item_id, name in backlog}
+    assigned = save_assignments(session, plan, items, now) if plan else 0
+    finished = time.perf_counter()
+    return {
+        'backlog': len(backlog),
+        'assigned': assigned,
+        'waiting': len(backlog) - assigned,
+        'plan_seconds': planned - started,
+        'seconds': finished - started,
+    }
+
+def run_assignment_engine(app):
+    """Background thread that assigns the pending backlog to experts."""
+    # Initial delay to ensure database is set up
+    time.sleep(120)
+    while True:
+        try:
+            with app.app_context():
+                assign_backlog()
+        except Exception as e:
+            # Log the error but don't crash
+            print(f"Error in assignment thread: {e}")
+            with app.app_context():
+                db.session.rollback()
+
+        time.sleep(ASSIGNMENT_INTERVAL.total_seconds())
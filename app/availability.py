@@ -0,0 +1,201 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from app import db
+from .models import ExpertWeeklyWindow, ExpertUnavailability, ExpertAvailability, AvailabilityStatus
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Longest a worker serves an index built before another worker's schedule change
+INDEX_TTL_SECONDS = 60
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class IntervalTree:
+    """
+    Static centred interval tree over any ordered domain. Each interval is kept once, at the
+    highest node whose centre it covers, so memory is linear in the number of intervals, and a
+    point or range lookup descends O(log n) nodes, reporting matches with a binary search at each.
+    """
+
+    def __init__(self, intervals):
+        self.root = self._build([(start, end, user_id) for start, end, user_id in intervals if start < end])
+
+    @classmethod
+    def _build(cls, intervals):
+        """(centre, starts, users by start, ends, users by end, left, right), or None for no intervals"""
+        if not intervals:
+            return None
+        starts = sorted(start for start, _, _ in intervals)
+        centre = starts[len(starts) // 2]
+        left, here, right = [], [], []
+        for interval in intervals:
+            if interval[1] <= centre:
+                left.append(interval)
+            elif interval[0] > centre:
+                right.append(interval)
+            else:
+                here.append(interval)
+        by_start = sorted(here, key=lambda interval: interval[0])
+        by_end = sorted(here, key=lambda interval: interval[1])
+        return (centre, [interval[0] for interval in by_start], [interval[2] for interval in by_start],
+                [interval[1] for interval in by_end], [interval[2] for interval in by_end],
+                cls._build(left), cls._build(right))
+
+    def at(self, point):
+        """Users with an interval covering `point`"""
+        users = set()
+        node = self.root
+        while node is not None:
+            centre, starts, start_users, ends, end_users, left, right = node
+            if point < centre:
+                users.update(start_users[:bisect_right(starts, point)])
+                node = left
+            else:
+                users.update(end_users[bisect_right(ends, point):])
+                node = right if point > centre else None
+        return users
+
+    def overlapping(self, start, end):
+        """Users with an interval overlapping [start, end)"""
+        users = set()
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+            centre, starts, start_users, ends, end_users, left, right = node
+            if end <= centre:
+                users.update(start_users[:bisect_left(starts, end)])
+                nodes.append(left)
+            elif start > centre:
+                users.update(end_users[bisect_right(ends, start):])
+                nodes.append(right)
+            else:
+                users.update(start_users)
+                nodes.extend((left, right))
+        return users
+
+
+def week_minute(when):
+    """Minutes since midnight on Monday"""
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute + when.second / 60
+
+def _week_intervals(weekday, start_minute, end_minute):
+    """A weekly window as minute-of-week intervals, split where it wraps past midnight on Sunday"""
+    start = weekday * MINUTES_PER_DAY + start_minute
+    end = weekday * MINUTES_PER_DAY + end_minute
+    if end_minute <= start_minute:
+        end += MINUTES_PER_DAY
+    if end <= MINUTES_PER_WEEK:
+        return [(start, end)]
+    return [(start, MINUTES_PER_WEEK), (0, end - MINUTES_PER_WEEK)]
+
+
+class AvailabilityIndex:
+    """
+    Answers "who is free at t" and "who is free at some point in [start, end)" from recurring
+    weekly windows and one-off dated slots, less any unavailability exceptions.
+    """
+
+    def __init__(self, windows=(), slots=(), exceptions=()):
+        self.windows = defaultdict(list)  # user_id -> [(start, end)] in minutes of the week
+        for user_id, weekday, start_minute, end_minute in windows:
+            self.windows[user_id].extend(_week_intervals(weekday, start_minute, end_minute))
+        self.slots = defaultdict(list)
+        for user_id, start, end in slots:
+            self.slots[user_id].append((start, end))
+        self.exceptions = defaultdict(list)
+        for user_id, start, end in exceptions:
+            self.exceptions[user_id].append((start, end))
+
+        self.weekly = IntervalTree((start, end, user_id) for user_id, spans in self.windows.items() for start, end in spans)
+        self.dated = IntervalTree((start, end, user_id) for user_id, spans in self.slots.items() for start, end in spans)
+        self.blocked = IntervalTree((start, end, user_id) for user_id, spans in self.exceptions.items() for start, end in spans)
+
+    def free_at(self, when):
+        free = self.weekly.at(week_minute(when))
+        free |= self.dated.at(when)
+        free -= self.blocked.at(when)
+        return free
+
+    def free_during(self, start, end):
+        if end - start >= timedelta(days=7):
+            candidates = set(self.windows)
+        else:
+            first = week_minute(start)
+            last = first + (end - start).total_seconds() / 60
+            candidates = self.weekly.overlapping(first, min(last, MINUTES_PER_WEEK))
+            if last > MINUTES_PER_WEEK:
+                candidates |= self.weekly.overlapping(0, last - MINUTES_PER_WEEK)
+        candidates |= self.dated.overlapping(start, end)
+        # Only experts with an exception in the window need their free time worked out exactly
+        for user_id in candidates & self.blocked.overlapping(start, end):
+            if not self._free_somewhere(user_id, start, end):
+                candidates.discard(user_id)
+        return candidates
+
+    def _free_somewhere(self, user_id, start, end):
+        """Whether any of the user's windows or slots within [start, end) escapes their exceptions"""
+        spans = list(self.slots[user_id])
+        monday = datetime.combine(start.date() - timedelta(days=start.weekday()), datetime.min.time())
+        while monday < end:
+            spans.extend((monday + timedelta(minutes=first), monday + timedelta(minutes=last))
+                         for first, last in self.windows[user_id])
+            monday += timedelta(days=7)
+        blocked = sorted(self.exceptions[user_id])
+        for span_start, span_end in spans:
+            cursor, span_end = max(span_start, start), min(span_end, end)
+            for blocked_start, blocked_end in blocked:
+                if blocked_start >= span_end or cursor >= span_end:
+                    break
+                if blocked_start > cursor:
+                    return True
+                cursor = max(cursor, blocked_end)
+            if cursor < span_end:
+                return True
+        return False
+
+
+def load_availability_index(now=None):
+    """Build an index from the database: weekly windows, dated slots still to come and current exceptions"""
+    now = now or datetime.utcnow()
+    windows = db.session.execute(select(
+        ExpertWeeklyWindow.user_id, ExpertWeeklyWindow.weekday, ExpertWeeklyWindow.start_minute, ExpertWeeklyWindow.end_minute
+    )).all()
+    slots = db.session.execute(select(ExpertAvailability.user_id, ExpertAvailability.start_time, ExpertAvailability.end_time).where(
+        ExpertAvailability.end_time > now, ExpertAvailability.status.is_distinct_from(AvailabilityStatus.UNAVAILABLE)
+    )).all()
+    exceptions = db.session.execute(select(ExpertUnavailability.user_id, ExpertUnavailability.start_time, ExpertUnavailability.end_time).where(
+        ExpertUnavailability.end_time > now
+    )).all()
+    return AvailabilityIndex(windows, slots, exceptions)
+
+
+_index = None
+_index_built = 0.0
+_index_lock = threading.Lock()
+
+def availability_index():
+    """
+    This process's availability index, rebuilt when a schedule changes here or when it is older than
+    INDEX_TTL_SECONDS, so changes saved by other workers show up within a minute.
+    """
+    global _index, _index_built
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built > INDEX_TTL_SECONDS:
+            _index = load_availability_index()
+            _index_built = time.monotonic()
+        return _index
+
+def invalidate_availability_index(*args):
+    global _index
+    _index = None
+
+for _model in (ExpertWeeklyWindow, ExpertUnavailability, ExpertAvailability):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, invalidate_availability_index)
@@ -0,0 +1,62 @@
+from collections import namedtuple
+from sqlalchemy import event, select
+from app import db
+from .models import Category
+from .versioning import VersionedCache, bump_version
+
+# Version row bumped in the same transaction as any category change
+VERSION_KEY = 'category_registry'
+
+# Plain tuples rather than Category rows, so one copy can be shared by every request and thread
+CategoryEntry = namedtuple('CategoryEntry', ['id', 'name', 'description'])
+
+
+class CategoryRegistry:
+    """Every category, loaded once and looked up by id or name without touching the database"""
+
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.categories = sorted(categories, key=lambda category: category.name.lower())
+        self.by_id = {category.id: category for category in self.categories}
+        self.by_name = {category.name: category for category in self.categories}
+
+    def get(self, category_id):
+        return self.by_id.get(category_id)
+
+    def name(self, category_id, default='Uncategorised'):
+        category = self.by_id.get(category_id)
+        return category.name if category else default
+
+    def choices(self):
+        """(id, name) pairs for select fields, in name order"""
+        return [(category.id, category.name) for category in self.categories]
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+
+def load_category_registry(version=None):
+    rows = db.session.execute(select(Category.id, Category.name, Category.description)).all()
+    return CategoryRegistry([CategoryEntry(*row) for row in rows], version)
+
+_registry = VersionedCache(VERSION_KEY, load_category_registry)
+
+def category_registry():
+    """This process's category registry, kept current with every worker's changes"""
+    return _registry.get()
+
+def category_name(category_id, default='Uncategorised'):
+    return category_registry().name(category_id, default)
+
+def invalidate_category_registry(*args):
+    _registry.invalidate()
+
+def _category_changed(mapper, connection, target):
+    bump_version(VERSION_KEY, connection)
+    invalidate_category_registry()
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Category, _event, _category_changed)
@@ -0,0 +1,238 @@
+import os
+import click
+from flask.cli import AppGroup
+from app.exports import EXPORTS, EXPORT_FORMATS, EXPORT_BATCH_SIZE
+
+notifications_cli = AppGroup('notifications', help='Notification maintenance tasks.')
+reports_cli = AppGroup('reports', help='Financial reporting tasks.')
+experts_cli = AppGroup('experts', help='Expert scheduling tasks.')
+users_cli = AppGroup('users', help='User account tasks.')
+bench_cli = AppGroup('bench', help='Throughput benchmarks, run against a throwaway in-memory database.')
+
+@notifications_cli.command('archive')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows moved per transaction.')
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to wait between batches.')
+def archive_notifications_command(batch_size, pause):
+    """Move old notifications into the archive table according to the retention policies."""
+    from app.retention import archive_notifications
+    for report in archive_notifications(batch_size=batch_size, pause=pause):
+        click.echo(f"{report['policy']}: archived {report['rows']} rows in {report['seconds']:.2f}s "
+                   f"({report['rows_per_second']:.0f} rows/s)")
+
+@reports_cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the daily revenue rollup from the payments table."""
+    from app.reports import rebuild_daily_revenue
+    days = rebuild_daily_revenue()
+    click.echo(f"Rebuilt daily revenue for {days} days.")
+
+@reports_cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute seller and category performance statistics from items, bids and payments."""
+    from app.stats import rebuild_performance_stats
+    rows = rebuild_performance_stats()
+    click.echo(f"Rebuilt performance statistics for {rows} sellers and categories.")
+
+@reports_cli.command('snapshot-balances')
+@click.option('--min-entries', default=1, show_default=True, help='Only snapshot sellers with this many new ledger entries.')
+def snapshot_balances_command(min_entries):
+    """Snapshot seller balances so balance reads only total the entries added since."""
+    from app.ledger import snapshot_balances
+    sellers = snapshot_balances(min_entries=min_entries)
+    click.echo(f"Snapshot balances for {sellers} sellers.")
+
+@reports_cli.command('payout')
+@click.argument('seller_id', type=int)
+@click.argument('amount', type=click.FloatRange(min=0.01))
+@click.option('--description', default=None, help="Note shown on the seller's statement.")
+def payout_command(seller_id, amount, description):
+    """Pay a seller out of their ledger balance, refusing anything more than they are owed."""
+    from app.ledger import record_payout, seller_balance
+    try:
+        record_payout(seller_id, amount, description)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Paid seller {seller_id} £{amount:.2f}; balance now £{seller_balance(seller_id).balance:.2f}.")
+
+@experts_cli.command('assign')
+def assign_experts_command():
+    """Assign the pending authentication backlog to available experts."""
+    from app.assignment import assign_backlog
+    report = assign_backlog()
+    click.echo(f"Assigned {report['assigned']} of {report['backlog']} requests in {report['seconds']:.2f}s; "
+               f"{report['waiting']} still waiting.")
+
+@users_cli.command('import')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--processes', default=None, type=int, help='Processes hashing passwords (defaults to one per core).')
+@click.option('--batch-size', default=1000, show_default=True, help='Users inserted per statement.')
+def import_users_command(csv_file, processes, batch_size):
+    """Create users, and experts' categories, from a CSV with columns username, email, password,
+    first_name, last_name, role (user, expert or manager) and categories (separated by ;)."""
+    from app.provisioning import read_users_csv, provision_users
+    try:
+        rows = read_users_csv(csv_file)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='CSV_FILE')
+    report = provision_users(rows, processes=processes, batch_size=batch_size)
+    for line, reason in report['errors']:
+        click.echo(f"line {line}: {reason}", err=True)
+    click.echo(f"Created {report['created']} users and {report['expertise']} expertise links in {report['seconds']:.2f}s "
+               f"({report['users_per_second']:.0f} users/s, {report['hash_seconds']:.2f}s hashing); "
+               f"{len(report['errors'])} rows skipped.")
+
+@click.command('export')
+@click.argument('name', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'format', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default='-', help='File to write, or - for stdout.')
+@click.option('--batch-size', default=EXPORT_BATCH_SIZE, show_default=True, help='Rows fetched per round trip.')
+def export_command(name, format, output, batch_size):
+    """Stream a table out as CSV or NDJSON without loading it into memory."""
+    from app.exports import write_export
+    with click.open_file(output, 'w') as stream:
+        rows, seconds = write_export(name, format, stream, batch_size=batch_size)
+    click.echo(f"Exported {rows} {name} in {seconds:.2f}s ({rows / seconds if seconds else 0:.0f} rows/s)", err=True)
+
+
+def _benchmark_session():
+    """Session on a fresh in-memory SQLite database with the app's schema"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app import db
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    return Session(engine)
+
+@bench_cli.command('export')
+@click.option('--rows', default=200000, show_default=True, help='Number of bids to generate.')
+@click.option('--batch-size', default=2000, show_default=True)
+def bench_export_command(rows, batch_size):
+    """Measure streamed export throughput in rows/sec."""
+    from datetime import datetime
+    from sqlalchemy import insert
+    from app.models import Bid
+    from app.exports import write_export
+    session = _benchmark_session()
+    now = datetime.utcnow()
+    for start in range(0, rows, 10000):
+        session.execute(insert(Bid), [
+            {'item_id': i % 500 + 1, 'user_id': i % 1000 + 1, 'amount': 10.0 + i, 'created_at': now}
+            for i in range(start, min(start + 10000, rows))
+        ])
+    session.commit()
+    for format in ('csv', 'ndjson'):
+        with open(os.devnull, 'w') as sink:
+            written, seconds = write_export('bids', format, sink, batch_size=batch_size, session=session)
+        click.echo(f"{format}: {written} rows in {seconds:.2f}s ({written / seconds:.0f} rows/s)")
+    session.close()
+
+@bench_cli.command('availability')
+@click.option('--experts', default=5000, show_default=True, help='Number of experts to generate.')
+@click.option('--lookups', default=20000, show_default=True, help='Number of point and window lookups to time.')
+def bench_availability_command(experts, lookups):
+    """Measure availability index build time, memory and lookups/sec."""
+    import random
+    import time
+    import tracemalloc
+    from datetime import datetime, timedelta
+    from app.availability import AvailabilityIndex
+    rng = random.Random(0)
+    monday = datetime(2025, 1, 6)
+    windows = [(user_id, weekday, rng.randrange(0, 12) * 60, rng.randrange(13, 24) * 60)
+               for user_id in range(experts) for weekday in range(7) if rng.random() < 0.7]
+    exceptions = [(user_id, monday + timedelta(days=rng.randrange(7)), monday + timedelta(days=rng.randrange(7, 14)))
+                  for user_id in rng.sample(range(experts), experts // 20)]
+    started = time.perf_counter()
+    index = AvailabilityIndex(windows, (), exceptions)
+    seconds = time.perf_counter() - started
+    # Built again under tracemalloc, which slows allocation too much to time the first build with
+    del index
+    tracemalloc.start()
+    index = AvailabilityIndex(windows, (), exceptions)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    click.echo(f"Built index of {len(windows)} windows in {seconds:.2f}s, using {size / 2 ** 20:.1f} MiB")
+    times = [monday + timedelta(minutes=rng.randrange(14 * 24 * 60)) for _ in range(lookups)]
+    started = time.perf_counter()
+    for when in times:
+        index.free_at(when)
+    seconds = time.perf_counter() - started
+    click.echo(f"free_at: {lookups / seconds:.0f} lookups/s")
+    started = time.perf_counter()
+    for when in times[:lookups // 10]:
+        index.free_during(when, when + timedelta(hours=2))
+    seconds = time.perf_counter() - started
+    click.echo(f"free_during (2h): {lookups // 10 / seconds:.0f} lookups/s")
+
+@bench_cli.command('assignment')
+@click.option('--items', default=10000, show_default=True, help='Number of pending items to generate.')
+@click.option('--experts', default=500, show_default=True, help='Number of experts to generate.')
+@click.option('--categories', default=40, show_default=True)
+def bench_assignment_command(items, experts, categories):
+    """Measure one assignment pass over a generated backlog."""
+    import random
+    from datetime import datetime
+    from sqlalchemy import insert
+    from app.models import User, Item, Category, ExpertCategory, AuthenticationRequest, UserPriority, ItemStatus
+    from app.availability import AvailabilityIndex
+    from app.assignment import assign_backlog
+    rng = random.Random(0)
+    session = _benchmark_session()
+    now = datetime.utcnow()
+    session.execute(insert(Category), [{'id': i + 1, 'name': f'Category {i}'} for i in range(categories)])
+    session.execute(insert(User), [
+        {'id': i + 1, 'username': f'expert{i}', 'email': f'expert{i}@example.com', 'password_hash': '-',
+         'priority': UserPriority.EXPERT.value, 'unread_notifications': 0}
+        for i in range(experts)
+    ])
+    session.execute(insert(ExpertCategory), [
+        {'user_id': i + 1, 'category_id': category + 1, 'category': f'Category {category}'}
+        for i in range(experts) for category in rng.sample(range(categories), 3)
+    ])
+    session.execute(insert(Item), [
+        {'id': i + 1, 'name': f'Item {i}', 'seller_id': 1, 'category_id': rng.randrange(categories) + 1,
+         'minimum_price': 10, 'current_price': 10, 'status': ItemStatus.PENDING.value, 'end_time': now}
+        for i in range(items)
+    ])
+    session.execute(insert(AuthenticationRequest), [
+        {'item_id': i + 1, 'requester_id': 1, 'created_at': now} for i in range(items)
+    ])
+    session.commit()
+    # Every expert works every day, a tenth are on holiday
+    index = AvailabilityIndex([(i + 1, day, 0, 0) for i in range(experts) for day in range(7)], (),
+                              [(i + 1, now, now.replace(year=now.year + 1)) for i in range(0, experts, 10)])
+    report = assign_backlog(now=now, index=index, session=session, max_open=items)
+    click.echo(f"Assigned {report['assigned']} of {report['backlog']} requests to {experts} experts: "
+               f"planned in {report['plan_seconds']:.2f}s, {report['seconds']:.2f}s including writes "
+               f"({report['assigned'] / report['seconds']:.0f} requests/s)")
+    session.close()
+
+@bench_cli.command('login')
+@click.option('--logins', default=200, show_default=True, help='Number of password checks to time.')
+@click.option('--clients', default=8, show_default=True, help='Concurrent login requests.')
+@click.option('--method', default=None, help='Hash method to benchmark instead of PASSWORD_HASH_METHOD.')
+def bench_login_command(logins, clients, method):
+    """Measure password checks per second through the verification pool at a given concurrency."""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from flask import current_app
+    from werkzeug.security import generate_password_hash
+    from app.passwords import verify_password, hash_password
+    password = 'correct horse battery staple'
+    password_hash = generate_password_hash(password, method=method) if method else hash_password(password)
+    threads = current_app.config.get('PASSWORD_VERIFY_THREADS')
+    click.echo(f"{password_hash.split('$', 1)[0]} with {threads} verification threads, {clients} clients")
+
+    def login(_):
+        started = time.perf_counter()
+        if not verify_password(password_hash, password):
+            raise click.ClickException("Password check failed; the benchmark hash does not match its password")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = sorted(pool.map(login, range(logins)))
+    seconds = time.perf_counter() - started
+    click.echo(f"{logins} logins in {seconds:.2f}s ({logins / seconds:.1f} logins/s); "
+               f"latency p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, "
+               f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms")
@@ -0,0 +1,97 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import event, select
+from app import db
+from .models import SystemConfiguration, dialect_insert
+from .versioning import VersionedCache, bump_version
+
+Setting = namedtuple('Setting', ['type', 'default', 'description'])
+
+# Every setting the application reads, with the type its stored string is parsed as and the
+# value used when it has not been configured (or cannot be parsed)
+SETTINGS = {
+    'regular_fee_percentage': Setting(float, 0.01, "Fee charged on the sale price of regular items"),
+    'authenticated_fee_percentage': Setting(float, 0.05, "Fee charged on the sale price of authenticated items"),
+}
+# Version row bumped in the same transaction as any change to the settings
+VERSION_KEY = 'configuration'
+
+
+def _parse(setting, value):
+    if setting.type is bool:
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return setting.type(value)
+
+
+class Configuration:
+    """Every configured value, parsed once into its declared type"""
+
+    def __init__(self, values, version=None):
+        self.version = version
+        self.values = {key: setting.default for key, setting in SETTINGS.items()}
+        for key, value in values.items():
+            setting = SETTINGS.get(key)
+            if setting is None:
+                self.values[key] = value
+                continue
+            try:
+                self.values[key] = _parse(setting, value)
+            except ValueError:
+                pass  # a malformed value falls back to the default rather than breaking payments
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+def load_configuration(version=None):
+    """Every key in one query"""
+    values = dict(db.session.execute(select(SystemConfiguration.key, SystemConfiguration.value)).all())
+    return Configuration(values, version)
+
+_configuration = VersionedCache(VERSION_KEY, load_configuration)
+
+def configuration():
+    """This process's configuration, kept current with every worker's changes"""
+    return _configuration.get()
+
+def setting(key):
+    return configuration()[key]
+
+def fee_percentage(authenticated):
+    """Fee charged on a sale, as a fraction of the price"""
+    return setting('authenticated_fee_percentage' if authenticated else 'regular_fee_percentage')
+
+def update_settings(values, updated_by=None):
+    """
+    Save settings and bump their version in one transaction.
+    Values are checked against their declared type first; raises ValueError for unknown keys.
+    """
+    for key, value in values.items():
+        if key not in SETTINGS:
+            raise ValueError(f"Unknown setting '{key}'")
+        _parse(SETTINGS[key], str(value))
+    table = SystemConfiguration.__table__
+    now = datetime.utcnow()
+    rows = [{'key': key, 'value': str(value), 'description': SETTINGS[key].description,
+             'updated_at': now, 'updated_by': updated_by} for key, value in values.items()]
+    stmt = dialect_insert(table).values(rows)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={'value': stmt.excluded.value, 'updated_at': stmt.excluded.updated_at, 'updated_by': stmt.excluded.updated_by}
+    ))
+    bump_version(VERSION_KEY)
+    db.session.commit()
+    invalidate_configuration()
+
+def invalidate_configuration(*args):
+    _configuration.invalidate()
+
+def _configuration_changed(mapper, connection, target):
+    bump_version(VERSION_KEY, connection)
+    invalidate_configuration()
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(SystemConfiguration, _event, _configuration_changed)
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime, date
+from sqlalchemy import select
+from app import db
+from .models import Payment, Bid, Item
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = 2000
+
+# Tables that can be exported, with the columns written in order
+EXPORTS = {
+    'payments': [Payment.id, Payment.item_id, Payment.buyer_id, Payment.seller_id, Payment.amount,
+                 Payment.fee_percentage, Payment.fee_amount, Payment.status, Payment.created_at, Payment.completed_at],
+    'bids': [Bid.id, Bid.item_id, Bid.user_id, Bid.amount, Bid.created_at],
+    'items': [Item.id, Item.name, Item.category_id, Item.seller_id, Item.winner_id, Item.minimum_price,
+              Item.current_price, Item.status, Item.is_authenticated, Item.start_time, Item.end_time, Item.created_at],
+}
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_rows(name, batch_size=EXPORT_BATCH_SIZE, session=None):
+    """
+    Yield the rows of an export as plain tuples, in id order.
+    Streams from a server-side cursor in batches so memory stays flat however big the table is.
+    """
+    columns = EXPORTS[name]
+    query = select(*columns).order_by(columns[0]).execution_options(stream_results=True, yield_per=batch_size)
+    for row in (session or db.session).execute(query):
+        yield tuple(row)
+
+def stream_export(name, format='csv', batch_size=EXPORT_BATCH_SIZE, session=None, progress=None):
+    """
+    Generate an export as text chunks of one batch each, ready for a streamed response.
+    If a `progress` dict is given its 'rows' entry counts the rows written so far.
+    """
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export '{name}'")
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{format}'")
+    headers = [column.key for column in EXPORTS[name]]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == 'csv' else None
+    if writer:
+        writer.writerow(headers)
+
+    pending = 0
+    for row in iter_rows(name, batch_size, session):
+        if writer:
+            writer.writerow(['' if value is None else _plain(value) for value in row])
+        else:
+            buffer.write(json.dumps(dict(zip(headers, map(_plain, row)))))
+            buffer.write('\n')
+        pending += 1
+        if progress is not None:
+            progress['rows'] = progress.get('rows', 0) + 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def write_export(name, format, output, batch_size=EXPORT_BATCH_SIZE, session=None):
+    """Write an export to a file object. Returns (rows written, seconds taken)"""
+    started = time.perf_counter()
+    progress = {'rows': 0}
+    for chunk in stream_export(name, format, batch_size, session, progress):
+        output.write(chunk)
+    return progress['rows'], time.perf_counter() - started
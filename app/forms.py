@@ -1,9 +1,10 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import MultipleFileField, FileAllowed
-from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, DecimalField, TimeField, BooleanField
-from wtforms_sqlalchemy.fields import QuerySelectMultipleField
-from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, NumberRange, Email, Regexp
-from .models import User, Category
+from wtforms import StringField, PasswordField, SubmitField, SelectField, SelectMultipleField, TextAreaField, DecimalField, TimeField, BooleanField, DateField
+from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, NumberRange, Email, Regexp, Optional
+from .models import User
+from .categories import category_registry
+from .money import to_pence, from_pence
 from datetime import datetime
 
 class SignUpForm(FlaskForm):
@@ -43,7 +44,7 @@ class AuctionItemForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(AuctionItemForm, self).__init__(*args, **kwargs)
-        self.category.choices = [(c.id, c.name) for c in Category.query.all()]
+        self.category.choices = category_registry().choices()
 
 class BidItemForm(FlaskForm):
     bid_amount = DecimalField('Bid Amount', validators=[DataRequired()])
@@ -54,9 +55,10 @@ class BidItemForm(FlaskForm):
         self.item_price = item_price  # Store item price for validation
 
     def validate_bid_amount(self, field):
-        min_bid = self.item_price * 1.1 if self.item_price else 0
-        if field.data < min_bid:
-            raise ValidationError(f"Bid must be at least £{min_bid:.2f}.")
+        # 110% of the current price, rounded up to the penny
+        min_bid = -(-to_pence(self.item_price) * 11 // 10) if self.item_price else 0
+        if to_pence(field.data) < min_bid:
+            raise ValidationError(f"Bid must be at least £{from_pence(min_bid):.2f}.")
 
 class AvailabilityForm(FlaskForm):
     sunday_start = TimeField("Sunday Start", format='%H:%M', validators=[DataRequired()])
@@ -84,9 +86,13 @@ class SearchForm(FlaskForm):
     submit = SubmitField('Search')
 
 class CategoryForm(FlaskForm):
-    expert_categories = QuerySelectMultipleField('Select Categories', query_factory=lambda: Category.query.all(), get_label='name')
+    expert_categories = SelectMultipleField('Select Categories', coerce=int)
     submit = SubmitField('Save')
 
+    def __init__(self, *args, **kwargs):
+        super(CategoryForm, self).__init__(*args, **kwargs)
+        self.expert_categories.choices = category_registry().choices()
+
 class AssignExpertForm(FlaskForm):
     expert = SelectField('Select Expert', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Assign Expert')
@@ -109,6 +115,20 @@ class ConfigFeeForm(FlaskForm):
     expert_fee = DecimalField('Expert Approved fee percenatge is 5%', validators=[DataRequired(), NumberRange(min=0, max=100)], places=2)
     submit = SubmitField('Submit')
 
+class FinancialReportForm(FlaskForm):
+    class Meta:
+        csrf = False  # Read-only report filters submitted with GET
+
+    start = DateField('From', validators=[DataRequired()])
+    end = DateField('To', validators=[DataRequired()])
+    group_by = SelectField('Group by', choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month'), ('category', 'Category'), ('authenticated', 'Authenticated vs regular')], validators=[DataRequired()])
+    format = SelectField('Format', choices=[('html', 'Table'), ('json', 'JSON')], default='html', validators=[Optional()])
+    submit = SubmitField('Run report')
+
+    def validate_end(self, end):
+        if self.start.data and end.data and end.data < self.start.data:
+            raise ValidationError("End date must not be before the start date.")
+
 class AuthenticationChatForm(FlaskForm):
     message = TextAreaField("Message", validators=[DataRequired()])
     submit = SubmitField("Send")
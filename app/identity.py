@@ -0,0 +1,116 @@
+import threading
+import time
+from flask import has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+
+# How long a worker keeps a snapshot's display fields (names, counters) that other workers may have changed.
+# Roles are never trusted on age alone: every request checks the user's identity_version first
+IDENTITY_TTL_SECONDS = 30
+# Columns read on nearly every page, kept in the snapshot so they need no query
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'priority', 'unread_notifications',
+                   'open_requests', 'identity_version')
+
+_snapshots = {}  # user id -> (expires at, version, fields)
+_versions = {}   # user id -> bumped on every invalidation, so a load racing a change is not stored
+_lock = threading.Lock()
+
+
+class UserSnapshot(UserMixin):
+    """
+    The logged-in user as seen by Flask-Login: a copy of the SNAPSHOT_FIELDS from the identity cache.
+    Anything else (relationships, card details, password checks) and any assignment goes to the full
+    User row, which is loaded at most once per request the first time it is needed.
+    """
+
+    def __init__(self, fields):
+        object.__setattr__(self, '_fields', fields)
+        object.__setattr__(self, '_user', None)
+
+    def _load(self):
+        if self._user is None:
+            from .models import User
+            object.__setattr__(self, '_user', db.session.get(User, self._fields['id']))
+        return self._user
+
+    def __getattr__(self, name):
+        fields = object.__getattribute__(self, '_fields')
+        if name in fields:
+            return fields[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+        if name in self._fields:
+            self._fields[name] = value
+
+    def get_id(self):
+        return str(self._fields['id'])
+
+    def is_expert(self):
+        from .models import UserPriority
+        return self._fields['priority'] == UserPriority.EXPERT.value
+
+    def is_manager(self):
+        from .models import UserPriority
+        return self._fields['priority'] == UserPriority.MANAGER.value
+
+    def __repr__(self):
+        return f'<UserSnapshot {self._fields["username"]}>'
+
+
+def load_identity(user_id):
+    """
+    Flask-Login user loader. A cached snapshot is used only after a primary-key read of the user's
+    identity_version shows their name, email, password and role are unchanged and they still exist,
+    whichever worker changed them; otherwise the snapshot is reloaded with one narrow query.
+    Every request therefore still pays that one primary-key read; the cache saves loading the row.
+    """
+    from .models import User
+    now = time.monotonic()
+    with _lock:
+        cached = _snapshots.get(user_id)
+        version = _versions.get(user_id, 0)
+    if cached is not None and cached[0] > now:
+        identity_version = db.session.execute(select(User.identity_version).where(User.id == user_id)).scalar()
+        if identity_version is not None and identity_version == cached[2]['identity_version']:
+            return UserSnapshot(dict(cached[2]))
+
+    row = db.session.execute(
+        select(*[getattr(User, field) for field in SNAPSHOT_FIELDS]).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    fields = dict(zip(SNAPSHOT_FIELDS, row))
+    with _lock:
+        if _versions.get(user_id, 0) == version:
+            _snapshots[user_id] = (now + IDENTITY_TTL_SECONDS, version, fields)
+    return UserSnapshot(dict(fields))
+
+def invalidate_identity(*user_ids):
+    """
+    Drop cached snapshots after a user's row changes. Called straight away, and again when the
+    current transaction commits so a request reading between the two cannot cache the old row.
+    """
+    with _lock:
+        for user_id in user_ids:
+            _snapshots.pop(user_id, None)
+            _versions[user_id] = _versions.get(user_id, 0) + 1
+    if has_app_context():
+        db.session.info.setdefault('stale_identities', set()).update(user_ids)
+
+def clear_identity_cache():
+    with _lock:
+        _snapshots.clear()
+        _versions.clear()
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    user_ids = session.info.pop('stale_identities', None)
+    if user_ids:
+        with _lock:
+            for user_id in user_ids:
+                _snapshots.pop(user_id, None)
+                _versions[user_id] = _versions.get(user_id, 0) + 1
@@ -0,0 +1,162 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func, case, literal
+from app import db
+from .models import User, LedgerEntry, LedgerSnapshot
+from .money import to_pence, from_pence, pence
+
+# Sellers get a new snapshot once this many entries have been added since their last one
+SNAPSHOT_EVERY = 100
+# How often the background thread takes snapshots
+SNAPSHOT_INTERVAL = timedelta(hours=1)
+# Snapshots stop at entries this old, so one cannot pass over an entry whose transaction is still open
+SNAPSHOT_SETTLE = timedelta(minutes=1)
+
+Balance = namedtuple('Balance', ['balance', 'sales_total', 'fees_total', 'payouts_total', 'last_entry_id'])
+StatementLine = namedtuple('StatementLine', ['entry', 'balance'])
+
+# Snapshot column and sign of each kind of entry: sales add to the balance, fees and payouts take away
+_TOTALS = {'sale': ('sales_total', 1), 'fee': ('fees_total', -1), 'payout': ('payouts_total', -1)}
+
+
+def sale_entries(payments):
+    """Ledger rows for completed payments: the sale price owed to each seller less the fee taken"""
+    rows = []
+    for payment in payments:
+        rows.append({'seller_id': payment.seller_id, 'kind': 'sale', 'amount': payment.amount,
+                     'payment_id': payment.id, 'created_at': payment.completed_at})
+        if payment.fee_amount:
+            rows.append({'seller_id': payment.seller_id, 'kind': 'fee', 'amount': -payment.fee_amount,
+                         'payment_id': payment.id, 'created_at': payment.completed_at})
+    return rows
+
+def record_sales(payments):
+    """Append the sale and fee entries of flushed payments with one INSERT. Does not commit"""
+    rows = sale_entries(payments)
+    if rows:
+        db.session.execute(insert(LedgerEntry.__table__), rows)
+
+def _latest_snapshot(seller_id):
+    return db.session.execute(
+        select(LedgerSnapshot).where(LedgerSnapshot.seller_id == seller_id)
+        .order_by(LedgerSnapshot.last_entry_id.desc()).limit(1)
+    ).scalars().first()
+
+def _kind_totals():
+    """Sales, fees and payouts as positive totals in pence"""
+    return [func.coalesce(func.sum(case((LedgerEntry.kind == kind, pence(LedgerEntry.amount) * sign), else_=0)), 0)
+            for kind, (_, sign) in _TOTALS.items()]
+
+def _add_snapshot(totals, snapshot):
+    """Totals in pence plus those of a snapshot"""
+    totals = [int(total) for total in totals]
+    if snapshot is None:
+        return totals
+    return [total + to_pence(getattr(snapshot, column)) for total, (column, _) in zip(totals, _TOTALS.values())]
+
+def seller_balance(seller_id):
+    """
+    A seller's balance and totals: their latest snapshot plus the entries added since, which is one
+    index seek and one short index range however long their history is.
+    """
+    snapshot = _latest_snapshot(seller_id)
+    after = snapshot.last_entry_id if snapshot else 0
+    *totals, last_entry_id = db.session.execute(
+        select(*_kind_totals(), func.max(LedgerEntry.id))
+        .where(LedgerEntry.seller_id == seller_id, LedgerEntry.id > after)
+    ).one()
+    sales, fees, payouts = _add_snapshot(totals, snapshot)
+    return Balance(*map(from_pence, (sales - fees - payouts, sales, fees, payouts)), last_entry_id or after)
+
+def statement(seller_id, limit=20):
+    """A seller's most recent entries, newest first, each with the balance after it"""
+    running = to_pence(seller_balance(seller_id).balance)
+    entries = db.session.execute(
+        select(LedgerEntry).where(LedgerEntry.seller_id == seller_id).order_by(LedgerEntry.id.desc()).limit(limit)
+    ).scalars().all()
+    lines = []
+    for entry in entries:
+        lines.append(StatementLine(entry, from_pence(running)))
+        running -= to_pence(entry.amount)
+    return lines
+
+def _balance_pence(seller_id):
+    """A seller's balance in pence as one SQL expression: their latest snapshot plus the entries since"""
+    latest = (select(LedgerSnapshot.balance, LedgerSnapshot.last_entry_id).where(LedgerSnapshot.seller_id == seller_id)
+              .order_by(LedgerSnapshot.last_entry_id.desc()).limit(1))
+    recent = select(func.coalesce(func.sum(pence(LedgerEntry.amount)), 0)).where(
+        LedgerEntry.seller_id == seller_id,
+        LedgerEntry.id > func.coalesce(latest.with_only_columns(LedgerSnapshot.last_entry_id).scalar_subquery(), 0)
+    ).scalar_subquery()
+    return func.coalesce(latest.with_only_columns(pence(LedgerSnapshot.balance)).scalar_subquery(), 0) + recent
+
+def record_payout(seller_id, amount, description=None):
+    """
+    Pay a seller out of their balance. Raises ValueError if it is more than they are owed.
+    The seller's row is locked first (on databases with row locks) so concurrent payouts queue, and the
+    entry is only inserted if the balance read in the same statement covers it, so none can overdraw.
+    """
+    if amount <= 0:
+        raise ValueError("Payouts must be positive")
+    db.session.execute(select(User.id).where(User.id == seller_id).with_for_update())
+    table = LedgerEntry.__table__
+    entry_id = db.session.execute(
+        insert(table).from_select(
+            ['seller_id', 'kind', 'amount', 'description'],
+            select(literal(seller_id), literal('payout'), literal(-amount, table.c.amount.type), literal(description, table.c.description.type))
+            .where(_balance_pence(seller_id) >= to_pence(amount))
+        ).returning(table.c.id)
+    ).scalar()
+    if entry_id is None:
+        db.session.rollback()
+        raise ValueError("Payout is more than the seller's balance")
+    db.session.commit()
+    return db.session.get(LedgerEntry, entry_id)
+
+def snapshot_balances(min_entries=SNAPSHOT_EVERY, settle=SNAPSHOT_SETTLE):
+    """
+    Snapshot every seller with at least `min_entries` entries since their last snapshot, totalling
+    only those new entries in one GROUP BY. Returns the number of snapshots taken.
+    """
+    now = datetime.utcnow()
+    upto = db.session.execute(
+        select(func.max(LedgerEntry.id)).where(LedgerEntry.created_at <= now - settle)
+    ).scalar()
+    if upto is None:
+        return 0
+    latest = (select(LedgerSnapshot.seller_id, func.max(LedgerSnapshot.last_entry_id).label('last_entry_id'))
+              .group_by(LedgerSnapshot.seller_id).subquery())
+    rows = db.session.execute(
+        select(LedgerEntry.seller_id, func.count(), func.max(LedgerEntry.id), *_kind_totals())
+        .outerjoin(latest, latest.c.seller_id == LedgerEntry.seller_id)
+        .where(LedgerEntry.id > func.coalesce(latest.c.last_entry_id, 0), LedgerEntry.id <= upto)
+        .group_by(LedgerEntry.seller_id)
+        .having(func.count() >= min_entries)
+    ).all()
+    snapshots = []
+    for seller_id, _, last_entry_id, *totals in rows:
+        sales, fees, payouts = _add_snapshot(totals, _latest_snapshot(seller_id))
+        snapshots.append({'seller_id': seller_id, 'last_entry_id': last_entry_id,
+                          'balance': from_pence(sales - fees - payouts), 'sales_total': from_pence(sales),
+                          'fees_total': from_pence(fees), 'payouts_total': from_pence(payouts), 'created_at': now})
+    if snapshots:
+        db.session.execute(insert(LedgerSnapshot.__table__), snapshots)
+    db.session.commit()
+    return len(snapshots)
+
+def run_ledger_snapshots(app):
+    """Background thread that keeps sellers' snapshots close to their latest entries."""
+    # Initial delay to ensure database is set up
+    time.sleep(120)
+    while True:
+        try:
+            with app.app_context():
+                snapshot_balances()
+        except Exception as e:
+            # Log the error but don't crash
+            print(f"Error in ledger snapshot thread: {e}")
+            with app.app_context():
+                db.session.rollback()
+
+        time.sleep(SNAPSHOT_INTERVAL.total_seconds())
@@ -1,8 +1,11 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import hash_password, verify_password
 from enum import Enum
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from .identity import invalidate_identity
+from .money import Money
 
 # Enums
 class UserPriority(Enum):
@@ -27,11 +30,18 @@ class AvailabilityStatus(Enum):
     AVAILABLE = "available"
     UNAVAILABLE = "unavailable"
 
+def dialect_insert(table):
+    """INSERT construct for the bound database's dialect, so callers can add ON CONFLICT clauses"""
+    from sqlalchemy.dialects import postgresql, sqlite
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
 # Association tables
 user_watched_auctions = db.Table('user_watched_auctions',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('item_id', db.Integer, db.ForeignKey('items.id'), primary_key=True),
-    db.Column('created_at', db.DateTime, default=datetime.utcnow)
+    db.Column('created_at', db.DateTime, default=datetime.utcnow),
+    db.Index('ix_user_watched_auctions_item_id', 'item_id')
 )
 
 # Models
@@ -51,6 +61,13 @@ class User(db.Model, UserMixin):
     # Card details (optional, for quicker purchase)
     card_number_hash = db.Column(db.String(256))
     card_expiry = db.Column(db.String(10))
+
+    # Denormalised count of unread notifications, kept in step by the Notification events below
+    unread_notifications = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Denormalised count of open authentication requests assigned to an expert, kept by the AuthenticationRequest events
+    open_requests = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped whenever the user's role changes; every worker checks it before trusting a cached identity
+    identity_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Relationships
     items_sold = db.relationship('Item', backref='seller', lazy='dynamic', foreign_keys='Item.seller_id', cascade="all, delete-orphan")
@@ -60,15 +77,17 @@ class User(db.Model, UserMixin):
                                    backref=db.backref('watchers', lazy='dynamic'))
     expertise = db.relationship('ExpertCategory', backref='expert', lazy='dynamic', cascade="all, delete-orphan")
     availability = db.relationship('ExpertAvailability', backref='expert', lazy='dynamic', cascade="all, delete-orphan")
+    weekly_windows = db.relationship('ExpertWeeklyWindow', backref='expert', lazy='dynamic', cascade="all, delete-orphan")
+    unavailability = db.relationship('ExpertUnavailability', backref='expert', lazy='dynamic', cascade="all, delete-orphan")
     authentication_requests = db.relationship('AuthenticationRequest', backref='expert', lazy='dynamic',
                                              foreign_keys='AuthenticationRequest.expert_id')
     notifications = db.relationship('Notification', back_populates='user', cascade="all, delete-orphan")
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def is_expert(self):
         return self.priority == UserPriority.EXPERT.value
@@ -79,15 +98,43 @@ class User(db.Model, UserMixin):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Columns whose change must reach every worker's identity cache at once, not after its TTL
+IDENTITY_FIELDS = ('username', 'email', 'first_name', 'last_name', 'password_hash', 'priority')
+
+@event.listens_for(User, 'before_update')
+def _bump_identity_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in IDENTITY_FIELDS):
+        target.identity_version = (target.identity_version or 0) + 1
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_identity(target.id)
+
+# Case-insensitive prefix search and keyset pagination on the user admin page, with and without a role filter
+db.Index('ix_users_lower_username_id', db.func.lower(User.username), User.id)
+db.Index('ix_users_priority_lower_username_id', User.priority, db.func.lower(User.username), User.id)
+db.Index('ix_users_lower_email', db.func.lower(User.email))
 
 class ExpertCategory(db.Model):
     __tablename__ = 'expert_categories'
+    __table_args__ = (
+        # Finding the experts for an item's category is an integer lookup on this index
+        db.Index('ix_expert_categories_category_id_user_id', 'category_id', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    category = db.Column(db.String(64), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    category = db.Column(db.String(64), nullable=False)  # name when chosen, shown if the category is unlinked
     expertise_description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def category_name(self):
+        return self.category_rel.name if self.category_rel is not None else self.category
     
     def __repr__(self):
         return f'<ExpertCategory {self.category}>'
@@ -108,6 +155,35 @@ class ExpertAvailability(db.Model):
         return f'<ExpertAvailability {self.start_time} to {self.end_time}>'
 
 
+class ExpertWeeklyWindow(db.Model):
+    """A recurring weekly availability window, stored as minutes from midnight of its weekday"""
+    __tablename__ = 'expert_weekly_windows'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    weekday = db.Column(db.SmallInteger, nullable=False)  # 0 = Monday, as datetime.weekday()
+    start_minute = db.Column(db.SmallInteger, nullable=False)
+    end_minute = db.Column(db.SmallInteger, nullable=False)  # at or before start_minute wraps past midnight
+
+    def __repr__(self):
+        return f'<ExpertWeeklyWindow {self.weekday} {self.start_minute}-{self.end_minute}>'
+
+
+class ExpertUnavailability(db.Model):
+    """An exception to an expert's weekly windows, such as a holiday or illness"""
+    __tablename__ = 'expert_unavailability'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    reason = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ExpertUnavailability {self.start_time} to {self.end_time}>'
+
+
 class Category(db.Model):
     __tablename__ = 'categories'
     
@@ -117,6 +193,7 @@ class Category(db.Model):
     
     # Relationships
     items = db.relationship('Item', backref='category_rel', lazy='dynamic')
+    experts = db.relationship('ExpertCategory', backref='category_rel', lazy='dynamic', cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<Category {self.name}>'
@@ -124,13 +201,17 @@ class Category(db.Model):
 
 class Item(db.Model):
     __tablename__ = 'items'
+    __table_args__ = (
+        db.Index('ix_items_status_end_time', 'status', 'end_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
-    minimum_price = db.Column(db.Float, nullable=False)
-    current_price = db.Column(db.Float, nullable=False)
+    # Money columns hold integer pence and read back as pounds
+    minimum_price = db.Column(Money, nullable=False)
+    current_price = db.Column(Money, nullable=False)
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     winner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     status = db.Column(db.Integer, default=ItemStatus.PENDING.value)
@@ -138,6 +219,8 @@ class Item(db.Model):
     end_time = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_authenticated = db.Column(db.Boolean, default=False)
+    # Number of users watching the item, kept in step by app.watchlist and the watched_items events
+    watcher_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Relationships
     bids = db.relationship('Bid', backref='item', lazy='dynamic', cascade="all, delete-orphan")
@@ -199,7 +282,7 @@ class Bid(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -208,6 +291,10 @@ class Bid(db.Model):
 
 class AuthenticationRequest(db.Model):
     __tablename__ = 'authentication_requests'
+    __table_args__ = (
+        # An expert's work queue, oldest first
+        db.Index('ix_authentication_requests_expert_status_created', 'expert_id', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
@@ -241,19 +328,30 @@ class AuthenticationMessage(db.Model):
         return f'<AuthenticationMessage from user {self.sender_id}>'
 
 
+# An item is paid for at most once: only failed attempts may sit alongside its payment
+SETTLED_PAYMENT_WHERE = db.text("status IN ('pending', 'completed')")
+
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_status_completed_at', 'status', 'completed_at'),
+        db.Index('uq_payments_item_id_settled', 'item_id', unique=True,
+                 sqlite_where=SETTLED_PAYMENT_WHERE, postgresql_where=SETTLED_PAYMENT_WHERE),
+        db.Index('uq_payments_idempotency_key', 'idempotency_key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
     buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     fee_percentage = db.Column(db.Float, nullable=False)
-    fee_amount = db.Column(db.Float, nullable=False)
+    fee_amount = db.Column(Money, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
+    # Sent with a payment attempt so a retried or double-submitted request returns the same payment
+    idempotency_key = db.Column(db.String(64))
     
     # Relationships
     item = db.relationship('Item')
@@ -264,8 +362,19 @@ class Payment(db.Model):
         return f'<Payment ${self.amount} for item {self.item_id}>'
 
 
+# Notification types where a user holds at most one unread row per item, updated in place
+COALESCED_NOTIFICATION_TYPES = ('outbid', 'watching', 'ending_soon')
+COALESCED_NOTIFICATION_WHERE = db.text(
+    "is_read = false AND type IN (%s)" % ", ".join(f"'{t}'" for t in COALESCED_NOTIFICATION_TYPES)
+)
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('uq_notifications_unread_coalesced', 'user_id', 'item_id', 'type', unique=True,
+                 sqlite_where=COALESCED_NOTIFICATION_WHERE, postgresql_where=COALESCED_NOTIFICATION_WHERE),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -274,6 +383,7 @@ class Notification(db.Model):
     message = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    occurrences = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # times a coalesced notification has been repeated
     
     # Relationships
     user = db.relationship('User', back_populates='notifications', overlaps="notification,self")
@@ -283,6 +393,201 @@ class Notification(db.Model):
         return f'<Notification for user {self.user_id} type {self.type}>'
 
 
+class NotificationArchive(db.Model):
+    __tablename__ = 'notification_archive'
+
+    # No foreign keys so history outlives users and items
+    id = db.Column(db.Integer, primary_key=True)
+    # Id of the live notification it was moved from, which SQLite may later give to a new notification
+    notification_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    item_id = db.Column(db.Integer)
+    type = db.Column(db.String(50), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    is_read = db.Column(db.Boolean, default=False)
+    occurrences = db.Column(db.Integer, default=1, nullable=False)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    policy = db.Column(db.String(32), nullable=False)  # name of the retention policy that archived it
+
+    def __repr__(self):
+        return f'<NotificationArchive {self.notification_id} for user {self.user_id}>'
+
+
+def _adjust_counter(connection, user_id, delta, column='unread_notifications'):
+    """Shift one of a user's cached counters without loading the user row"""
+    users = User.__table__
+    new_count = users.c[column] + delta
+    connection.execute(
+        users.update()
+        .where(users.c.id == user_id)
+        .values({column: db.case((new_count < 0, 0), else_=new_count)})
+    )
+    invalidate_identity(user_id)
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    if not target.is_read:
+        _adjust_counter(connection, target.user_id, 1)
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, target):
+    history = inspect(target).attrs.is_read.history
+    if not history.has_changes():
+        return
+    was_read = bool(history.deleted[0]) if history.deleted else False
+    if was_read != bool(target.is_read):
+        _adjust_counter(connection, target.user_id, -1 if target.is_read else 1)
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, target):
+    if not target.is_read:
+        _adjust_counter(connection, target.user_id, -1)
+
+
+OPEN_AUTHENTICATION_STATUSES = (AuthenticationStatus.PENDING.value, AuthenticationStatus.SECOND_OPINION.value)
+
+def _is_open(status):
+    return (status if status is not None else AuthenticationStatus.PENDING.value) in OPEN_AUTHENTICATION_STATUSES
+
+@event.listens_for(AuthenticationRequest, 'after_insert')
+def _request_inserted(mapper, connection, target):
+    if target.expert_id is not None and _is_open(target.status):
+        _adjust_counter(connection, target.expert_id, 1, 'open_requests')
+
+@event.listens_for(AuthenticationRequest, 'after_update')
+def _request_updated(mapper, connection, target):
+    state = inspect(target).attrs
+    expert_history, status_history = state.expert_id.history, state.status.history
+    if not expert_history.has_changes() and not status_history.has_changes():
+        return
+    old_expert = expert_history.deleted[0] if expert_history.deleted else target.expert_id
+    old_status = status_history.deleted[0] if status_history.deleted else target.status
+    if old_expert is not None and _is_open(old_status):
+        _adjust_counter(connection, old_expert, -1, 'open_requests')
+    if target.expert_id is not None and _is_open(target.status):
+        _adjust_counter(connection, target.expert_id, 1, 'open_requests')
+
+@event.listens_for(AuthenticationRequest, 'after_delete')
+def _request_deleted(mapper, connection, target):
+    if target.expert_id is not None and _is_open(target.status):
+        _adjust_counter(connection, target.expert_id, -1, 'open_requests')
+
+
+@event.listens_for(User.watched_items, 'append')
+def _watch_appended(user, item, initiator):
+    item.watcher_count = (item.watcher_count or 0) + 1
+
+@event.listens_for(User.watched_items, 'remove')
+def _watch_removed(user, item, initiator):
+    item.watcher_count = max((item.watcher_count or 0) - 1, 0)
+
+
+class DailyRevenue(db.Model):
+    __tablename__ = 'daily_revenue'
+
+    # One row per day of completed payments, kept up to date as payments complete
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(Money, nullable=False, default=0)
+    fees = db.Column(Money, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped on every change, used to cache rendered charts
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailyRevenue {self.day} £{self.revenue}>'
+
+
+class PerformanceStats(db.Model):
+    __tablename__ = 'performance_stats'
+
+    # Running totals per seller or per category, updated as auctions settle and payments complete
+    scope = db.Column(db.String(16), primary_key=True)  # seller, category
+    scope_id = db.Column(db.Integer, primary_key=True)
+    auctions_closed = db.Column(db.Integer, nullable=False, default=0)
+    auctions_sold = db.Column(db.Integer, nullable=False, default=0)
+    hammer_total = db.Column(Money, nullable=False, default=0)
+    authenticated_sold = db.Column(db.Integer, nullable=False, default=0)
+    authenticated_hammer_total = db.Column(Money, nullable=False, default=0)
+    first_bid_count = db.Column(db.Integer, nullable=False, default=0)
+    first_bid_seconds_total = db.Column(db.Float, nullable=False, default=0)
+    fees_total = db.Column(Money, nullable=False, default=0)
+    authenticated_fees_total = db.Column(Money, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def sell_through_rate(self):
+        """Share of closed auctions that found a buyer"""
+        return self.auctions_sold / self.auctions_closed if self.auctions_closed else None
+
+    def average_hammer_price(self):
+        return self.hammer_total / self.auctions_sold if self.auctions_sold else None
+
+    def average_time_to_first_bid(self):
+        """Mean seconds between an auction starting and its first bid"""
+        return self.first_bid_seconds_total / self.first_bid_count if self.first_bid_count else None
+
+    def authentication_uplift(self):
+        """How much higher authenticated items sell for on average than regular ones, as a fraction"""
+        regular_sold = self.auctions_sold - self.authenticated_sold
+        if not self.authenticated_sold or not regular_sold:
+            return None
+        regular_average = (self.hammer_total - self.authenticated_hammer_total) / regular_sold
+        if not regular_average:
+            return None
+        return (self.authenticated_hammer_total / self.authenticated_sold) / regular_average - 1
+
+    def __repr__(self):
+        return f'<PerformanceStats {self.scope} {self.scope_id}>'
+
+
+LEDGER_KINDS = ('sale', 'fee', 'payout')
+
+class LedgerEntry(db.Model):
+    __tablename__ = 'ledger_entries'
+    __table_args__ = (
+        # A seller's entries since their last snapshot are one range of this index
+        db.Index('ix_ledger_entries_seller_id_id', 'seller_id', 'id'),
+    )
+
+    # Append-only record of money owed to sellers: sales add, fees and payouts subtract
+    id = db.Column(db.Integer, primary_key=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(16), nullable=False)  # sale, fee, payout
+    amount = db.Column(Money, nullable=False)  # signed change to the seller's balance
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'))
+    description = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.kind} {self.amount} for seller {self.seller_id}>'
+
+
+class LedgerSnapshot(db.Model):
+    __tablename__ = 'ledger_snapshots'
+    __table_args__ = (
+        db.Index('ix_ledger_snapshots_seller_id_last_entry_id', 'seller_id', 'last_entry_id'),
+    )
+
+    # A seller's totals over every ledger entry up to and including last_entry_id
+    id = db.Column(db.Integer, primary_key=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    last_entry_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(Money, nullable=False, default=0)
+    sales_total = db.Column(Money, nullable=False, default=0)
+    fees_total = db.Column(Money, nullable=False, default=0)
+    payouts_total = db.Column(Money, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LedgerSnapshot seller {self.seller_id} at entry {self.last_entry_id}>'
+
+
+@event.listens_for(LedgerEntry, 'before_update')
+@event.listens_for(LedgerEntry, 'before_delete')
+def _ledger_is_append_only(mapper, connection, target):
+    raise ValueError("Ledger entries cannot be changed; append a correcting entry instead")
+
+
 class SystemConfiguration(db.Model):
     __tablename__ = 'system_configuration'
     
@@ -294,4 +599,15 @@ class SystemConfiguration(db.Model):
     updated_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     
     def __repr__(self):
-        return f'<SystemConfiguration {self.key}={self.value}>'
\ No newline at end of file
+        return f'<SystemConfiguration {self.key}={self.value}>'
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+
+    # One row per process-wide cache, rewritten with a fresh token whenever what it caches changes
+    key = db.Column(db.String(64), primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.key}={self.token}>'
@@ -0,0 +1,68 @@
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from sqlalchemy import BigInteger, Float, type_coerce
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+PENCE_PER_POUND = 100
+
+# Operators whose other operand is a plain number (a sign, a percentage) rather than an amount of money
+_SCALING_OPERATORS = {operators.mul, operators.truediv, operators.floordiv, operators.mod}
+
+
+def to_pence(pounds):
+    """Pounds (a float, Decimal, int or numeric string) as whole pence, rounding halves up"""
+    if pounds is None:
+        return None
+    if isinstance(pounds, int):
+        return pounds * PENCE_PER_POUND
+    pounds = pounds if isinstance(pounds, Decimal) else Decimal(str(pounds))
+    return int((pounds * PENCE_PER_POUND).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_pence(pence):
+    """Whole pence as pounds. Fractions of a penny, from scaling in the database, round to the nearest"""
+    if pence is None:
+        return None
+    return int(round(pence)) / PENCE_PER_POUND
+
+def apply_rate(pounds, rate):
+    """A fraction of an amount, such as a fee, rounded to the penny"""
+    return from_pence(to_pence(Decimal(str(pounds)) * Decimal(str(rate))))
+
+def total_pence(pence):
+    """Exact total of many amounts in pence, summed as a NumPy integer array"""
+    return int(np.asarray(pence, dtype=np.int64).sum())
+
+def pence(column):
+    """A Money column or expression read as its stored pence, for exact arithmetic in Python"""
+    return type_coerce(column, BigInteger)
+
+
+class Money(TypeDecorator):
+    """
+    An amount of money stored as integer pence. Values are written and read as pounds, rounded to
+    the penny on the way in, so sums and comparisons in the database are exact integer arithmetic.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_pence(value)
+
+    def process_result_value(self, value, dialect):
+        return from_pence(value)
+
+    class Comparator(TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            # An amount scaled by a plain number is still an amount
+            if op in _SCALING_OPERATORS and not isinstance(other_comparator.type, Money):
+                return op, self.type
+            return super()._adapt_expression(op, other_comparator)
+
+    comparator_factory = Comparator
+
+    def coerce_compared_value(self, op, value):
+        # `amount * -1` multiplies by -1, not by -1 pound
+        if op in _SCALING_OPERATORS:
+            return Float()
+        return self
@@ -0,0 +1,110 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import select, exists, union_all
+from .models import User, Bid, Notification, user_watched_auctions, COALESCED_NOTIFICATION_WHERE, dialect_insert
+from .identity import invalidate_identity
+
+NOTIFICATIONS_PER_PAGE = 20
+# Rows written per upsert when fanning out, so a bid on a very popular item never builds one huge statement
+WATCHER_FANOUT_BATCH_SIZE = 1000
+
+def notification_page(user_id, page=1, per_page=NOTIFICATIONS_PER_PAGE, unread_only=False):
+    """
+    Return one page of a user's notifications, newest first.
+    Served by the (user_id, created_at) index so the cost does not grow with history.
+    """
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.is_read.isnot(True))
+    query = query.order_by(Notification.created_at.desc(), Notification.id.desc())
+    return query.paginate(page=page, per_page=per_page, error_out=False)
+
+def mark_all_read(user_id):
+    """Mark every unread notification for a user as read with a single UPDATE and reset their counter"""
+    updated = Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.is_read.isnot(True)
+    ).update({Notification.is_read: True}, synchronize_session=False)
+    User.query.filter(User.id == user_id).update({User.unread_notifications: 0}, synchronize_session=False)
+    invalidate_identity(user_id)
+    db.session.commit()
+    return updated
+
+def _coalescing_insert(rows):
+    """
+    Build a single INSERT ... ON CONFLICT DO UPDATE for notifications of a coalesced type.
+    A user's existing unread row for the same item and type takes the new message and moves
+    to the top instead of a duplicate being added. Returns (user_id, occurrences) per row,
+    where an occurrence count of 1 means the row was newly inserted.
+    """
+    table = Notification.__table__
+    stmt = dialect_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.item_id, table.c.type],
+        index_where=COALESCED_NOTIFICATION_WHERE,
+        set_={
+            'message': stmt.excluded.message,
+            'created_at': stmt.excluded.created_at,
+            'occurrences': table.c.occurrences + 1,
+        }
+    ).returning(table.c.user_id, table.c.occurrences)
+
+def _count_new_unread(result):
+    """Bump the cached counters of users whose upserted notification was a fresh row"""
+    new_user_ids = [user_id for user_id, occurrences in result if occurrences == 1]
+    if new_user_ids:
+        User.query.filter(User.id.in_(new_user_ids)).update(
+            {User.unread_notifications: User.unread_notifications + 1}, synchronize_session=False
+        )
+        invalidate_identity(*new_user_ids)
+    return new_user_ids
+
+def notify_coalesced(user_id, item, type, message):
+    """
+    Notify one user, folding the notification into their unread one of the same type for
+    this item if there is one. Does not commit. Returns how many times it has now occurred.
+    """
+    result = db.session.execute(_coalescing_insert([{
+        'user_id': user_id, 'item_id': item.id, 'type': type, 'message': message,
+        'is_read': False, 'created_at': datetime.utcnow(), 'occurrences': 1,
+    }])).all()
+    _count_new_unread(result)
+    return result[0].occurrences
+
+def notify_watchers(item, type, message, exclude_user_ids=(), include_bidders=False, refresh_existing=False, batch_size=WATCHER_FANOUT_BATCH_SIZE):
+    """
+    Send the same notification to everyone watching an item (and optionally everyone who
+    has bid on it) using bulk upserts of `batch_size` rows. Users who already have an unread
+    notification of this type for the item are skipped, or have it updated in place when
+    `refresh_existing` is set. Returns the recipients. Does not commit so the fan-out shares
+    the caller's transaction.
+    """
+    audience = select(user_watched_auctions.c.user_id.label('user_id')).where(user_watched_auctions.c.item_id == item.id)
+    if include_bidders:
+        audience = union_all(audience, select(Bid.user_id).where(Bid.item_id == item.id))
+    audience = audience.subquery()
+
+    already_notified = exists().where(
+        Notification.user_id == audience.c.user_id,
+        Notification.item_id == item.id,
+        Notification.type == type,
+        Notification.is_read.isnot(True)
+    )
+    query = select(audience.c.user_id)
+    if not refresh_existing:
+        query = query.where(~already_notified)
+    excluded = [user_id for user_id in exclude_user_ids if user_id is not None]
+    if excluded:
+        query = query.where(audience.c.user_id.notin_(excluded))
+    recipients = db.session.execute(query.distinct()).scalars().all()
+
+    now = datetime.utcnow()
+    for start in range(0, len(recipients), batch_size):
+        result = db.session.execute(_coalescing_insert([
+            {'user_id': user_id, 'item_id': item.id, 'type': type, 'message': message,
+             'is_read': False, 'created_at': now, 'occurrences': 1}
+            for user_id in recipients[start:start + batch_size]
+        ])).all()
+        # Core inserts skip the mapper events, so bump the cached counters in one statement per batch
+        _count_new_unread(result)
+    return recipients
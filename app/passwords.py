@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Used outside an application context, and when the config does not say otherwise
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+DEFAULT_SALT_LENGTH = 16
+DEFAULT_VERIFY_THREADS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+def hash_password(password):
+    """Hash a password with the configured PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH, on the KDF pool"""
+    return _kdf_pool().submit(generate_password_hash, password,
+                              method=_setting('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD),
+                              salt_length=_setting('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)).result()
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    """The method as werkzeug writes it into hashes, with any default parameters filled in"""
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with other parameters than the ones configured now"""
+    method, _, rest = password_hash.partition('$')
+    salt = rest.partition('$')[0]
+    return (method != _method_prefix(_setting('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD))
+            or len(salt) != _setting('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH))
+
+def _kdf_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_setting('PASSWORD_VERIFY_THREADS', DEFAULT_VERIFY_THREADS),
+                                           thread_name_prefix='password-kdf')
+        return _executor
+
+def verify_password(password_hash, password):
+    """
+    Check a password against its hash on the KDF pool. The calling thread still waits for the
+    answer; what the pool bounds is how many key derivations (checks and hashes alike) run at once
+    in this worker, so a burst of logins and the rehashes after them queue for PASSWORD_VERIFY_THREADS
+    cores instead of competing with every other request for all of them.
+    """
+    return _kdf_pool().submit(check_password_hash, password_hash, password).result()
+
+def shutdown_verifier():
+    """Drop the pool so the next check or hash builds one with the current PASSWORD_VERIFY_THREADS"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
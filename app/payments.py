@@ -0,0 +1,146 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import select, update, insert, func, bindparam
+from sqlalchemy.exc import IntegrityError
+from app import db
+from .models import User, Item, ItemStatus, Bid, Payment, Notification
+from .configuration import fee_percentage
+from .money import apply_rate
+from .identity import invalidate_identity
+from .reports import record_payment, record_payments
+from .stats import record_payment_fees, record_checkout_fees
+from .ledger import record_sales
+
+
+def _existing_payment(item_id=None, idempotency_key=None):
+    query = select(Payment)
+    if idempotency_key is not None:
+        query = query.where(Payment.idempotency_key == idempotency_key)
+    else:
+        query = query.where(Payment.item_id == item_id, Payment.status.in_(['pending', 'completed']))
+    return db.session.execute(query).scalars().first()
+
+def _payment_message(name, amount):
+    return f"Payment completed for '{name}'. Amount: £{amount:.2f}"
+
+def pay_for_item(item_id, buyer_id, idempotency_key=None):
+    """
+    Pay for an item won at auction, exactly once.
+    The item is claimed with a conditional PAYING -> SOLD update, so of any number of concurrent
+    attempts only one goes on to write the payment, its ledger entries, the revenue and statistics
+    rollups and both notifications, all in the same transaction. A repeated attempt (the same idempotency key, or the
+    same buyer after the item is sold) gets the original payment back.
+    Returns (payment, created). Raises ValueError if the item is not awaiting payment from the buyer.
+    """
+    if idempotency_key is not None:
+        payment = _existing_payment(idempotency_key=idempotency_key)
+        if payment is not None:
+            if payment.buyer_id != buyer_id or payment.item_id != item_id:
+                raise ValueError("Idempotency key was used for another payment")
+            return payment, False
+
+    claimed = db.session.execute(
+        update(Item)
+        .where(Item.id == item_id, Item.status == ItemStatus.PAYING.value, Item.winner_id == buyer_id)
+        .values(status=ItemStatus.SOLD.value)
+        .execution_options(synchronize_session='fetch')
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        payment = _existing_payment(item_id=item_id)
+        if payment is not None and payment.buyer_id == buyer_id:
+            return payment, False
+        raise ValueError("Item is not awaiting payment from this user")
+
+    item = db.session.get(Item, item_id)
+    amount = db.session.execute(select(Bid.amount).where(Bid.item_id == item_id, Bid.user_id == buyer_id)
+                                .order_by(Bid.amount.desc()).limit(1)).scalar()
+    if amount is None:
+        amount = item.current_price
+    fee = fee_percentage(item.is_authenticated)
+    now = datetime.utcnow()
+    payment = Payment(item_id=item.id, buyer_id=buyer_id, seller_id=item.seller_id, amount=amount,
+                      fee_percentage=fee, fee_amount=apply_rate(amount, fee), status='completed',
+                      completed_at=now, idempotency_key=idempotency_key)
+    db.session.add(payment)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # Another attempt with the same key, or an earlier payment for the item, got in first
+        db.session.rollback()
+        payment = _existing_payment(item_id, idempotency_key) or _existing_payment(item_id)
+        if payment is not None and payment.buyer_id == buyer_id:
+            return payment, False
+        raise ValueError("Item has already been paid for")
+    record_payment(payment)
+    record_payment_fees(item, payment)
+    record_sales([payment])
+    message = _payment_message(item.name, amount)
+    db.session.add_all([
+        Notification(user_id=item.seller_id, item_id=item.id, type="payment", message=message),
+        Notification(user_id=buyer_id, item_id=item.id, type="payment", message=message),
+    ])
+    db.session.commit()
+    return payment, True
+
+def pay_for_items(item_ids, buyer_id):
+    """
+    Check out several won items in one transaction: one UPDATE claims every item still awaiting
+    payment from the buyer, fees are looked up once per class (regular and authenticated), and the
+    payments, ledger entries, rollups and notifications are each written with one statement.
+    Items already paid for or not won by the buyer are skipped.
+    Returns (payments created, ids of the items skipped).
+    """
+    item_ids = sorted(set(item_ids))
+    items_table = Item.__table__
+    claimed = set(db.session.execute(
+        update(items_table)
+        .where(items_table.c.id.in_(item_ids), items_table.c.status == ItemStatus.PAYING.value,
+               items_table.c.winner_id == buyer_id)
+        .values(status=ItemStatus.SOLD.value)
+        .returning(items_table.c.id)
+    ).scalars()) if item_ids else set()
+    skipped = [item_id for item_id in item_ids if item_id not in claimed]
+    if not claimed:
+        db.session.rollback()
+        return [], skipped
+
+    winning = (select(Bid.item_id, func.max(Bid.amount).label('amount'))
+               .where(Bid.item_id.in_(claimed), Bid.user_id == buyer_id).group_by(Bid.item_id).subquery())
+    items = db.session.execute(
+        select(Item.id, Item.name, Item.seller_id, Item.category_id, Item.is_authenticated,
+               func.coalesce(winning.c.amount, Item.current_price).label('amount'))
+        .outerjoin(winning, winning.c.item_id == Item.id)
+        .where(Item.id.in_(claimed))
+        .order_by(Item.id)
+    ).all()
+    fees = {authenticated: fee_percentage(authenticated) for authenticated in (False, True)}
+    now = datetime.utcnow()
+    payments = [Payment(item_id=item.id, buyer_id=buyer_id, seller_id=item.seller_id, amount=item.amount,
+                        fee_percentage=fees[bool(item.is_authenticated)],
+                        fee_amount=apply_rate(item.amount, fees[bool(item.is_authenticated)]),
+                        status='completed', created_at=now, completed_at=now)
+                for item in items]
+    db.session.add_all(payments)
+    db.session.flush()  # one batched INSERT
+    record_payments(payments)
+    record_checkout_fees(zip(items, payments))
+    record_sales(payments)
+
+    db.session.execute(insert(Notification.__table__), [
+        {'user_id': user_id, 'item_id': item.id, 'type': 'payment', 'message': _payment_message(item.name, item.amount),
+         'is_read': False, 'occurrences': 1, 'created_at': now}
+        for item in items for user_id in (item.seller_id, buyer_id)
+    ])
+    # Core inserts skip the Notification events, so the unread counters are bumped here
+    notified = Counter(item.seller_id for item in items)
+    notified[buyer_id] += len(items)
+    users = User.__table__
+    db.session.execute(
+        update(users).where(users.c.id == bindparam('notified_user_id'))
+        .values(unread_notifications=users.c.unread_notifications + bindparam('added')),
+        [{'notified_user_id': user_id, 'added': count} for user_id, count in notified.items()]
+    )
+    invalidate_identity(*notified)
+    db.session.commit()
+    return payments, skipped
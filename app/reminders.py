@@ -0,0 +1,222 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from app import db
+from .models import Item, ItemStatus
+from .notifications import notify_watchers
+
+# How long before an auction ends watchers and bidders are reminded
+REMINDER_OFFSETS = (timedelta(hours=1), timedelta(minutes=5))
+# How often the scheduler picks up auctions activated by other workers
+SYNC_INTERVAL = timedelta(minutes=5)
+# Seconds between scheduler ticks, which is also how often building it is retried at startup
+REMINDER_TICK_SECONDS = 60
+# Item ids are looked up in chunks of this size when a batch of reminders fires
+FIRE_BATCH_SIZE = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel.
+    Level 0 has one slot per tick and each level above has slots covering a whole turn of the
+    level below. Timers far in the future wait in a coarse slot and cascade down as their time
+    approaches, so adding and firing a timer is O(1) however many are pending. Timers beyond the
+    top level wait in a heap until they come into range.
+    """
+
+    def __init__(self, tick_seconds=60, slots=64, levels=3, start=None):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.overflow = []
+        self.overflow_order = itertools.count()
+        self.due = []
+        self.current_tick = self.to_tick(start or datetime.utcnow())
+        self.size = 0
+
+    def to_tick(self, when):
+        return int((when - _EPOCH).total_seconds()) // self.tick_seconds
+
+    def add(self, when, payload):
+        """Schedule payload to be returned by advance() once `when` has passed"""
+        self._place(self.to_tick(when), payload)
+        self.size += 1
+
+    def _place(self, tick, payload):
+        if tick <= self.current_tick:
+            self.due.append(payload)
+            return
+        for level, wheel in enumerate(self.wheels):
+            span = self.slots ** level
+            if tick // span - self.current_tick // span < self.slots:
+                wheel[(tick // span) % self.slots].append((tick, payload))
+                return
+        heapq.heappush(self.overflow, (tick, next(self.overflow_order), payload))
+
+    def advance(self, now):
+        """Move the wheel up to `now` and return the payloads of every timer that expired"""
+        expired = []
+        target = self.to_tick(now)
+        while self.current_tick < target:
+            self.current_tick += 1
+            self._cascade()
+            slot = self.wheels[0][self.current_tick % self.slots]
+            if slot:
+                expired.extend(payload for _, payload in slot)
+                slot.clear()
+        # Timers added in the past, or cascaded down exactly on their tick
+        expired.extend(self.due)
+        self.due = []
+        self.size -= len(expired)
+        return expired
+
+    def _cascade(self):
+        top_span = self.slots ** (len(self.wheels) - 1)
+        while self.overflow and self.overflow[0][0] // top_span - self.current_tick // top_span < self.slots:
+            tick, _, payload = heapq.heappop(self.overflow)
+            self._place(tick, payload)
+        # Empty coarser slots into finer ones, highest level first
+        for level in range(len(self.wheels) - 1, 0, -1):
+            span = self.slots ** level
+            if self.current_tick % span == 0:
+                slot = self.wheels[level][(self.current_tick // span) % self.slots]
+                entries = list(slot)
+                slot.clear()
+                for tick, payload in entries:
+                    self._place(tick, payload)
+
+    def __len__(self):
+        return self.size
+
+
+class ReminderScheduler:
+    """Keeps one timer per (item, offset) in a TimerWheel and fires them in batches"""
+
+    def __init__(self, offsets=REMINDER_OFFSETS, tick_seconds=60, now=None):
+        self.offsets = tuple(sorted(offsets, reverse=True))
+        self.wheel = TimerWheel(tick_seconds=tick_seconds, start=now)
+        self.scheduled_items = set()
+        self.last_sync = None
+        self.lock = threading.Lock()
+
+    def schedule(self, item_id, end_time, now=None):
+        """Add reminders for an auction, ignoring offsets that have already passed"""
+        now = now or datetime.utcnow()
+        with self.lock:
+            if item_id in self.scheduled_items:
+                return False
+            added = False
+            for index, offset in enumerate(self.offsets):
+                if end_time - offset > now:
+                    self.wheel.add(end_time - offset, (item_id, index))
+                    added = True
+            # The smallest offset always fires last, and clears the item from this set
+            if added:
+                self.scheduled_items.add(item_id)
+        return added
+
+    def rebuild(self, now=None):
+        """Load every active auction from the database, used when the process starts"""
+        now = now or datetime.utcnow()
+        rows = db.session.query(Item.id, Item.end_time).filter(
+            Item.status == ItemStatus.ACTIVE.value,
+            Item.end_time > now
+        ).yield_per(FIRE_BATCH_SIZE)
+        count = sum(1 for item_id, end_time in rows if self.schedule(item_id, end_time, now))
+        self.last_sync = now
+        return count
+
+    def sync(self, now=None):
+        """
+        Pick up auctions that were activated by another worker. Only auctions ending before the
+        largest offset plus one sync interval can have a reminder due, so this is a narrow range
+        scan on the (status, end_time) index rather than a rescan of the items table.
+        """
+        now = now or datetime.utcnow()
+        horizon = now + self.offsets[0] + SYNC_INTERVAL
+        rows = db.session.query(Item.id, Item.end_time).filter(
+            Item.status == ItemStatus.ACTIVE.value,
+            Item.end_time > now,
+            Item.end_time <= horizon
+        )
+        count = sum(1 for item_id, end_time in rows if self.schedule(item_id, end_time, now))
+        self.last_sync = now
+        return count
+
+    def fire_due(self, now=None):
+        """Send every reminder whose time has come and return how many notifications were written"""
+        now = now or datetime.utcnow()
+        with self.lock:
+            expired = self.wheel.advance(now)
+            for item_id, index in expired:
+                if index == len(self.offsets) - 1:
+                    self.scheduled_items.discard(item_id)
+
+        by_offset = {}
+        for item_id, index in expired:
+            by_offset.setdefault(index, []).append(item_id)
+
+        sent = 0
+        for index, item_ids in by_offset.items():
+            label = describe_offset(self.offsets[index])
+            for start in range(0, len(item_ids), FIRE_BATCH_SIZE):
+                # Auctions that were sold, deleted or already ended are simply skipped here
+                items = Item.query.filter(
+                    Item.id.in_(item_ids[start:start + FIRE_BATCH_SIZE]),
+                    Item.status == ItemStatus.ACTIVE.value,
+                    Item.end_time > now
+                ).all()
+                for item in items:
+                    sent += len(notify_watchers(item, "ending_soon",
+                                                f"The auction for '{item.name}' ends in {label}.",
+                                                exclude_user_ids=[item.seller_id],
+                                                include_bidders=True,
+                                                refresh_existing=True))
+                db.session.commit()
+        return sent
+
+
+def describe_offset(offset):
+    minutes = int(offset.total_seconds() // 60)
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        return f"{hours} hour" if hours == 1 else f"{hours} hours"
+    return f"{minutes} minute" if minutes == 1 else f"{minutes} minutes"
+
+
+_scheduler = None
+
+def schedule_item_reminders(item):
+    """Register a newly active auction with this process's scheduler, if it is running"""
+    if _scheduler is not None and item.status == ItemStatus.ACTIVE.value:
+        _scheduler.schedule(item.id, item.end_time)
+
+def run_reminder_scheduler(app):
+    """Background thread that fires ending-soon reminders from the timer wheel."""
+    global _scheduler
+    # Initial delay to ensure database is set up
+    time.sleep(120)
+    scheduler = None
+    while True:
+        try:
+            with app.app_context():
+                now = datetime.utcnow()
+                if scheduler is None:
+                    # Retried every tick until the database can be read; a half-built wheel is thrown away
+                    rebuilt = ReminderScheduler(tick_seconds=REMINDER_TICK_SECONDS)
+                    rebuilt.rebuild(now)
+                    scheduler = _scheduler = rebuilt
+                elif now - scheduler.last_sync >= SYNC_INTERVAL:
+                    scheduler.sync(now)
+                scheduler.fire_due(now)
+        except Exception as e:
+            # Log the error but don't crash
+            print(f"Error in reminder thread: {e}")
+            with app.app_context():
+                db.session.rollback()
+
+        time.sleep(REMINDER_TICK_SECONDS)
@@ -0,0 +1,211 @@
+import io
+import numpy as np
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func, literal, case
+from matplotlib.figure import Figure
+from app import db
+from .models import Payment, DailyRevenue, Item, Category, dialect_insert
+from .money import PENCE_PER_POUND, to_pence, from_pence, pence
+
+# Number of rendered charts kept in memory, one per distinct window and rollup version
+CHART_CACHE_SIZE = 32
+
+REPORT_GROUPINGS = ('day', 'week', 'month', 'category', 'authenticated')
+
+PAYMENTS_PER_PAGE = 50
+
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+
+def record_payment(payment):
+    """
+    Add a completed payment to its day's rollup with a single upsert.
+    Does not commit so the rollup shares the payment's transaction.
+    """
+    record_payments([payment])
+
+def record_payments(payments):
+    """Add completed payments to their days' rollups with one multi-row upsert. Does not commit"""
+    totals = {}
+    for payment in payments:
+        day = (payment.completed_at or datetime.utcnow()).date()
+        revenue, fees, count = totals.get(day, (0, 0, 0))
+        totals[day] = (revenue + to_pence(payment.amount), fees + to_pence(payment.fee_amount), count + 1)
+    if not totals:
+        return
+    table = DailyRevenue.__table__
+    now = datetime.utcnow()
+    stmt = dialect_insert(table).values([
+        {'day': day, 'revenue': from_pence(revenue), 'fees': from_pence(fees), 'payment_count': count,
+         'version': 1, 'updated_at': now}
+        for day, (revenue, fees, count) in totals.items()
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.day],
+        set_={
+            'revenue': table.c.revenue + stmt.excluded.revenue,
+            'fees': table.c.fees + stmt.excluded.fees,
+            'payment_count': table.c.payment_count + stmt.excluded.payment_count,
+            'version': table.c.version + 1,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    ))
+
+def rebuild_daily_revenue():
+    """
+    Recompute every rollup row from the payments table with one GROUP BY. Returns the number of days.
+    Rows are zeroed and overwritten rather than deleted, so every day's version moves past any value
+    a worker may already have cached a chart under.
+    """
+    table = DailyRevenue.__table__
+    day = func.date(Payment.completed_at)
+    db.session.execute(update(table).values(revenue=0, fees=0, payment_count=0, version=table.c.version + 1,
+                                            updated_at=func.current_timestamp()))
+    stmt = dialect_insert(table).from_select(
+        ['day', 'revenue', 'fees', 'payment_count', 'version', 'updated_at'],
+        select(day, func.sum(Payment.amount), func.sum(Payment.fee_amount), func.count(),
+               literal(1), func.current_timestamp())
+        .where(Payment.status == 'completed', Payment.completed_at.isnot(None))
+        .group_by(day)
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.day],
+        set_={'revenue': stmt.excluded.revenue, 'fees': stmt.excluded.fees, 'payment_count': stmt.excluded.payment_count}
+    ))
+    db.session.commit()
+    return DailyRevenue.query.filter(DailyRevenue.payment_count > 0).count()
+
+def revenue_series(start_day, days):
+    """
+    Daily revenue and fees for `days` days from `start_day`, read from the rollup table.
+    Days with no payments are filled with zeros. Returns a JSON-serialisable dict.
+    The window is filled into NumPy integer arrays of pence, so its totals are exact.
+    """
+    end_day = start_day + timedelta(days=days - 1)
+    revenue, fees, payments, versions = (np.zeros(days, dtype=np.int64) for _ in range(4))
+    for row in db.session.execute(
+        select(DailyRevenue.day, pence(DailyRevenue.revenue), pence(DailyRevenue.fees),
+               DailyRevenue.payment_count, DailyRevenue.version)
+        .where(DailyRevenue.day >= start_day, DailyRevenue.day <= end_day)
+    ):
+        offset = (row[0] - start_day).days
+        revenue[offset], fees[offset], payments[offset], versions[offset] = row[1:]
+    return {
+        'days': [(start_day + timedelta(days=offset)).isoformat() for offset in range(days)],
+        'revenue': (revenue / PENCE_PER_POUND).tolist(),
+        'fees': (fees / PENCE_PER_POUND).tolist(),
+        'payments': payments.tolist(),
+        'versions': versions.tolist(),
+        'total_revenue': from_pence(revenue.sum()),
+        'total_fees': from_pence(fees.sum()),
+    }
+
+def payment_page(since, page=1, per_page=PAYMENTS_PER_PAGE):
+    """
+    Return one page of the payments completed since a time, newest first.
+    Served by the (status, completed_at) index so a busy week costs one page, not every payment.
+    """
+    query = Payment.query.filter(Payment.status == 'completed', Payment.completed_at >= since)
+    query = query.order_by(Payment.completed_at.desc(), Payment.id.desc())
+    return query.paginate(page=page, per_page=per_page, error_out=False)
+
+def revenue_chart_svg(series):
+    """
+    Render the revenue and fee series as an SVG line chart.
+    Uses a standalone Figure rather than pyplot's global state so it is safe under threaded workers,
+    and caches the output per window and rollup version so it is only redrawn when payments change.
+    """
+    key = (tuple(series['days']), tuple(series['versions']))
+    with _chart_cache_lock:
+        if key in _chart_cache:
+            _chart_cache.move_to_end(key)
+            return _chart_cache[key]
+
+    figure = Figure(figsize=(10, 5))
+    axes = figure.subplots()
+    axes.plot(series['days'], series['revenue'], marker='o', linestyle='-', linewidth=2, label="Total Revenue (£)")
+    axes.plot(series['days'], series['fees'], marker='s', linestyle='-', linewidth=2, label="Total Earnings (£)", color='blue')
+    axes.grid(True, linestyle='--', alpha=0.7)
+    axes.tick_params(axis='x', labelrotation=45)
+    axes.set_xlabel("Date", fontsize=12)
+    axes.set_ylabel("Amount (£)", fontsize=12)
+    axes.set_title("Revenue and Earnings", fontsize=14)
+    axes.legend(loc='best')
+    # Start the y-axis at 0, with a visible range even when there were no payments
+    axes.set_ylim(bottom=0, top=None if max(series['revenue'] + series['fees']) else 10)
+    figure.tight_layout()
+    buffer = io.StringIO()
+    figure.savefig(buffer, format='svg')
+    svg = buffer.getvalue()
+
+    with _chart_cache_lock:
+        _chart_cache[key] = svg
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return svg
+
+
+def _period_expression(granularity, column):
+    """SQL expression labelling a timestamp with its day, week (starting Monday) or month"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        if granularity == 'week':
+            return func.to_char(func.date_trunc('week', column), 'YYYY-MM-DD')
+        return func.to_char(column, 'YYYY-MM-DD' if granularity == 'day' else 'YYYY-MM')
+    if granularity == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.strftime('%Y-%m-%d' if granularity == 'day' else '%Y-%m', column)
+
+def payment_report(start_day, end_day, group_by='day'):
+    """
+    Completed payment totals between two dates (inclusive), grouped in the database.
+    Only the grouped rows leave the database, found through the (status, completed_at) index,
+    so a year-long report costs the same to send back as a week-long one. Amounts are summed as
+    integer pence, and the grand totals over the groups as NumPy integer arrays.
+    """
+    if group_by not in REPORT_GROUPINGS:
+        raise ValueError(f"Unknown report grouping '{group_by}'")
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+
+    if group_by == 'category':
+        key = func.coalesce(Category.name, 'Uncategorised')
+    elif group_by == 'authenticated':
+        key = case((Item.is_authenticated.is_(True), 'authenticated'), else_='regular')
+    else:
+        key = _period_expression(group_by, Payment.completed_at)
+    key = key.label('key')
+
+    query = select(
+        key,
+        func.count(Payment.id).label('payments'),
+        func.coalesce(func.sum(pence(Payment.amount)), 0).label('revenue'),
+        func.coalesce(func.sum(pence(Payment.fee_amount)), 0).label('fees')
+    ).where(
+        Payment.status == 'completed',
+        Payment.completed_at >= start,
+        Payment.completed_at < end
+    )
+    if group_by == 'category':
+        query = query.join(Item, Payment.item_id == Item.id).outerjoin(Category, Item.category_id == Category.id)
+    elif group_by == 'authenticated':
+        query = query.join(Item, Payment.item_id == Item.id)
+    query = query.group_by(key).order_by(key)
+
+    result = db.session.execute(query).all()
+    payments, revenue, fees = (np.array([row[column] for row in result], dtype=np.int64) for column in (1, 2, 3))
+    rows = [
+        {'key': row.key, 'payments': row.payments, 'revenue': from_pence(row.revenue), 'fees': from_pence(row.fees)}
+        for row in result
+    ]
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'group_by': group_by,
+        'rows': rows,
+        'total_payments': int(payments.sum()),
+        'total_revenue': from_pence(revenue.sum()),
+        'total_fees': from_pence(fees.sum()),
+    }
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, update, bindparam, literal, case, func
+from app import db
+from .models import User, Item, ItemStatus, Notification, NotificationArchive
+from .identity import invalidate_identity
+
+# Rows moved per transaction, kept small so the live table is never locked for long
+ARCHIVE_BATCH_SIZE = 1000
+
+
+class RetentionPolicy:
+    """A named rule for which live notifications may be moved to the archive, and after how long"""
+
+    def __init__(self, name, max_age, condition):
+        self.name = name
+        self.max_age = max_age
+        self.condition = condition  # callable returning a SQL filter on notifications
+
+    def __repr__(self):
+        return f'<RetentionPolicy {self.name} after {self.max_age}>'
+
+
+RETENTION_POLICIES = [
+    RetentionPolicy('read', timedelta(days=30), lambda: Notification.is_read.is_(True)),
+    RetentionPolicy('closed_item', timedelta(days=7), lambda: Notification.item_id.in_(
+        select(Item.id).where(Item.status.in_([ItemStatus.SOLD.value, ItemStatus.EXPIRED.value]))
+    )),
+]
+
+
+def _archive_batch(ids, policy_name, now):
+    """Copy one batch of notifications into the archive and delete them, in a single transaction"""
+    table = Notification.__table__
+    archive = NotificationArchive.__table__
+    db.session.execute(insert(archive).from_select(
+        ['notification_id', 'user_id', 'item_id', 'type', 'message', 'is_read', 'occurrences', 'created_at', 'archived_at', 'policy'],
+        select(table.c.id, table.c.user_id, table.c.item_id, table.c.type, table.c.message, table.c.is_read,
+               table.c.occurrences, table.c.created_at, literal(now, db.DateTime), literal(policy_name))
+        .where(table.c.id.in_(ids))
+    ))
+
+    # Archived unread notifications no longer count towards the navbar badge
+    unread = db.session.execute(
+        select(table.c.user_id, func.count()).where(table.c.id.in_(ids), table.c.is_read.isnot(True)).group_by(table.c.user_id)
+    ).all()
+    if unread:
+        users = User.__table__
+        new_count = users.c.unread_notifications - bindparam('archived')
+        db.session.execute(
+            update(users).where(users.c.id == bindparam('archived_user_id'))
+            .values(unread_notifications=case((new_count < 0, 0), else_=new_count)),
+            [{'archived_user_id': user_id, 'archived': count} for user_id, count in unread]
+        )
+        invalidate_identity(*[user_id for user_id, _ in unread])
+
+    db.session.execute(delete(table).where(table.c.id.in_(ids)))
+    db.session.commit()
+
+
+def archive_notifications(policies=None, batch_size=ARCHIVE_BATCH_SIZE, pause=0.0, now=None):
+    """
+    Apply each retention policy in turn, moving matching notifications into the archive in
+    batches of `batch_size`, each committed on its own. `pause` seconds are slept between batches
+    to leave room for live traffic. Returns one report per policy with the rows moved per second.
+    """
+    now = now or datetime.utcnow()
+    reports = []
+    for policy in (policies or RETENTION_POLICIES):
+        started = time.perf_counter()
+        moved = 0
+        last_id = 0
+        while True:
+            ids = db.session.execute(
+                select(Notification.id).where(
+                    Notification.id > last_id,
+                    Notification.created_at < now - policy.max_age,
+                    policy.condition()
+                ).order_by(Notification.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            _archive_batch(ids, policy.name, now)
+            moved += len(ids)
+            last_id = ids[-1]
+            if pause:
+                time.sleep(pause)
+        elapsed = time.perf_counter() - started
+        reports.append({
+            'policy': policy.name,
+            'rows': moved,
+            'seconds': elapsed,
+            'rows_per_second': moved / elapsed if elapsed else 0.0,
+        })
+    return reports
@@ -0,0 +1,47 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
+from app import db
+from .models import User, UserPriority, Item, ItemStatus, Category, ExpertCategory
+from .availability import availability_index
+
+# How far ahead an expert counts as "soon available" on the manager dashboard
+UPCOMING_WINDOW = timedelta(days=7)
+
+RosterEntry = namedtuple('RosterEntry', ['expert', 'categories', 'available_now', 'available_soon'])
+
+
+def expert_roster(now=None, index=None):
+    """
+    Every expert with their categories and whether they are available now, or free at some point
+    within UPCOMING_WINDOW while unavailable now. Experts and categories come from one outer-join
+    query and availability from the in-memory interval index, so the query count stays constant
+    however many experts there are.
+    """
+    now = now or datetime.utcnow()
+    index = index or availability_index()
+    free_now = index.free_at(now)
+    free_soon = index.free_during(now, now + UPCOMING_WINDOW) - free_now
+    rows = db.session.execute(
+        select(User, func.coalesce(Category.name, ExpertCategory.category))
+        .outerjoin(ExpertCategory, ExpertCategory.user_id == User.id)
+        .outerjoin(Category, ExpertCategory.category_id == Category.id)
+        .where(User.priority == UserPriority.EXPERT.value)
+        .order_by(User.id, ExpertCategory.id)
+    )
+
+    roster = {}
+    for expert, category in rows:
+        entry = roster.get(expert.id)
+        if entry is None:
+            entry = roster[expert.id] = RosterEntry(expert, [], expert.id in free_now, expert.id in free_soon)
+        if category is not None:
+            entry.categories.append(category)
+    return list(roster.values())
+
+def pending_items():
+    """Pending items with their seller and category loaded in the same query"""
+    return Item.query.options(joinedload(Item.seller), joinedload(Item.category_rel)).filter(
+        Item.status == ItemStatus.PENDING.value
+    ).order_by(Item.id).all()
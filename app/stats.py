@@ -0,0 +1,141 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, insert, delete, func
+from app import db
+from .models import Item, ItemStatus, Bid, Payment, PerformanceStats, dialect_insert
+from .categories import category_registry
+from .money import to_pence, from_pence, pence
+
+STAT_COUNTERS = ('auctions_closed', 'auctions_sold', 'hammer_total', 'authenticated_sold', 'authenticated_hammer_total',
+                 'first_bid_count', 'first_bid_seconds_total', 'fees_total', 'authenticated_fees_total')
+# Counters holding money, which are totalled in pence
+MONEY_COUNTERS = ('hammer_total', 'authenticated_hammer_total', 'fees_total', 'authenticated_fees_total')
+
+
+def _scopes(item):
+    """The (scope, scope_id) rows an item's results count towards"""
+    scopes = [('seller', item.seller_id)]
+    if item.category_id is not None:
+        scopes.append(('category', item.category_id))
+    return scopes
+
+def _bump_totals(totals):
+    """Add to many statistics rows with one multi-row upsert. `totals` maps (scope, scope_id) to increments"""
+    if not totals:
+        return
+    table = PerformanceStats.__table__
+    now = datetime.utcnow()
+    stmt = dialect_insert(table).values([
+        dict(scope=scope, scope_id=scope_id, updated_at=now,
+             **{counter: increments.get(counter, 0) for counter in STAT_COUNTERS})
+        for (scope, scope_id), increments in totals.items()
+    ])
+    counters = {counter for increments in totals.values() for counter in increments}
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.scope, table.c.scope_id],
+        set_=dict({counter: table.c[counter] + stmt.excluded[counter] for counter in counters}, updated_at=now)
+    ))
+
+def _bump(item, **increments):
+    """Add to the counters of the item's seller and category rows"""
+    _bump_totals({scope: increments for scope in _scopes(item)})
+
+def record_settlement(item, winning_amount=None, first_bid_at=None):
+    """
+    Count a closed auction. `winning_amount` is the hammer price, or None if nothing sold,
+    and `first_bid_at` is when the first bid arrived. Does not commit.
+    """
+    increments = {'auctions_closed': 1}
+    if winning_amount is not None:
+        increments.update(auctions_sold=1, hammer_total=winning_amount)
+        if item.is_authenticated:
+            increments.update(authenticated_sold=1, authenticated_hammer_total=winning_amount)
+    if first_bid_at is not None and item.start_time is not None:
+        increments.update(first_bid_count=1, first_bid_seconds_total=max(0.0, (first_bid_at - item.start_time).total_seconds()))
+    _bump(item, **increments)
+
+def record_payment_fees(item, payment):
+    """Count the fee taken on a completed payment. Does not commit"""
+    increments = {'fees_total': payment.fee_amount}
+    if item.is_authenticated:
+        increments['authenticated_fees_total'] = payment.fee_amount
+    _bump(item, **increments)
+
+def record_checkout_fees(paid):
+    """Count the fees of many payments at once. `paid` is [(item, payment)]. Does not commit"""
+    totals = defaultdict(lambda: defaultdict(int))
+    for item, payment in paid:
+        fee = to_pence(payment.fee_amount)
+        for scope in _scopes(item):
+            totals[scope]['fees_total'] += fee
+            if item.is_authenticated:
+                totals[scope]['authenticated_fees_total'] += fee
+    _bump_totals({scope: {counter: from_pence(total) for counter, total in increments.items()}
+                  for scope, increments in totals.items()})
+
+def get_stats(scope, scope_id):
+    """Primary-key read of one seller's or category's statistics"""
+    return db.session.get(PerformanceStats, (scope, scope_id))
+
+def rebuild_performance_stats(batch_size=2000):
+    """
+    Recompute every statistics row from items, bids and payments.
+    Closed items are streamed with their first bid time and totalled in memory per seller and category,
+    with money totalled in whole pence.
+    """
+    totals = defaultdict(lambda: dict.fromkeys(STAT_COUNTERS, 0))
+    first_bids = select(Bid.item_id, func.min(Bid.created_at).label('first_bid_at')).group_by(Bid.item_id).subquery()
+    closed = db.session.execute(
+        select(Item.seller_id, Item.category_id, Item.status, pence(Item.current_price).label('current_price'),
+               Item.is_authenticated, Item.start_time, first_bids.c.first_bid_at)
+        .outerjoin(first_bids, first_bids.c.item_id == Item.id)
+        .where(Item.status.in_([ItemStatus.PAYING.value, ItemStatus.SOLD.value, ItemStatus.EXPIRED.value]))
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for row in closed:
+        sold = row.status in (ItemStatus.PAYING.value, ItemStatus.SOLD.value)
+        for key in _scopes(row):
+            counters = totals[key]
+            counters['auctions_closed'] += 1
+            if sold:
+                counters['auctions_sold'] += 1
+                counters['hammer_total'] += row.current_price
+                if row.is_authenticated:
+                    counters['authenticated_sold'] += 1
+                    counters['authenticated_hammer_total'] += row.current_price
+            if row.first_bid_at is not None and row.start_time is not None:
+                counters['first_bid_count'] += 1
+                counters['first_bid_seconds_total'] += max(0.0, (row.first_bid_at - row.start_time).total_seconds())
+
+    fees = db.session.execute(
+        select(Item.seller_id, Item.category_id, Item.is_authenticated, func.sum(pence(Payment.fee_amount)).label('fees'))
+        .join(Item, Payment.item_id == Item.id)
+        .where(Payment.status == 'completed')
+        .group_by(Item.seller_id, Item.category_id, Item.is_authenticated)
+    )
+    for row in fees:
+        for key in _scopes(row):
+            totals[key]['fees_total'] += int(row.fees)
+            if row.is_authenticated:
+                totals[key]['authenticated_fees_total'] += int(row.fees)
+
+    now = datetime.utcnow()
+    db.session.execute(delete(PerformanceStats.__table__))
+    if totals:
+        db.session.execute(insert(PerformanceStats.__table__), [
+            dict(counters, scope=scope, scope_id=scope_id, updated_at=now,
+                 **{counter: from_pence(counters[counter]) for counter in MONEY_COUNTERS})
+            for (scope, scope_id), counters in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+def category_stats():
+    """Every category's statistics with its name, in one indexed read named from the category registry"""
+    registry = category_registry()
+    rows = db.session.execute(
+        select(PerformanceStats).where(PerformanceStats.scope == 'category')
+    ).scalars()
+    named = [(stats, registry.get(stats.scope_id)) for stats in rows]
+    return sorted(((stats, category.name) for stats, category in named if category is not None),
+                  key=lambda row: row[1].lower())
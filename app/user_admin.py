@@ -0,0 +1,51 @@
+from sqlalchemy import select, update, func, or_, and_, tuple_
+from app import db
+from .models import User, UserPriority
+from .identity import invalidate_identity
+
+USERS_PER_PAGE = 50
+
+
+def _prefix_range(expression, prefix):
+    """
+    `expression` starts with `prefix`, written as a range so it can use a plain b-tree index on
+    either database (LIKE 'abc%' only can on SQLite with NOCASE and on PostgreSQL with C collation).
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(expression >= prefix, expression < upper)
+
+def user_page(search=None, role=None, after=None, per_page=USERS_PER_PAGE):
+    """
+    One page of users ordered by lower-cased username, optionally filtered by a case-insensitive
+    username or email prefix and by role. Pages are keyset-paginated: `after` is the id of the last
+    user on the previous page, so every page costs the same to fetch however deep it is.
+    Returns (users, id to pass as `after` for the next page or None).
+    """
+    username = func.lower(User.username)
+    query = select(User)
+    prefix = (search or '').strip().lower()
+    if prefix:
+        query = query.where(or_(_prefix_range(username, prefix), _prefix_range(func.lower(User.email), prefix)))
+    if role is not None:
+        query = query.where(User.priority == role)
+    if after is not None:
+        last = db.session.execute(select(username, User.id).where(User.id == after)).first()
+        if last is not None:
+            query = query.where(tuple_(username, User.id) > tuple_(*last))
+    users = db.session.execute(query.order_by(username, User.id).limit(per_page + 1)).scalars().all()
+    if len(users) > per_page:
+        return users[:per_page], users[per_page - 1].id
+    return users, None
+
+def set_roles(user_ids, role):
+    """Give every listed user the same role with a single UPDATE. Returns the number of users changed"""
+    if role not in [priority.value for priority in UserPriority]:
+        raise ValueError(f"Unknown role {role}")
+    if not user_ids:
+        return 0
+    result = db.session.execute(
+        update(User).where(User.id.in_(user_ids), User.priority != role).values(priority=role, identity_version=User.identity_version + 1)
+    )
+    invalidate_identity(*user_ids)
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,64 @@
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import select
+from app import db
+from .models import CacheVersion, dialect_insert
+
+# How often a worker compares a cache's token with its version row
+VERSION_CHECK_SECONDS = 5
+
+
+def stored_version(key):
+    return db.session.execute(select(CacheVersion.token).where(CacheVersion.key == key)).scalar()
+
+def bump_version(key, connection=None):
+    """
+    Write a fresh token for `key` in the current transaction, so every worker reloads once it commits.
+    Pass the connection when called from a flush event.
+    """
+    table = CacheVersion.__table__
+    stmt = dialect_insert(table).values(key=key, token=uuid.uuid4().hex, updated_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.key], set_={'token': stmt.excluded.token, 'updated_at': stmt.excluded.updated_at}
+    )
+    (connection or db.session).execute(stmt)
+
+
+class VersionedCache:
+    """
+    A value loaded from the database once per worker and shared by its threads. Changes made in this
+    worker invalidate it straight away; changes made by other workers are seen at the next version
+    check, one primary-key read every VERSION_CHECK_SECONDS.
+    `load(token)` builds the value, given the token it was current at.
+    """
+
+    def __init__(self, key, load):
+        self.key = key
+        self.load = load
+        self._value = None
+        self._token = None
+        self._checked_at = 0.0
+        self._generation = 0  # bumped on every invalidation, so a load racing a change is not kept
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            value, token, checked_at, generation = self._value, self._token, self._checked_at, self._generation
+        now = time.monotonic()
+        if value is not None and now - checked_at <= VERSION_CHECK_SECONDS:
+            return value
+        # The token is read before the value, so a change committed in between is caught next check
+        current = stored_version(self.key)
+        if value is None or current != token:
+            value, token = self.load(current), current
+        with self._lock:
+            if self._generation == generation:
+                self._value, self._token, self._checked_at = value, token, now
+        return value
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._value = None
+            self._generation += 1
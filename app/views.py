@@ -3,15 +3,31 @@ from flask import Blueprint
 views = Blueprint("views", __name__)
 
 from app import models, db
-from flask import render_template, flash, request, redirect, url_for
+from flask import render_template, flash, request, redirect, url_for, jsonify, Response, abort, stream_with_context
 from flask_login import login_user, current_user, login_required, logout_user
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
-from .forms import SignUpForm, LogInForm, AuctionItemForm, BidItemForm, AvailabilityForm, CategoryForm, AssignExpertForm, UnavailableForm, AuthenticateForm, PaymentForm, ConfigFeeForm, AccountUpdateForm, AuthenticationChatForm
-from .models import User, Item, ItemStatus, ItemImage, Bid, Notification, AuthenticationRequest, ExpertAvailability, ExpertCategory, UserPriority, AuthenticationMessage, AvailabilityStatus, AuthenticationStatus, Payment, SystemConfiguration, Category
-import os, io, base64
-import matplotlib.pyplot as plt
-from collections import defaultdict
+from .forms import SignUpForm, LogInForm, AuctionItemForm, BidItemForm, AvailabilityForm, CategoryForm, AssignExpertForm, UnavailableForm, AuthenticateForm, PaymentForm, ConfigFeeForm, AccountUpdateForm, AuthenticationChatForm, FinancialReportForm
+from .models import User, Item, ItemStatus, ItemImage, Bid, Notification, AuthenticationRequest, ExpertAvailability, ExpertWeeklyWindow, ExpertUnavailability, ExpertCategory, UserPriority, AuthenticationMessage, AvailabilityStatus, AuthenticationStatus, Payment, Category
+from .passwords import needs_rehash
+from .configuration import fee_percentage, update_settings
+from .payments import pay_for_item, pay_for_items
+from .categories import category_registry, invalidate_category_registry
+from .watchlist import is_watching, watch, unwatch, watched_items
+from .notifications import notification_page, mark_all_read, notify_watchers, notify_coalesced
+from .reminders import schedule_item_reminders
+from .reports import revenue_series, revenue_chart_svg, payment_report, payment_page
+from .exports import EXPORTS, EXPORT_FORMATS, stream_export
+from .stats import get_stats, category_stats
+from .ledger import seller_balance, statement
+from .money import to_pence, from_pence, total_pence
+from .roster import expert_roster, pending_items
+from .availability import WEEKDAYS, invalidate_availability_index
+from .assignment import assign_backlog
+from .user_admin import user_page, set_roles
+from .work_queue import QUEUE_ORDERS, work_queue, queue_entry_json
+import os
+import uuid
 from werkzeug.utils import secure_filename
 
 UPLOAD_FOLDER = 'app/static/uploads'
@@ -77,6 +93,9 @@ def login():
     if form.validate_on_submit():
         User = models.User.query.filter_by(username=form.username.data).first() # Find the user by username
         if User and User.check_password(form.password.data): # Checks if the user exists and password matches
+            if needs_rehash(User.password_hash): # Hashing parameters have changed since the password was set
+                User.set_password(form.password.data)
+                db.session.commit()
             if User.is_manager(): # If user is manager, redirect to manager homepage
                 flash('Successfully Logged In!')
                 login_user(User)
@@ -167,6 +186,8 @@ def list_item():
             authentication = AuthenticationRequest(item_id=new_item.id, requester_id=current_user.id)
             db.session.add(authentication)
             db.session.commit()
+        else:
+            schedule_item_reminders(new_item)
 
         flash('Item listed successfully!', 'success')
         return redirect(url_for('views.home'))
@@ -230,7 +251,7 @@ def auction_detail(item_id):
                 return redirect(url_for('views.auction_detail', item_id=item.id))
 
             # Ensure new bid is strictly greater than the last highest
-            if highest_bid and form.bid_amount.data <= highest_bid.amount:
+            if highest_bid and to_pence(form.bid_amount.data) <= to_pence(highest_bid.amount):
                 flash(f"Your bid must be greater than £{highest_bid.amount:.2f}.", "danger")
                 return redirect(url_for('views.auction_detail', item_id=item.id))
             # Create the new bid
@@ -239,21 +260,22 @@ def auction_detail(item_id):
             item.current_price = form.bid_amount.data
             db.session.commit()
 
-            # Notify the outbid user
+            # Notify the outbid user, folding repeat outbids on this item into one notification
             if highest_bid and highest_bid.user_id != current_user.id:
-                notification = Notification(
-                    user_id=highest_bid.user_id,
-                    item_id=item.id,
-                    type="outbid",
-                    message=f"You have been outbid on '{item.name}'. Current highest bid: £{form.bid_amount.data:.2f}"
-                )
-                db.session.add(notification)
-                db.session.commit()
+                notify_coalesced(highest_bid.user_id, item, "outbid",
+                                 f"You have been outbid on '{item.name}'. Current highest bid: £{form.bid_amount.data:.2f}")
+
+            # Let everyone else watching the item know there is new activity
+            notify_watchers(item, "watching",
+                            f"There is new bidding activity on '{item.name}', which you are watching.",
+                            exclude_user_ids=[current_user.id, highest_bid.user_id if highest_bid else None])
+            db.session.commit()
 
             flash("Bid placed successfully", "success")
             return redirect(url_for('views.auction_detail', item_id=item.id))
 
-    return render_template('auction_detail.html', item=item, form=form, ItemStatus=ItemStatus)
+    watched = current_user.is_authenticated and is_watching(current_user.id, item.id)
+    return render_template('auction_detail.html', item=item, form=form, ItemStatus=ItemStatus, watched=watched)
 
 @views.route('/notifications', methods=['GET'])
 @login_required
@@ -262,8 +284,19 @@ def notifications():
         return redirect(url_for('views.expert'))
     if is_manager_user(current_user):
         return redirect(url_for('views.manager'))
-    notifications = Notification.query.filter(Notification.user_id==current_user.id).all()
-    return render_template('notifications.html', notifications=notifications)
+    page = request.args.get('page', 1, type=int)
+    unread_only = request.args.get('unread') == '1'
+    pagination = notification_page(current_user.id, page=page, unread_only=unread_only)
+    return render_template('notifications.html', notifications=pagination.items, pagination=pagination, unread_only=unread_only)
+
+@views.route('/notifications/mark_all_read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    mark_all_read(current_user.id)
+    flash("All notifications marked as read.", "success")
+    if is_expert_user(current_user):
+        return redirect(url_for('views.expert_notifications'))
+    return redirect(url_for('views.notifications'))
 
 @views.route('/expert', methods=['GET', 'POST'])
 @login_required
@@ -271,18 +304,35 @@ def expert():
     if current_user.priority != UserPriority.EXPERT.value: # Ensure only experts can access page
         flash("Access denied.", "danger")
         return redirect(url_for('views.home'))
-    from sqlalchemy import or_
-    # Query only items pending or second opinion authentication requests assigned to the current expert
-    pending_items = Item.query.join(AuthenticationRequest).filter(
-        AuthenticationRequest.expert_id == current_user.id,
-        or_(
-        AuthenticationRequest.status == AuthenticationStatus.PENDING.value,
-        AuthenticationRequest.status == AuthenticationStatus.SECOND_OPINION.value
-        )
-    ).all()
+    # Page of pending or second opinion requests assigned to the current expert, with names joined in
+    order = request.args.get('order', 'oldest')
+    if order not in QUEUE_ORDERS:
+        order = 'oldest'
+    page = request.args.get('page', 1, type=int)
+    entries, total, pages = work_queue(current_user, order, page)
     # Get expert's categories of expertise
-    expert_categories = [category.category for category in current_user.expertise]
-    return render_template('expert.html', items=pending_items, categories=expert_categories)
+    expert_categories = [expertise.category_name for expertise in current_user.expertise]
+    return render_template('expert.html', entries=entries, total=total, page=page, pages=pages, order=order,
+                           categories=expert_categories, now=datetime.utcnow())
+
+@views.route('/expert/queue.json')
+@login_required
+def expert_queue_data():
+    if current_user.priority != UserPriority.EXPERT.value:
+        return jsonify({'error': 'Access denied.'}), 403
+    order = request.args.get('order', 'oldest')
+    if order not in QUEUE_ORDERS:
+        return jsonify({'error': f"order must be one of {', '.join(QUEUE_ORDERS)}"}), 400
+    page = request.args.get('page', 1, type=int)
+    entries, total, pages = work_queue(current_user, order, page)
+    now = datetime.utcnow()
+    return jsonify({
+        'order': order,
+        'page': page,
+        'pages': pages,
+        'total': total,
+        'entries': [queue_entry_json(entry, now) for entry in entries],
+    })
 
 @views.route('/select_availability', methods=['GET', 'POST'])
 @login_required
@@ -293,7 +343,7 @@ def select_availability():
     form = AvailabilityForm() # Initialize availability and unavilability forms
     unavailable = UnavailableForm()
     if 'available_submit' in request.form:  # Handle availablity schedule submission
-        ExpertAvailability.query.filter_by(user_id=current_user.id).delete() # Clear existing availability
+        ExpertWeeklyWindow.query.filter_by(user_id=current_user.id).delete() # Replace the existing weekly schedule
         availability_data = {
             "Sunday": (form.sunday_start.data, form.sunday_end.data),
             "Monday": (form.monday_start.data, form.monday_end.data),
@@ -303,37 +353,26 @@ def select_availability():
             "Friday": (form.friday_start.data, form.friday_end.data),
             "Saturday": (form.saturday_start.data, form.saturday_end.data),
         }
-        for day, (start, end) in availability_data.items(): # Add new availability
-            new_availability = ExpertAvailability(user_id=current_user.id,
-                                                         day_of_week=day,
-                                                         start_time = datetime.combine(datetime.today(), start),
-                                                         end_time = datetime.combine(datetime.today(), end),
-                                                         status=AvailabilityStatus.AVAILABLE
-                                                        )
-            db.session.add(new_availability)
-            db.session.commit()
+        for day, (start, end) in availability_data.items(): # Add one recurring window per day
+            if start is None or end is None:
+                continue
+            db.session.add(ExpertWeeklyWindow(user_id=current_user.id,
+                                              weekday=WEEKDAYS.index(day),
+                                              start_minute=start.hour * 60 + start.minute,
+                                              end_minute=end.hour * 60 + end.minute))
+        db.session.commit()
+        invalidate_availability_index()
         flash("Availability Added!", "success")
         return redirect(url_for('views.expert')) # Redirect to expert homepage
     elif 'unavailable_submit' in request.form: # Handle unavailablity schedule submission
-        ExpertAvailability.query.filter_by(user_id=current_user.id).delete() # Clear existing availability
-        availability_data = {
-            "Sunday": ("08:00", "20:00"),
-            "Monday": ("08:00", "20:00"),
-            "Tuesday": ("08:00", "20:00"),
-            "Wednesday": ("08:00", "20:00"),
-            "Thursday": ("08:00", "20:00"),
-            "Friday": ("08:00", "20:00"),
-            "Saturday": ("08:00", "20:00"),
-        }
-        for day, (start, end) in availability_data.items(): # Add new unavailability
-            new_availability = ExpertAvailability(user_id=current_user.id,
-                                                         day_of_week=day,
-                                                         start_time = datetime.combine(datetime.today(), datetime.strptime(start, "%H:%M").time()),
-                                                         end_time = datetime.combine(datetime.today(), datetime.strptime(end, "%H:%M").time()),
-                                                         status=AvailabilityStatus.UNAVAILABLE
-                                                        )
-            db.session.add(new_availability)
-            db.session.commit()
+        # Taking the week off is an exception on top of the weekly schedule, which stays in place for afterwards
+        now = datetime.utcnow()
+        db.session.add(ExpertUnavailability(user_id=current_user.id,
+                                            start_time=now,
+                                            end_time=now + timedelta(days=7),
+                                            reason="Week off"))
+        db.session.commit()
+        invalidate_availability_index()
         flash("Availability Added!", "success")
         return redirect(url_for('views.expert')) # Redirect to expert homepage
     return render_template('select_availability.html', form=form, unavailable=unavailable)
@@ -347,8 +386,10 @@ def select_category():
     form = CategoryForm()
     if form.validate_on_submit():
         ExpertCategory.query.filter_by(user_id=current_user.id).delete() # Clear existing categories
-        for category in form.expert_categories.data: # Add selected categories
-            expertise = ExpertCategory(user_id=current_user.id, category=category.name)
+        registry = category_registry()
+        for category_id in form.expert_categories.data: # Add selected categories
+            category = registry.get(category_id)
+            expertise = ExpertCategory(user_id=current_user.id, category_id=category.id, category=category.name)
             db.session.add(expertise)
         db.session.commit()
         flash('Expertise preferences updated!')
@@ -378,6 +419,7 @@ def authenticate_item(item_id):
                                         )
             db.session.add(notification)
             db.session.commit()
+            schedule_item_reminders(item)
             flash('Item marked as genuine', 'success')
             return redirect(url_for('views.expert')) # Redirect to expert homepage
         elif action == 'reject': # If item is rejected
@@ -392,6 +434,7 @@ def authenticate_item(item_id):
                                         )
             db.session.add(notification)
             db.session.commit()
+            schedule_item_reminders(item)
             flash('Item marked as unknown', 'info')
             return redirect(url_for('views.expert')) # Redirect to expert homepage
         elif action == "second_opinion": # If second opinion is requested
@@ -444,21 +487,21 @@ def manager():
     if current_user.priority != UserPriority.MANAGER.value: # Ensure only managers can access page
         flash("Access denied.", "danger")
         return redirect(url_for('views.home'))
-    pending_items = Item.query.filter_by(status=ItemStatus.PENDING.value).all() # Fetch all items that are pending
-    experts = User.query.filter_by(priority=UserPriority.EXPERT.value).all() # Fetch all experts
-    # Create a dictionary mapping expert IDs to their categories then create seperate lists for available and soon to be available experts
-    expert_categories = {
-        expert.id: [category.category for category in expert.expertise] for expert in experts
-    }
-    available_experts = User.query.join(ExpertAvailability).filter(User.priority == UserPriority.EXPERT.value).filter(ExpertAvailability.start_time <= datetime.utcnow()).filter(ExpertAvailability.end_time >= datetime.utcnow()).all()
-    available_categories = {
-        expert.id: [category.category for category in expert.expertise] for expert in available_experts
-    }
-    upcoming_experts = User.query.join(ExpertAvailability).filter(User.priority == UserPriority.EXPERT.value).filter(ExpertAvailability.start_time > datetime.utcnow()).filter(ExpertAvailability.start_time <= datetime.utcnow() + timedelta(days=7)).all()
-    upcoming_categories = {
-        expert.id: [category.category for category in expert.expertise] for expert in upcoming_experts
-    }
-    return render_template('manager.html', items=pending_items, experts=experts, expert_categories=expert_categories, available_experts=available_experts, upcoming_experts=upcoming_experts, available_categories=available_categories, upcoming_categories=upcoming_categories)
+    roster = expert_roster() # Experts with their categories and availability, in one query
+    return render_template('manager.html', items=pending_items(), experts=roster,
+                           available_experts=[entry for entry in roster if entry.available_now],
+                           upcoming_experts=[entry for entry in roster if entry.available_soon],
+                           category_stats=category_stats())
+
+@views.route('/auto_assign_experts', methods=['POST'])
+@login_required
+def auto_assign_experts():
+    if current_user.priority != UserPriority.MANAGER.value: # Ensure only managers can run the engine
+        flash("Access denied.", "danger")
+        return redirect(url_for('views.home'))
+    report = assign_backlog()
+    flash(f"Assigned {report['assigned']} of {report['backlog']} pending items; {report['waiting']} still need an expert.", "success")
+    return redirect(url_for('views.manager'))
 
 @views.route('/assign_expert/<int:item_id>', methods=['GET', 'POST'])
 @login_required
@@ -467,13 +510,11 @@ def assign_expert(item_id):
         flash("Access denied.", "danger")
         return redirect(url_for('views.home'))
     item = Item.query.get_or_404(item_id) # Fetch the item by ID
-    from sqlalchemy import func
     # Fetch experts who can authenticate the item based on category
     experts = User.query.join(ExpertCategory).filter(
-        func.lower(ExpertCategory.category) == func.lower(item.category_rel.name), 
+        ExpertCategory.category_id == item.category_id,
         User.priority == UserPriority.EXPERT.value
     ).all()
-    print(f"Eligible experts for category {item.category_id}: {experts}")
     form = AssignExpertForm()
     form.expert.choices = [(expert.id, expert.username) for expert in experts]  # Show experts in form
     if form.validate_on_submit():
@@ -507,29 +548,19 @@ def configure_fees():
         return redirect(url_for('views.home'))
     form = ConfigFeeForm()
     if form.validate_on_submit(): # Convert fee percentages from form to decimal
-        default_fee = form.default_fee.data / 100
-        expert_fee = form.expert_fee.data / 100
-        for key, value in [('regular_fee_percentage', default_fee), ('authenticated_fee_percentage', expert_fee)]:
-            config = SystemConfiguration.query.filter_by(key=key).first() # Update system configuration with the new fee values
-            if config:
-                config.value = str(value)
-            else:
-                db.session.add(SystemConfiguration(key=key, value=str(value)))
-        db.session.commit()
+        update_settings({'regular_fee_percentage': form.default_fee.data / 100,
+                         'authenticated_fee_percentage': form.expert_fee.data / 100}, updated_by=current_user.id)
         flash("Fee percentages updated successfully", "success")
         return redirect(url_for('views.manager'))
-    config = SystemConfiguration.query.filter_by(key='regular_fee_percentage').first()
-    if config is not None: # Get current fee values from system configuration and populate form
-        form.default_fee.data = float(config.value) * 100
-    else:
-        form.default_fee.data = 1 # If config is empty
-    config = SystemConfiguration.query.filter_by(key='authenticated_fee_percentage').first()
-    if config is not None:
-        form.expert_fee.data = float(config.value) * 100
-    else:
-        form.expert_fee.data = 5 # If config is empty
+    form.default_fee.data = fee_percentage(authenticated=False) * 100 # Populate form with the current fees
+    form.expert_fee.data = fee_percentage(authenticated=True) * 100
     return render_template('configure_fees.html', form=form)
 
+def _weekly_series():
+    """ Rollup series for the past week, including today """
+    start_day = datetime.utcnow().date() - timedelta(days=7)
+    return revenue_series(start_day, 8)
+
 @views.route('/weekly_costs', methods=['GET'])
 @login_required
 def weekly_costs():
@@ -540,72 +571,73 @@ def weekly_costs():
     # Calculate one week ago
     one_week_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=7)
     
-    # Fetch all completed payments from past week
-    payments = Payment.query.filter(Payment.status=='completed', Payment.completed_at >= one_week_ago).all()
-    
-    # Generate list of days in past week - full datetime objects
-    day_objects = [(one_week_ago + timedelta(days=i)) for i in range(8)]  # Include today
-    days = [day.strftime('%Y-%m-%d') for day in day_objects]
-    
-    # Create dictionaries for daily revenue and fees
-    daily_revenue = defaultdict(float)
-    daily_fees = defaultdict(float)
-    
-    # Iterate through the payments and calculate total revenue and fees per day
-    for payment in payments:
-        
-        # Format the date correctly
-        string_date = payment.completed_at.strftime('%Y-%m-%d')
-        
-        daily_revenue[string_date] += payment.amount
-        daily_fees[string_date] += payment.fee_amount
-    
-    
-    # Put data in arrays for plotting
-    revenues = [daily_revenue[day] for day in days]
-    fees = [daily_fees[day] for day in days]
-    
-    
-    # Clear any existing plot
-    plt.clf()
-    plt.close('all')
-    
-    # Create the graph for past week's revenue and earnings
-    plt.figure(figsize=(10,5))
-    plt.plot(days, revenues, marker='o', linestyle='-', linewidth=2, label="Total Revenue (£)")
-    plt.plot(days, fees, marker='s', linestyle='-', linewidth=2, label="Total Earnings (£)", color='blue')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.xticks(rotation=45)
-    plt.xlabel("Date", fontsize=12)
-    plt.ylabel("Amount (£)", fontsize=12)
-    plt.title("Revenue and Earnings in the Past Week", fontsize=14)
-    plt.legend(loc='best')
-    plt.tight_layout()
-    
-    # Set y-axis to start from 0
-    plt.ylim(bottom=0)
-    
-    # If all values are 0, set a visible y range
-    if max(revenues + fees) == 0:
-        plt.ylim(top=10)
-    
-    # Save plot to BytesIO stream with a timestamp to prevent caching
-    img = io.BytesIO()
-    plt.savefig(img, format='png', dpi=100)
-    img.seek(0)
-    plot_path = base64.b64encode(img.getvalue()).decode()
+    # One page of the past week's completed payments; the whole table is in the payments export
+    pagination = payment_page(one_week_ago, page=request.args.get('page', 1, type=int))
     
-    # Calculate total revenue, fees and percentage earnings
-    total_revenue = sum(payment.amount for payment in payments)
-    total_fees = sum(payment.fee_amount for payment in payments)
+    # Daily totals come from the pre-aggregated rollup rather than summing payments here
+    series = _weekly_series()
+    total_revenue = series['total_revenue']
+    total_fees = series['total_fees']
     percentage_earnings = (total_fees / total_revenue * 100) if total_revenue else 0
     
     return render_template('weekly_costs.html', 
-                          payments=payments, 
+                          payments=pagination.items, 
+                          pagination=pagination, 
                           total_revenue=total_revenue, 
                           total_fees=total_fees, 
                           percentage_earnings=percentage_earnings, 
-                          plot_path=plot_path)
+                          series=series)
+
+@views.route('/weekly_costs/data.json', methods=['GET'])
+@login_required
+def weekly_costs_data():
+    """ Daily revenue and fees for the past week as JSON, for client-side charting """
+    if current_user.priority != UserPriority.MANAGER.value:
+        return jsonify({'error': 'Access denied.'}), 403
+    return jsonify(_weekly_series())
+
+@views.route('/weekly_costs/chart.svg', methods=['GET'])
+@login_required
+def weekly_costs_chart():
+    """ Server-rendered chart of the past week, cached until the rollup changes """
+    if current_user.priority != UserPriority.MANAGER.value:
+        return Response(status=403)
+    svg = revenue_chart_svg(_weekly_series())
+    return Response(svg, mimetype='image/svg+xml', headers={'Cache-Control': 'private, max-age=60'})
+
+@views.route('/financial_report', methods=['GET'])
+@login_required
+def financial_report():
+    """ Payment totals for any date range, grouped by period, category or authentication """
+    if current_user.priority != UserPriority.MANAGER.value:
+        flash("Access denied.", "danger")
+        return redirect(url_for('views.home'))
+    form = FinancialReportForm(request.args)
+    report = None
+    if request.args and form.validate():
+        report = payment_report(form.start.data, form.end.data, form.group_by.data)
+        if form.format.data == 'json':
+            return jsonify(report)
+    elif request.args and form.format.data == 'json':
+        return jsonify({'errors': form.errors}), 400
+    elif not request.args: # Default to the last 30 days by day
+        form.end.data = datetime.utcnow().date()
+        form.start.data = form.end.data - timedelta(days=29)
+    return render_template('financial_report.html', form=form, report=report)
+
+@views.route('/export/<name>.<format>', methods=['GET'])
+@login_required
+def export_data(name, format):
+    """ Stream a whole table as CSV or NDJSON without loading it into memory """
+    if current_user.priority != UserPriority.MANAGER.value:
+        flash("Access denied.", "danger")
+        return redirect(url_for('views.home'))
+    if name not in EXPORTS or format not in EXPORT_FORMATS:
+        abort(404)
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d')}.{format}"
+    return Response(stream_with_context(stream_export(name, format)),
+                    mimetype=EXPORT_FORMATS[format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 @views.route('/manage_users', methods=['GET','POST'])
 @login_required
@@ -613,19 +645,24 @@ def manage_users():
     if current_user.priority != UserPriority.MANAGER.value: # Ensure only managers can access page
         flash("Access denied.", "danger")
         return redirect(url_for('views.home'))
-    user_id = request.form.get('user_id') # Retreive form data
-    new_role = request.form.get('new_role')
-    users = User.query.all() # Get all users
+    search = request.args.get('q', '').strip()
+    role = request.args.get('role', type=int)
     if request.method == "POST":
-        user = User.query.filter_by(id=user_id).first()
-        if user: # If user found, update user's role
-            user.priority = int(new_role)
-            db.session.commit()
-            flash("Successfully updated role!", "success")
+        # One user's role from the row form, or many from the checkboxes, always as a single UPDATE
+        user_ids = request.form.getlist('user_ids', type=int) or request.form.getlist('user_id', type=int)
+        new_role = request.form.get('new_role', type=int)
+        if not user_ids:
+            flash("No users selected", "danger")
         else:
-            flash("No users found", "danger")
-        return redirect(url_for("views.manager")) # Redirect to manager homepage
-    return render_template('manage_users.html', users=users, UserPriority=UserPriority)
+            try:
+                changed = set_roles(user_ids, new_role)
+            except ValueError:
+                flash("Unknown role", "danger")
+            else:
+                flash(f"Successfully updated role for {changed} user{'s' if changed != 1 else ''}!", "success")
+        return redirect(url_for("views.manage_users", q=search or None, role=role, after=request.args.get('after')))
+    users, next_after = user_page(search, role, request.args.get('after', type=int))
+    return render_template('manage_users.html', users=users, UserPriority=UserPriority, search=search, role=role, next_after=next_after)
 
 @views.route('/basket', methods=['GET', 'POST'])
 @login_required
@@ -637,11 +674,30 @@ def basket():
     paying_items = Item.query.filter(Item.status == ItemStatus.PAYING.value, Item.winner_id == current_user.id).all()
     return render_template('basket.html', paying_items = paying_items)
 
+@views.route('/checkout', methods=['POST'])
+@login_required
+def checkout():
+    """ Pay for every selected basket item in one go with the saved card """
+    item_ids = request.form.getlist('item_ids', type=int)
+    if not item_ids:
+        flash("Select the items you want to pay for.", "warning")
+        return redirect(url_for('views.basket'))
+    if not (current_user.card_number_hash and current_user.card_expiry):
+        flash("Save your card details with a single payment first to pay for several items at once.", "warning")
+        return redirect(url_for('views.basket'))
+    payments, skipped = pay_for_items(item_ids, current_user.id)
+    if payments:
+        paid = from_pence(total_pence([to_pence(payment.amount) for payment in payments]))
+        flash(f"Paid £{paid:.2f} for {len(payments)} items.", "success")
+    if skipped:
+        flash(f"{len(skipped)} items were already paid for or are not in your basket.", "info")
+    return redirect(url_for('views.basket'))
+
 @views.route('/my_watched')
 @login_required
 def my_watched():
-    watched_items = current_user.watched_items.filter(Item.status == ItemStatus.ACTIVE.value).all()
-    return render_template('my_watched.html', items=watched_items, active_page='my_watched')
+    items = watched_items(current_user.id, ItemStatus.ACTIVE.value)
+    return render_template('my_watched.html', items=items, active_page='my_watched')
 
 
 @views.route('/payment_interface/<int:item_id>', methods=['GET', 'POST'])
@@ -654,8 +710,9 @@ def payment_interface(item_id):
     form = PaymentForm()
     item = Item.query.get_or_404(item_id)
     #check if user has saved data
+    key = uuid.uuid4().hex # Identifies this payment attempt, so a retried redirect cannot pay twice
     if current_user.card_number_hash and current_user.card_expiry:
-        return redirect(url_for('views.process_payment', item_id=item.id))
+        return redirect(url_for('views.process_payment', item_id=item.id, key=key))
 
     if form.validate_on_submit():
         if form.save_card.data == '1':
@@ -663,7 +720,7 @@ def payment_interface(item_id):
             current_user.card_expiry = f"{form.expiry_month.data}/{form.expiry_year.data}"
             db.session.commit()
             flash("Card details saved successfully!", "success")
-        return redirect(url_for('views.process_payment', item_id=item.id))
+        return redirect(url_for('views.process_payment', item_id=item.id, key=key))
 
     return render_template('payment_interface.html', form=form)
 
@@ -671,71 +728,23 @@ def payment_interface(item_id):
 @login_required
 def process_payment(item_id):
     item = Item.query.get_or_404(item_id)
-    # Ensure the current user is the highest bidder
-    highest_bid = Bid.query.filter_by(item_id=item.id).order_by(Bid.amount.desc()).first()
-    
-    if highest_bid and highest_bid.user_id == current_user.id:
-        # Get fee percentage from system configuration
-        config = SystemConfiguration.query.filter_by(key='regular_fee_percentage').first()
-        if config is not None:
-            fee_percentage = float(config.value)
-        else:
-            fee_percentage = 0.01
-        if item.is_authenticated:
-            config = SystemConfiguration.query.filter_by(key="authenticated_fee_percentage").first()
-            if config is not None:
-                fee_percentage = float(config.value)
-            else:
-                fee_percentage = 0.05
-            
-        fee_amount = highest_bid.amount * fee_percentage
-        
-        # Create payment record
-        payment = Payment(
-            item_id=item.id,
-            buyer_id=current_user.id,
-            seller_id=item.seller_id,
-            amount=highest_bid.amount,
-            fee_percentage=fee_percentage,
-            fee_amount=fee_amount,
-            status='completed',
-            completed_at=datetime.utcnow()
-        )
-        
-        db.session.add(payment)
-        db.session.commit()
-        
-        # Send notification to seller
-        seller_notification = Notification(
-            user_id=item.seller_id,
-            item_id=item.id,
-            type="payment",
-            message=f"Payment completed for '{item.name}'. Amount: £{highest_bid.amount:.2f}"
-        )
-        #send notification to buyer
-        buyer_notification = Notification(
-            user_id=item.winner_id,
-            item_id=item.id,
-            type="payment",
-            message=f"Payment completed for '{item.name}'. Amount: £{highest_bid.amount:.2f}"
-        )
-        item.status = ItemStatus.SOLD.value
-        db.session.add(buyer_notification)
-        db.session.add(seller_notification)
-        db.session.commit()
-        
-        flash("Payment processed successfully!", "success")
-        return redirect(url_for('views.home'))
-    else:
+    # Safe to repeat: only the winning bidder's first attempt (or first use of a key) creates a payment
+    try:
+        payment, created = pay_for_item(item.id, current_user.id, request.values.get('key'))
+    except ValueError:
         flash("You are not authorized to make this payment.", "danger")
         return redirect(url_for('views.basket'))
+    if created:
+        flash("Payment processed successfully!", "success")
+    else:
+        flash("This item has already been paid for.", "info")
+    return redirect(url_for('views.home'))
 
 @views.route('/watch_item/<int:item_id>', methods=['POST'])
 @login_required
 def watch_item(item_id):
     item = Item.query.get_or_404(item_id)
-    current_user.watched_items.append(item)
-    db.session.commit()
+    watch(current_user.id, item.id)
     flash(f"Added '{item.name}' to your watchlist!", "success")
     return redirect(url_for('views.auction_detail', item_id=item_id))
 
@@ -743,8 +752,7 @@ def watch_item(item_id):
 @login_required
 def unwatch_item(item_id):
     item = Item.query.get_or_404(item_id)
-    current_user.watched_items.remove(item)
-    db.session.commit()
+    unwatch(current_user.id, item.id)
     flash(f"Removed '{item.name}' from your watchlist.", "info")
     return redirect(url_for('views.auction_detail', item_id=item_id))
 
@@ -755,7 +763,7 @@ def watching():
         return redirect(url_for('views.expert'))
     if is_manager_user(current_user):
         return redirect(url_for('views.manager'))
-    active_items = [item for item in current_user.watched_items if item.status == ItemStatus.ACTIVE.value]
+    active_items = watched_items(current_user.id, ItemStatus.ACTIVE.value)
     return render_template('watching.html', items=active_items)
 
 @views.route('/account', methods=['GET', 'POST'])
@@ -797,8 +805,10 @@ def expert_notifications():
      if current_user.priority != UserPriority.EXPERT.value:
         flash("Access denied.", "danger")
         return redirect(url_for('views.home'))
-     notifications = Notification.query.filter(Notification.user_id==current_user.id).all()
-     return render_template('expert_notifications.html', notifications=notifications)
+     page = request.args.get('page', 1, type=int)
+     unread_only = request.args.get('unread') == '1'
+     pagination = notification_page(current_user.id, page=page, unread_only=unread_only)
+     return render_template('expert_notifications.html', notifications=pagination.items, pagination=pagination, unread_only=unread_only)
 
 @views.route('/expert_account', methods=['GET', 'POST'])
 @login_required
@@ -887,7 +897,10 @@ def my_auctions():
         active_auctions=active_auctions,
         sold_auctions=sold_auctions,
         expired_auctions=expired_auctions,
-        won_auctions=won_auctions
+        won_auctions=won_auctions,
+        stats=get_stats('seller', current_user.id),
+        balance=seller_balance(current_user.id),
+        statement=statement(current_user.id)
     )
 
 @views.route('/delete_auction/<int:item_id>', methods=['POST'])
@@ -922,8 +935,6 @@ def manage_categories():
         flash("Access denied.", "danger")
         return redirect(url_for('views.home'))
 
-    categories = Category.query.all()
-
     if request.method == 'POST':
         category_name = request.form.get('category_name').strip()
 
@@ -935,11 +946,12 @@ def manage_categories():
             new_category = Category(name=category_name)
             db.session.add(new_category)
             db.session.commit()
+            invalidate_category_registry()
             flash("Category added successfully!", "success")
 
         return redirect(url_for('views.manage_categories'))
 
-    return render_template('manage_categories.html', categories=categories)
+    return render_template('manage_categories.html', categories=category_registry())
 
 
 
@@ -958,6 +970,7 @@ def delete_category(category_id):
     
     db.session.delete(category)
     db.session.commit()
+    invalidate_category_registry()
     flash("Category deleted successfully!", "success")
 
     return redirect(url_for('views.manage_categories'))
\ No newline at end of file
@@ -0,0 +1,54 @@
+from datetime import datetime
+from sqlalchemy import select, exists, delete, update, case
+from sqlalchemy.orm import selectinload
+from app import db
+from .models import Item, user_watched_auctions, dialect_insert
+
+
+def is_watching(user_id, item_id):
+    """Whether a user watches an item: one primary key lookup, however long their watchlist is"""
+    table = user_watched_auctions
+    return db.session.execute(
+        select(exists().where(table.c.user_id == user_id, table.c.item_id == item_id))
+    ).scalar()
+
+def _bump_watchers(item_id, delta):
+    new_count = Item.watcher_count + delta
+    db.session.execute(
+        update(Item).where(Item.id == item_id)
+        .values(watcher_count=case((new_count < 0, 0), else_=new_count))
+        .execution_options(synchronize_session=False)
+    )
+
+def watch(user_id, item_id):
+    """
+    Add an item to a user's watchlist with a single INSERT, ignoring one that is already there,
+    and count the new watcher. Returns True if the item was not watched before.
+    """
+    stmt = dialect_insert(user_watched_auctions).values(
+        user_id=user_id, item_id=item_id, created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['user_id', 'item_id'])
+    added = db.session.execute(stmt).rowcount > 0
+    if added:
+        _bump_watchers(item_id, 1)
+    db.session.commit()
+    return added
+
+def unwatch(user_id, item_id):
+    """Remove an item from a user's watchlist with a single DELETE. Returns True if it was watched"""
+    table = user_watched_auctions
+    removed = db.session.execute(
+        delete(table).where(table.c.user_id == user_id, table.c.item_id == item_id)
+    ).rowcount > 0
+    if removed:
+        _bump_watchers(item_id, -1)
+    db.session.commit()
+    return removed
+
+def watched_items(user_id, status=None):
+    """A user's watched items, most recently watched first, optionally only those with the given status"""
+    table = user_watched_auctions
+    query = select(Item).options(selectinload(Item.images)).join(table, table.c.item_id == Item.id).where(table.c.user_id == user_id)
+    if status is not None:
+        query = query.where(Item.status == status)
+    return db.session.execute(query.order_by(table.c.created_at.desc(), Item.id.desc())).scalars().all()
@@ -0,0 +1,77 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import aliased
+from app import db
+from .models import User, Item, Category, AuthenticationRequest, AuthenticationStatus, OPEN_AUTHENTICATION_STATUSES
+
+QUEUE_PAGE_SIZE = 20
+# Time allowed from a request being made to the expert's decision
+AUTHENTICATION_SLA = {
+    AuthenticationStatus.PENDING.value: timedelta(hours=48),
+    AuthenticationStatus.SECOND_OPINION.value: timedelta(hours=24),
+}
+QUEUE_ORDERS = ('oldest', 'sla')
+
+QueueEntry = namedtuple('QueueEntry', ['request', 'item', 'category_name', 'seller_name', 'due_at'])
+
+
+def _epoch_seconds(column):
+    """SQL expression for a timestamp as seconds since the epoch"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.extract('epoch', column)
+    return func.cast(func.strftime('%s', column), db.Integer)
+
+def _due_expression():
+    """When a request breaches its SLA, in epoch seconds, so the queue can be sorted by it in SQL"""
+    allowance = case(
+        *[(AuthenticationRequest.status == status, int(sla.total_seconds())) for status, sla in AUTHENTICATION_SLA.items()],
+        else_=int(AUTHENTICATION_SLA[AuthenticationStatus.PENDING.value].total_seconds())
+    )
+    return _epoch_seconds(AuthenticationRequest.created_at) + allowance
+
+def due_at(request):
+    sla = AUTHENTICATION_SLA.get(request.status, AUTHENTICATION_SLA[AuthenticationStatus.PENDING.value])
+    return request.created_at + sla
+
+def work_queue(expert, order='oldest', page=1, per_page=QUEUE_PAGE_SIZE):
+    """
+    One page of an expert's open requests, with the item, category name and seller name joined in
+    the same query. 'oldest' orders by request time and 'sla' by when each request breaches its SLA,
+    which puts second opinions ahead of first looks made at the same time. The total comes from the
+    expert's cached open_requests counter rather than a COUNT. Returns (entries, total, pages).
+    """
+    if order not in QUEUE_ORDERS:
+        raise ValueError(f"Unknown queue order '{order}'")
+    seller = aliased(User)
+    query = (
+        select(AuthenticationRequest, Item, Category.name, seller.username)
+        .join(Item, AuthenticationRequest.item_id == Item.id)
+        .outerjoin(Category, Item.category_id == Category.id)
+        .outerjoin(seller, Item.seller_id == seller.id)
+        .where(AuthenticationRequest.expert_id == expert.id,
+               AuthenticationRequest.status.in_(OPEN_AUTHENTICATION_STATUSES))
+    )
+    if order == 'sla':
+        query = query.order_by(_due_expression(), AuthenticationRequest.id)
+    else:
+        query = query.order_by(AuthenticationRequest.created_at, AuthenticationRequest.id)
+    page = max(page, 1)
+    rows = db.session.execute(query.limit(per_page).offset((page - 1) * per_page)).all()
+    entries = [QueueEntry(request, item, category_name, seller_name, due_at(request))
+               for request, item, category_name, seller_name in rows]
+    total = expert.open_requests
+    return entries, total, max((total + per_page - 1) // per_page, 1)
+
+def queue_entry_json(entry, now=None):
+    now = now or datetime.utcnow()
+    return {
+        'request_id': entry.request.id,
+        'status': AuthenticationStatus(entry.request.status).name.lower(),
+        'requested_at': entry.request.created_at.isoformat(),
+        'due_at': entry.due_at.isoformat(),
+        'seconds_remaining': int((entry.due_at - now).total_seconds()),
+        'item': {'id': entry.item.id, 'name': entry.item.name},
+        'category': entry.category_name,
+        'seller': entry.seller_name,
+    }
@@ -15,6 +15,12 @@ class Config:
     #if deployed keep session_cookie_secure as True
     SESSION_COOKIE_SECURE = True
 
+    # Password hashing (werkzeug method string); users are rehashed at their next login after a change
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_SALT_LENGTH = 16
+    # Password checks and hashes run at once per worker; further ones wait for a free thread
+    PASSWORD_VERIFY_THREADS = 2
+
 class DevelopmentConfig(Config):
     basedir = os.path.abspath(os.path.dirname(__file__))
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
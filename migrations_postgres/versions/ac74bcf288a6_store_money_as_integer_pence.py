@@ -0,0 +1,44 @@
+"""store money as integer pence
+
+Revision ID: ac74bcf288a6
+Revises: be4146d0e979
+Create Date: 2026-10-19 12:57:38.980768
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ac74bcf288a6'
+down_revision = 'be4146d0e979'
+branch_labels = None
+depends_on = None
+
+
+# Every money column, now whole pence
+MONEY_COLUMNS = {
+    'items': ['minimum_price', 'current_price'],
+    'bids': ['amount'],
+    'payments': ['amount', 'fee_amount'],
+    'daily_revenue': ['revenue', 'fees'],
+    'performance_stats': ['hammer_total', 'authenticated_hammer_total', 'fees_total', 'authenticated_fees_total'],
+    'ledger_entries': ['amount'],
+    'ledger_snapshots': ['balance', 'sales_total', 'fees_total', 'payouts_total'],
+}
+
+
+def upgrade():
+    for table, names in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.Float(), type_=sa.BigInteger(), existing_nullable=False,
+                                      postgresql_using=f"ROUND({name} * 100)::bigint")
+
+
+def downgrade():
+    for table, names in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.BigInteger(), type_=sa.Float(), existing_nullable=False,
+                                      postgresql_using=f"{name} / 100.0")
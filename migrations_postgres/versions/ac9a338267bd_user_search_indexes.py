@@ -0,0 +1,29 @@
+"""user search indexes
+
+Revision ID: ac9a338267bd
+Revises: 6a3cb0921133
+Create Date: 2026-10-19 12:25:44.709200
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ac9a338267bd'
+down_revision = '6a3cb0921133'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression indexes, written by hand as autogenerate cannot compare them
+    op.create_index('ix_users_lower_username_id', 'users', [sa.text('lower(username)'), 'id'], unique=False)
+    op.create_index('ix_users_priority_lower_username_id', 'users', ['priority', sa.text('lower(username)'), 'id'], unique=False)
+    op.create_index('ix_users_lower_email', 'users', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_lower_email', table_name='users')
+    op.drop_index('ix_users_priority_lower_username_id', table_name='users')
+    op.drop_index('ix_users_lower_username_id', table_name='users')
@@ -0,0 +1,38 @@
+"""give notification archive its own ids
+
+Revision ID: f3ebbc94a91f
+Revises: ac74bcf288a6
+Create Date: 2026-10-19 13:10:22.730082
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3ebbc94a91f'
+down_revision = 'ac74bcf288a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The archive's ids were copied from the live notifications; keep them there as notification_id
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notification_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE notification_archive SET notification_id = id")
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.alter_column('notification_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_notification_archive_notification_id'), ['notification_id'], unique=False)
+    # Archived rows keep their ids; new ones are numbered from a sequence past them
+    op.execute("CREATE SEQUENCE notification_archive_id_seq OWNED BY notification_archive.id")
+    op.execute("SELECT setval('notification_archive_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM notification_archive")
+    op.execute("ALTER TABLE notification_archive ALTER COLUMN id SET DEFAULT nextval('notification_archive_id_seq')")
+
+
+def downgrade():
+    op.execute("ALTER TABLE notification_archive ALTER COLUMN id DROP DEFAULT")
+    op.execute("DROP SEQUENCE notification_archive_id_seq")
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_archive_notification_id'))
+        batch_op.drop_column('notification_id')
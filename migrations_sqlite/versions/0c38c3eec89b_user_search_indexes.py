@@ -0,0 +1,29 @@
+"""user search indexes
+
+Revision ID: 0c38c3eec89b
+Revises: 6b229f6bcada
+Create Date: 2026-10-19 12:25:42.921209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c38c3eec89b'
+down_revision = '6b229f6bcada'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression indexes, written by hand as autogenerate cannot compare them
+    op.create_index('ix_users_lower_username_id', 'users', [sa.text('lower(username)'), 'id'], unique=False)
+    op.create_index('ix_users_priority_lower_username_id', 'users', ['priority', sa.text('lower(username)'), 'id'], unique=False)
+    op.create_index('ix_users_lower_email', 'users', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_lower_email', table_name='users')
+    op.drop_index('ix_users_priority_lower_username_id', table_name='users')
+    op.drop_index('ix_users_lower_username_id', table_name='users')
@@ -0,0 +1,32 @@
+"""give notification archive its own ids
+
+Revision ID: 6bdeb6030fda
+Revises: 8960360b08ba
+Create Date: 2026-10-19 13:10:16.670621
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6bdeb6030fda'
+down_revision = '8960360b08ba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The archive's ids were copied from the live notifications; keep them there as notification_id
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notification_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE notification_archive SET notification_id = id")
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.alter_column('notification_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_notification_archive_notification_id'), ['notification_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_archive_notification_id'))
+        batch_op.drop_column('notification_id')
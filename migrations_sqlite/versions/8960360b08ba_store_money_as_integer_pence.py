@@ -0,0 +1,45 @@
+"""store money as integer pence
+
+Revision ID: 8960360b08ba
+Revises: 878ded01bb10
+Create Date: 2026-10-19 12:57:32.374451
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8960360b08ba'
+down_revision = '878ded01bb10'
+branch_labels = None
+depends_on = None
+
+
+# Every money column, now whole pence
+MONEY_COLUMNS = {
+    'items': ['minimum_price', 'current_price'],
+    'bids': ['amount'],
+    'payments': ['amount', 'fee_amount'],
+    'daily_revenue': ['revenue', 'fees'],
+    'performance_stats': ['hammer_total', 'authenticated_hammer_total', 'fees_total', 'authenticated_fees_total'],
+    'ledger_entries': ['amount'],
+    'ledger_snapshots': ['balance', 'sales_total', 'fees_total', 'payouts_total'],
+}
+
+
+def upgrade():
+    for table, names in MONEY_COLUMNS.items():
+        # Scale in place first; the rebuilt table's integer affinity then stores the whole numbers as integers
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{name} = ROUND({name} * 100)" for name in names))
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.Float(), type_=sa.BigInteger(), existing_nullable=False)
+
+
+def downgrade():
+    for table, names in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.BigInteger(), type_=sa.Float(), existing_nullable=False)
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{name} = {name} / 100.0" for name in names))
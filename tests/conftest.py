@@ -6,11 +6,13 @@ from flask_wtf.csrf import CSRFProtect
 from flask import url_for
 
 @pytest.fixture
-def app():
-    app = create_app()
-    app.config["WTF_CSRF_ENABLED"] = False
-    app.config["TESTING"] = True
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"  # Use in-memory DB for tests
+def app(tmp_path):
+    # A fresh file database per test, so the tracked app.db is never touched and threads share it
+    app = create_app({
+        "WTF_CSRF_ENABLED": False,
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+    })
 
     with app.app_context():
         db.create_all()
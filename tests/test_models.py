@@ -868,6 +868,115 @@ def test_payment_creation(init_database):
     assert saved_payment.buyer_id == buyer.id
     assert saved_payment.seller_id == seller.id
 
+def test_daily_revenue_rollup(init_database):
+    """Test completed payments are rolled up per day and can be rebuilt from scratch."""
+    from app.models import DailyRevenue
+    from app.reports import record_payment, rebuild_daily_revenue, revenue_series
+    seller = User(username="rollup_seller", email="rollup_seller@example.com")
+    buyer = User(username="rollup_buyer", email="rollup_buyer@example.com")
+    seller.set_password("password")
+    buyer.set_password("password")
+    init_database.session.add_all([seller, buyer])
+    init_database.session.flush()
+
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    for item_id, amount, completed_at in [(1, 100.0, today), (2, 50.0, today), (3, 20.0, today - timedelta(days=2))]:
+        payment = Payment(item_id=item_id, buyer_id=buyer.id, seller_id=seller.id, amount=amount,
+                          fee_percentage=0.01, fee_amount=amount * 0.01, status="completed", completed_at=completed_at)
+        init_database.session.add(payment)
+        record_payment(payment)
+    init_database.session.commit()
+
+    row = init_database.session.get(DailyRevenue, today.date())
+    assert row.revenue == 150.0
+    assert row.payment_count == 2
+    assert row.version == 2
+
+    series = revenue_series(today.date() - timedelta(days=2), 3)
+    assert series['revenue'] == [20.0, 0.0, 150.0]
+    assert series['total_revenue'] == 170.0
+    assert series['total_fees'] == 1.7
+
+    assert rebuild_daily_revenue() == 2
+    assert revenue_series(today.date() - timedelta(days=2), 3)['revenue'] == [20.0, 0.0, 150.0]
+
+def test_rebuild_daily_revenue_moves_chart_versions(init_database):
+    """Test a rebuild gives every day a version no chart can have been cached under."""
+    from app.reports import record_payment, rebuild_daily_revenue, revenue_series
+    seller = User(username="rebuild_seller", email="rebuild_seller@example.com")
+    seller.set_password("password")
+    init_database.session.add(seller)
+    init_database.session.flush()
+
+    day = datetime(2025, 4, 2, 12)
+    payments = [Payment(item_id=item_id, buyer_id=seller.id, seller_id=seller.id, amount=amount, fee_percentage=0.01,
+                        fee_amount=amount * 0.01, status="completed", completed_at=day)
+                for item_id, amount in [(1, 30.0), (2, 70.0)]]
+    for payment in payments:
+        init_database.session.add(payment)
+        record_payment(payment)
+    init_database.session.commit()
+    seen = {revenue_series(day.date(), 1)['versions'][0]}
+
+    # Once a payment is dropped the rebuilt day is worth less, and must not reuse a version
+    payments[1].status = "failed"
+    init_database.session.commit()
+    for _ in range(2):
+        rebuild_daily_revenue()
+        series = revenue_series(day.date(), 1)
+        assert series['revenue'] == [30.0]
+        assert series['versions'][0] not in seen
+        seen.add(series['versions'][0])
+
+def test_payment_report_groupings(init_database):
+    """Test payment totals are grouped in SQL by period, category and authentication."""
+    from datetime import date
+    from app.reports import payment_report
+    seller = User(username="report_seller", email="report_seller@example.com")
+    seller.set_password("password")
+    init_database.session.add(seller)
+    init_database.session.flush()
+    art = Category(name="Report Art")
+    init_database.session.add(art)
+    init_database.session.flush()
+    items = [
+        Item(name="Painting", minimum_price=1, current_price=1, seller_id=seller.id, category_id=art.id,
+             is_authenticated=True, end_time=datetime(2025, 1, 1)),
+        Item(name="Mystery", minimum_price=1, current_price=1, seller_id=seller.id, end_time=datetime(2025, 1, 1)),
+        Item(name="Puzzle", minimum_price=1, current_price=1, seller_id=seller.id, end_time=datetime(2025, 1, 1)),
+    ]
+    init_database.session.add_all(items)
+    init_database.session.flush()
+    for item, amount, completed_at, status in [
+        (items[0], 100.0, datetime(2025, 1, 6, 10), "completed"),   # Monday
+        (items[1], 40.0, datetime(2025, 1, 12, 23), "completed"),   # Sunday of the same week
+        (items[2], 60.0, datetime(2025, 2, 3, 9), "completed"),
+        (items[0], 999.0, datetime(2025, 1, 7, 9), "failed"),
+    ]:
+        init_database.session.add(Payment(item_id=item.id, buyer_id=seller.id, seller_id=seller.id, amount=amount,
+                                          fee_percentage=0.1, fee_amount=amount * 0.1, status=status, completed_at=completed_at))
+    init_database.session.commit()
+
+    by_month = payment_report(date(2025, 1, 1), date(2025, 12, 31), 'month')
+    assert [(r['key'], r['payments'], r['revenue']) for r in by_month['rows']] == [("2025-01", 2, 140.0), ("2025-02", 1, 60.0)]
+    assert by_month['total_revenue'] == 200.0
+    assert by_month['total_fees'] == 20.0
+
+    by_week = payment_report(date(2025, 1, 1), date(2025, 1, 31), 'week')
+    assert [(r['key'], r['revenue']) for r in by_week['rows']] == [("2025-01-06", 140.0)]
+
+    by_day = payment_report(date(2025, 1, 12), date(2025, 1, 12), 'day')
+    assert [(r['key'], r['revenue']) for r in by_day['rows']] == [("2025-01-12", 40.0)]
+
+    by_category = payment_report(date(2025, 1, 1), date(2025, 12, 31), 'category')
+    assert {r['key']: r['revenue'] for r in by_category['rows']} == {"Report Art": 100.0, "Uncategorised": 100.0}
+
+    by_authentication = payment_report(date(2025, 1, 1), date(2025, 12, 31), 'authenticated')
+    assert {r['key']: r['payments'] for r in by_authentication['rows']} == {"authenticated": 1, "regular": 2}
+
+    with pytest.raises(ValueError):
+        payment_report(date(2025, 1, 1), date(2025, 1, 2), 'seller')
+
 # =====================
 # Notification Tests
 # =====================
@@ -932,6 +1041,247 @@ def test_notifications(init_database):
     remaining_unread = Notification.query.filter_by(user_id=user.id, is_read=False).count()
     assert remaining_unread == 0
 
+def test_unread_notification_counter(init_database):
+    """Test the cached unread counter follows inserts, reads and deletes."""
+    user = User(username="counter_user", email="counter_user@example.com")
+    user.set_password("password")
+    init_database.session.add(user)
+    init_database.session.commit()
+    assert user.unread_notifications == 0
+
+    notifications = [
+        Notification(user_id=user.id, type="outbid", message=f"Outbid {i}") for i in range(3)
+    ]
+    init_database.session.add_all(notifications)
+    init_database.session.commit()
+    assert user.unread_notifications == 3
+
+    notifications[0].is_read = True
+    init_database.session.commit()
+    assert user.unread_notifications == 2
+
+    init_database.session.delete(notifications[1])
+    init_database.session.commit()
+    assert user.unread_notifications == 1
+
+    from app.notifications import mark_all_read
+    assert mark_all_read(user.id) == 1
+    assert user.unread_notifications == 0
+    assert Notification.query.filter_by(user_id=user.id, is_read=False).count() == 0
+
+def test_notify_watchers_fan_out(init_database):
+    """Test watchers are notified in bulk batches, without duplicates."""
+    from app.notifications import notify_watchers
+    seller = User(username="fanout_seller", email="fanout_seller@example.com")
+    seller.set_password("password")
+    watchers = [User(username=f"fanout_watcher{i}", email=f"fanout_watcher{i}@example.com") for i in range(4)]
+    for watcher in watchers:
+        watcher.set_password("password")
+    init_database.session.add_all([seller] + watchers)
+    init_database.session.flush()
+
+    item = Item(
+        name="Busy Item",
+        minimum_price=10.0,
+        current_price=10.0,
+        seller_id=seller.id,
+        end_time=datetime.utcnow() + timedelta(days=1)
+    )
+    init_database.session.add(item)
+    init_database.session.flush()
+    for watcher in watchers:
+        watcher.watched_items.append(item)
+    init_database.session.commit()
+
+    recipients = notify_watchers(item, "watching", "New activity", exclude_user_ids=[watchers[0].id])
+    init_database.session.commit()
+    assert sorted(recipients) == sorted(w.id for w in watchers[1:])
+    assert Notification.query.filter_by(item_id=item.id, type="watching").count() == 3
+    assert watchers[0].unread_notifications == 0
+    assert watchers[1].unread_notifications == 1
+
+    # Unread notifications of the same type are not duplicated
+    assert notify_watchers(item, "watching", "More activity", exclude_user_ids=[watchers[0].id]) == []
+
+    # Fan-outs larger than a batch are split across upserts and still reach everyone
+    recipients = notify_watchers(item, "ending_soon", "Ending soon", batch_size=3)
+    init_database.session.commit()
+    assert sorted(recipients) == sorted(w.id for w in watchers)
+    assert Notification.query.filter_by(item_id=item.id, type="ending_soon").count() == 4
+    assert watchers[0].unread_notifications == 1
+
+def test_archive_notifications(init_database):
+    """Test retention policies move old notifications to the archive in batches."""
+    from app.models import NotificationArchive
+    from app.retention import archive_notifications
+    now = datetime.utcnow()
+    user = User(username="retention_user", email="retention_user@example.com")
+    user.set_password("password")
+    init_database.session.add(user)
+    init_database.session.flush()
+    sold_item = Item(
+        name="Sold Item",
+        minimum_price=10.0,
+        current_price=10.0,
+        seller_id=user.id,
+        status=ItemStatus.SOLD.value,
+        end_time=now - timedelta(days=20)
+    )
+    init_database.session.add(sold_item)
+    init_database.session.flush()
+
+    old = now - timedelta(days=40)
+    init_database.session.add_all(
+        [Notification(user_id=user.id, type="bid", message=f"Old read {i}", is_read=True, created_at=old) for i in range(5)] +
+        [Notification(user_id=user.id, item_id=sold_item.id, type="payment", message="Sold unread", created_at=now - timedelta(days=10)),
+         Notification(user_id=user.id, type="bid", message="Recent read", is_read=True, created_at=now - timedelta(days=1)),
+         Notification(user_id=user.id, type="bid", message="Old unread", created_at=old)]
+    )
+    init_database.session.commit()
+    assert user.unread_notifications == 2
+
+    reports = archive_notifications(batch_size=2, now=now)
+    assert [(r['policy'], r['rows']) for r in reports] == [('read', 5), ('closed_item', 1)]
+    assert all(r['rows_per_second'] > 0 for r in reports)
+
+    remaining = sorted(n.message for n in Notification.query.filter_by(user_id=user.id))
+    assert remaining == ["Old unread", "Recent read"]
+    assert NotificationArchive.query.filter_by(user_id=user.id).count() == 6
+    assert NotificationArchive.query.filter_by(policy="closed_item").one().message == "Sold unread"
+    assert user.unread_notifications == 1
+
+def test_archive_notifications_after_id_reuse(init_database):
+    """Test archiving again after a new notification takes the id of an archived one."""
+    from app.models import NotificationArchive
+    from app.retention import archive_notifications
+    now = datetime.utcnow()
+    user = User(username="reuse_user", email="reuse_user@example.com")
+    user.set_password("password")
+    init_database.session.add(user)
+    init_database.session.commit()
+
+    for message in ("First", "Second"):
+        notification = Notification(user_id=user.id, type="bid", message=message, is_read=True,
+                                    created_at=now - timedelta(days=40))
+        init_database.session.add(notification)
+        init_database.session.commit()
+        notification_id = notification.id
+        assert archive_notifications(now=now)[0]['rows'] == 1
+
+    archived = NotificationArchive.query.filter_by(user_id=user.id).order_by(NotificationArchive.id).all()
+    assert [row.message for row in archived] == ["First", "Second"]
+    assert archived[1].notification_id == notification_id
+    assert Notification.query.filter_by(user_id=user.id).count() == 0
+
+# =====================
+# Reminder Scheduling Tests
+# =====================
+
+def test_timer_wheel_cascades_and_overflow():
+    """Test timers fire on their tick from every level of the wheel and the overflow heap."""
+    from app.reminders import TimerWheel
+    start = datetime(2026, 1, 1, 12, 0)
+    wheel = TimerWheel(tick_seconds=60, slots=8, levels=2, start=start)
+    for minutes in [3, 20, 200]:  # level 0, level 1 and overflow
+        wheel.add(start + timedelta(minutes=minutes), minutes)
+    wheel.add(start - timedelta(minutes=1), "late")
+    assert len(wheel) == 4
+
+    assert wheel.advance(start + timedelta(minutes=2)) == ["late"]
+    assert wheel.advance(start + timedelta(minutes=3)) == [3]
+    assert wheel.advance(start + timedelta(minutes=19)) == []
+    assert wheel.advance(start + timedelta(minutes=20)) == [20]
+    assert wheel.advance(start + timedelta(minutes=199)) == []
+    assert wheel.advance(start + timedelta(minutes=200)) == [200]
+    assert len(wheel) == 0
+
+def test_reminder_scheduler_fires_ending_soon(init_database):
+    """Test reminders are rebuilt from the database and sent to watchers and bidders."""
+    from app.reminders import ReminderScheduler
+    now = datetime.utcnow()
+    seller = User(username="reminder_seller", email="reminder_seller@example.com")
+    watcher = User(username="reminder_watcher", email="reminder_watcher@example.com")
+    bidder = User(username="reminder_bidder", email="reminder_bidder@example.com")
+    for user in [seller, watcher, bidder]:
+        user.set_password("password")
+    init_database.session.add_all([seller, watcher, bidder])
+    init_database.session.flush()
+
+    item = Item(
+        name="Closing Soon",
+        minimum_price=10.0,
+        current_price=20.0,
+        seller_id=seller.id,
+        status=ItemStatus.ACTIVE.value,
+        start_time=now - timedelta(days=1),
+        end_time=now + timedelta(minutes=90)
+    )
+    init_database.session.add(item)
+    init_database.session.flush()
+    watcher.watched_items.append(item)
+    init_database.session.add(Bid(item_id=item.id, user_id=bidder.id, amount=20.0))
+    init_database.session.commit()
+
+    scheduler = ReminderScheduler(now=now)
+    assert scheduler.rebuild(now) == 1
+    assert len(scheduler.wheel) == 2
+    assert scheduler.sync(now) == 0  # already scheduled
+
+    assert scheduler.fire_due(now + timedelta(minutes=20)) == 0
+    assert scheduler.fire_due(now + timedelta(minutes=31)) == 2
+    reminders = Notification.query.filter_by(item_id=item.id, type="ending_soon").all()
+    assert sorted(n.user_id for n in reminders) == sorted([watcher.id, bidder.id])
+    assert "ends in 1 hour" in reminders[0].message
+    assert item.id in scheduler.scheduled_items
+
+    # The second reminder updates the unread first one in place
+    assert scheduler.fire_due(now + timedelta(minutes=86)) == 2
+    reminders = Notification.query.filter_by(item_id=item.id, type="ending_soon").all()
+    assert len(reminders) == 2
+    assert all("ends in 5 minutes" in n.message and n.occurrences == 2 for n in reminders)
+    assert watcher.unread_notifications == 1
+    assert item.id not in scheduler.scheduled_items
+
+def test_reminder_scheduler_skips_closed_auctions(init_database):
+    """Test reminders for auctions that are no longer active are dropped when they fire."""
+    from app.reminders import ReminderScheduler
+    now = datetime.utcnow()
+    scheduler = ReminderScheduler(now=now)
+    item = Item.query.first()
+    item.status = ItemStatus.SOLD.value
+    init_database.session.commit()
+    assert scheduler.schedule(item.id, now + timedelta(minutes=30), now) is True
+    assert scheduler.fire_due(now + timedelta(minutes=26)) == 0
+    assert item.id not in scheduler.scheduled_items
+
+def test_reminder_thread_retries_rebuild(app, init_database, monkeypatch):
+    """Test the reminder thread keeps retrying a failed startup rebuild instead of dying."""
+    from app import reminders
+    sleeps, attempts = [], []
+
+    class Stop(Exception):
+        pass
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 3:
+            raise Stop()
+
+    def rebuild(self, now=None):
+        attempts.append(now)
+        if len(attempts) == 1:
+            raise RuntimeError("database is locked")
+        self.last_sync = now
+        return 0
+
+    monkeypatch.setattr(reminders.time, "sleep", sleep)
+    monkeypatch.setattr(reminders.ReminderScheduler, "rebuild", rebuild)
+    monkeypatch.setattr(reminders, "_scheduler", None)
+    with pytest.raises(Stop):
+        reminders.run_reminder_scheduler(app)
+    assert len(attempts) == 2
+    assert reminders._scheduler is not None
+
 # =====================
 # Watch Functionality Tests
 # =====================
@@ -1010,6 +1360,39 @@ def test_watch_functionality(init_database):
     assert len(updated_item1_watchers) == 1
     assert user1 not in updated_item1_watchers
     assert user2 in updated_item1_watchers
+    assert item1.watcher_count == 1
+    assert item2.watcher_count == 1
+
+def test_watchlist_service(init_database):
+    """Test watching through the service keeps membership and watcher counts in step."""
+    from app.watchlist import is_watching, watch, unwatch, watched_items
+    user = User(username="list_watcher", email="list_watcher@example.com")
+    seller = User(username="list_seller", email="list_seller@example.com")
+    user.set_password("password")
+    seller.set_password("password")
+    init_database.session.add_all([user, seller])
+    init_database.session.flush()
+    active = Item(name="Watched Clock", minimum_price=50.0, current_price=50.0, seller_id=seller.id,
+                  status=ItemStatus.ACTIVE.value, end_time=datetime.utcnow() + timedelta(days=1))
+    ended = Item(name="Watched Vase", minimum_price=50.0, current_price=50.0, seller_id=seller.id,
+                 status=ItemStatus.EXPIRED.value, end_time=datetime.utcnow() - timedelta(days=1))
+    init_database.session.add_all([active, ended])
+    init_database.session.commit()
+
+    assert not is_watching(user.id, active.id)
+    assert watch(user.id, active.id)
+    assert not watch(user.id, active.id)  # watching twice changes nothing
+    assert watch(user.id, ended.id)
+    assert is_watching(user.id, active.id)
+    assert init_database.session.get(Item, active.id).watcher_count == 1
+    assert watched_items(user.id, ItemStatus.ACTIVE.value) == [active]
+    assert len(watched_items(user.id)) == 2
+
+    assert unwatch(user.id, active.id)
+    assert not unwatch(user.id, active.id)
+    assert not is_watching(user.id, active.id)
+    init_database.session.refresh(active)
+    assert active.watcher_count == 0
 
 # =====================
 # System Configuration Tests
@@ -1346,4 +1729,612 @@ def test_relationships_integrity(init_database):
     
     # Bid → item relationship
     assert saved_bid.item.id == item.id
-    assert saved_bid in item.bids.all()
\ No newline at end of file
+    assert saved_bid in item.bids.all()
+
+
+def test_performance_stats_incremental_and_rebuild(init_database):
+    """Test settlement and payment keep seller and category statistics current, matching a full rebuild."""
+    from app.stats import record_settlement, record_payment_fees, get_stats, rebuild_performance_stats
+    seller = User(username="stats_seller", email="stats_seller@example.com")
+    buyer = User(username="stats_buyer", email="stats_buyer@example.com")
+    seller.set_password("password")
+    buyer.set_password("password")
+    init_database.session.add_all([seller, buyer])
+    init_database.session.flush()
+    category = Category(name="Stats Category")
+    init_database.session.add(category)
+    init_database.session.flush()
+
+    start = datetime(2025, 1, 1, 12, 0)
+    regular = Item(name="Regular", minimum_price=10, current_price=100, seller_id=seller.id, category_id=category.id,
+                   start_time=start, end_time=start + timedelta(days=1), status=ItemStatus.SOLD.value)
+    authenticated = Item(name="Authenticated", minimum_price=10, current_price=150, seller_id=seller.id, category_id=category.id,
+                         is_authenticated=True, start_time=start, end_time=start + timedelta(days=1), status=ItemStatus.PAYING.value)
+    unsold = Item(name="Unsold", minimum_price=10, current_price=10, seller_id=seller.id, category_id=category.id,
+                  start_time=start, end_time=start + timedelta(days=1), status=ItemStatus.EXPIRED.value)
+    init_database.session.add_all([regular, authenticated, unsold])
+    init_database.session.flush()
+    init_database.session.add_all([
+        Bid(item_id=regular.id, user_id=buyer.id, amount=100, created_at=start + timedelta(hours=1)),
+        Bid(item_id=authenticated.id, user_id=buyer.id, amount=150, created_at=start + timedelta(hours=3)),
+    ])
+    payment = Payment(item_id=regular.id, buyer_id=buyer.id, seller_id=seller.id, amount=100,
+                      fee_percentage=0.01, fee_amount=1.0, status="completed", completed_at=start + timedelta(days=2))
+    init_database.session.add(payment)
+
+    record_settlement(regular, 100, start + timedelta(hours=1))
+    record_settlement(authenticated, 150, start + timedelta(hours=3))
+    record_settlement(unsold)
+    record_payment_fees(regular, payment)
+    init_database.session.commit()
+
+    def check(stats):
+        assert stats.auctions_closed == 3
+        assert stats.sell_through_rate() == pytest.approx(2 / 3)
+        assert stats.average_hammer_price() == 125
+        assert stats.average_time_to_first_bid() == 2 * 3600
+        assert stats.authentication_uplift() == pytest.approx(0.5)
+        assert stats.fees_total == 1.0
+
+    check(get_stats('seller', seller.id))
+    check(get_stats('category', category.id))
+
+    rebuild_performance_stats()
+    init_database.session.expire_all()
+    check(get_stats('seller', seller.id))
+    check(get_stats('category', category.id))
+
+def test_availability_index(init_database):
+    """Test weekly windows, dated slots and exceptions answer point and window availability queries."""
+    from app.models import ExpertWeeklyWindow, ExpertUnavailability
+    from app.availability import AvailabilityIndex, load_availability_index
+    monday = datetime(2025, 3, 3)
+    index = AvailabilityIndex(
+        windows=[
+            (1, 0, 9 * 60, 17 * 60),   # Monday 09:00-17:00
+            (2, 6, 22 * 60, 2 * 60),   # Sunday 22:00 until Monday 02:00
+            (3, 2, 9 * 60, 12 * 60),   # Wednesday mornings
+        ],
+        slots=[(4, monday + timedelta(days=5, hours=10), monday + timedelta(days=5, hours=11))],
+        exceptions=[(3, monday, monday + timedelta(days=2, hours=10))]
+    )
+    assert index.free_at(monday + timedelta(hours=10)) == {1}
+    assert index.free_at(monday + timedelta(hours=1)) == {2}
+    assert index.free_at(monday + timedelta(days=6, hours=23)) == {2}
+    assert index.free_at(monday + timedelta(days=5, hours=10, minutes=30)) == {4}
+    assert index.free_at(monday + timedelta(days=2, hours=9, minutes=30)) == set()
+    assert index.free_at(monday + timedelta(days=2, hours=10)) == {3}
+    assert index.free_during(monday + timedelta(hours=18), monday + timedelta(days=2)) == set()
+    assert index.free_during(monday + timedelta(hours=18), monday + timedelta(days=6)) == {3, 4}
+    assert index.free_during(monday + timedelta(days=6), monday + timedelta(days=8)) == {1, 2}
+    # The exception ends part way through the Wednesday window
+    assert index.free_during(monday + timedelta(days=2), monday + timedelta(days=3)) == {3}
+    assert index.free_during(monday, monday + timedelta(days=2, hours=9, minutes=30)) == {1, 2}
+
+    expert = User(username="window_expert", email="window_expert@example.com", priority=UserPriority.EXPERT.value)
+    expert.set_password("password")
+    init_database.session.add(expert)
+    init_database.session.flush()
+    init_database.session.add_all([
+        ExpertWeeklyWindow(user_id=expert.id, weekday=0, start_minute=0, end_minute=0),
+        ExpertUnavailability(user_id=expert.id, start_time=monday, end_time=monday + timedelta(hours=12)),
+    ])
+    init_database.session.commit()
+    index = load_availability_index(now=monday)
+    assert expert.id not in index.free_at(monday + timedelta(hours=6))
+    assert expert.id in index.free_at(monday + timedelta(hours=13))
+
+def test_interval_tree_matches_brute_force():
+    """Test interval tree point and range lookups against a scan of every interval."""
+    import random
+    from app.availability import IntervalTree
+    rng = random.Random(7)
+    intervals = []
+    for user_id in range(60):
+        for _ in range(rng.randrange(1, 4)):
+            start = rng.randrange(0, 500)
+            intervals.append((start, start + rng.randrange(0, 60), user_id))
+    tree = IntervalTree(intervals)
+    for _ in range(300):
+        point = rng.randrange(-10, 570)
+        assert tree.at(point) == {user for start, end, user in intervals if start <= point < end}
+        start = rng.randrange(-10, 560)
+        end = start + rng.randrange(1, 80)
+        assert tree.overlapping(start, end) == {user for first, last, user in intervals
+                                                if first < last and first < end and last > start}
+    assert IntervalTree([]).at(5) == set() and IntervalTree([]).overlapping(0, 10) == set()
+
+
+def test_plan_assignments_balances_load():
+    """Test the assignment plan matches categories, respects availability and spreads load."""
+    from app.assignment import plan_assignments
+    backlog = [(1, 'art'), (2, 'art'), (3, 'art'), (4, 'coins'), (5, 'stamps')]
+    expertise = {10: {'art', 'coins'}, 11: {'art'}, 12: {'coins'}, 13: {'stamps'}}
+    plan = dict(plan_assignments(backlog, expertise, loads={10: 1}, free_now={11, 12}, free_soon={10, 11, 12}))
+    # Expert 11 is free now and has no open requests, expert 13 is away
+    assert plan[1] == 11
+    assert sorted([plan[2], plan[3]]) == [10, 11]
+    assert plan[4] == 12
+    assert 5 not in plan
+    assert plan_assignments(backlog, expertise, loads={10: 2, 11: 2}, free_now=set(), free_soon={10, 11}, max_open=2) == []
+
+def test_assign_backlog(init_database):
+    """Test the engine assigns pending requests to available experts and notifies them."""
+    from app.models import ExpertWeeklyWindow
+    from app.assignment import assign_backlog
+    seller = User(username="assign_seller", email="assign_seller@example.com")
+    seller.set_password("password")
+    experts = [User(username=f"assign_expert{i}", email=f"assign_expert{i}@example.com", priority=UserPriority.EXPERT.value)
+               for i in range(2)]
+    for expert in experts:
+        expert.set_password("password")
+    art = Category(name="Assign Art")
+    init_database.session.add_all([seller, art] + experts)
+    init_database.session.flush()
+    for expert in experts:
+        init_database.session.add(ExpertCategory(user_id=expert.id, category_id=art.id, category=art.name))
+        init_database.session.add_all([ExpertWeeklyWindow(user_id=expert.id, weekday=day, start_minute=0, end_minute=0)
+                                       for day in range(7)])
+    requests = []
+    for number in range(4):
+        item = Item(name=f"Assign {number}", minimum_price=10, current_price=10, seller_id=seller.id, category_id=art.id,
+                    status=ItemStatus.PENDING.value, end_time=datetime.utcnow() + timedelta(days=3))
+        init_database.session.add(item)
+        init_database.session.flush()
+        request = AuthenticationRequest(item_id=item.id, requester_id=seller.id, created_at=datetime.utcnow() + timedelta(seconds=number))
+        init_database.session.add(request)
+        requests.append(request)
+    init_database.session.commit()
+
+    report = assign_backlog()
+    assert report['assigned'] == 4
+    assert report['waiting'] == 0
+    init_database.session.expire_all()
+    assert sorted(request.expert_id for request in requests) == sorted([experts[0].id, experts[1].id] * 2)
+    for expert in experts:
+        assert expert.unread_notifications == 2
+        assert Notification.query.filter_by(user_id=expert.id, type="authentication").count() == 2
+
+    assert assign_backlog()['backlog'] == 0
+
+def test_expert_category_linked_by_id(init_database):
+    """Test expertise follows its category by id through a rename and is removed with the category."""
+    expert = User(username="linked_expert", email="linked_expert@example.com", priority=UserPriority.EXPERT.value)
+    expert.set_password("password")
+    category = Category(name="Watches")
+    init_database.session.add_all([expert, category])
+    init_database.session.flush()
+    init_database.session.add(ExpertCategory(user_id=expert.id, category_id=category.id, category=category.name))
+    init_database.session.commit()
+
+    category.name = "Wristwatches"
+    init_database.session.commit()
+    experts = User.query.join(ExpertCategory).filter(ExpertCategory.category_id == category.id).all()
+    assert experts == [expert]
+    assert expert.expertise.first().category_name == "Wristwatches"
+
+    init_database.session.delete(category)
+    init_database.session.commit()
+    assert expert.expertise.count() == 0
+
+def test_expert_work_queue(init_database):
+    """Test the open request counter follows assignments and the queue orders by age or SLA."""
+    from app.work_queue import work_queue
+    seller = User(username="queue_seller", email="queue_seller@example.com")
+    expert = User(username="queue_expert", email="queue_expert@example.com", priority=UserPriority.EXPERT.value)
+    seller.set_password("password")
+    expert.set_password("password")
+    category = Category(name="Queue Category")
+    init_database.session.add_all([seller, expert, category])
+    init_database.session.flush()
+
+    now = datetime.utcnow()
+    requests = []
+    for number, (age, status) in enumerate([(30, AuthenticationStatus.PENDING), (10, AuthenticationStatus.SECOND_OPINION),
+                                            (20, AuthenticationStatus.PENDING)]):
+        item = Item(name=f"Queued {number}", minimum_price=10, current_price=10, seller_id=seller.id, category_id=category.id,
+                    status=ItemStatus.PENDING.value, end_time=now + timedelta(days=3))
+        init_database.session.add(item)
+        init_database.session.flush()
+        request = AuthenticationRequest(item_id=item.id, requester_id=seller.id, expert_id=expert.id,
+                                        status=status.value, created_at=now - timedelta(hours=age))
+        init_database.session.add(request)
+        requests.append(request)
+    init_database.session.commit()
+    assert expert.open_requests == 3
+
+    entries, total, pages = work_queue(expert, 'oldest')
+    assert [entry.item.name for entry in entries] == ["Queued 0", "Queued 2", "Queued 1"]
+    assert entries[0].category_name == "Queue Category"
+    assert entries[0].seller_name == "queue_seller"
+    assert (total, pages) == (3, 1)
+    # The second opinion is due 14 hours from now, before the first looks at 18 and 28 hours
+    entries, _, _ = work_queue(expert, 'sla')
+    assert [entry.item.name for entry in entries] == ["Queued 1", "Queued 0", "Queued 2"]
+    entries, _, pages = work_queue(expert, 'oldest', page=2, per_page=2)
+    assert [entry.item.name for entry in entries] == ["Queued 1"]
+    assert pages == 2
+
+    requests[0].status = AuthenticationStatus.APPROVED.value
+    requests[1].expert_id = None
+    init_database.session.commit()
+    init_database.session.refresh(expert)
+    assert expert.open_requests == 1
+    init_database.session.delete(requests[2])
+    init_database.session.commit()
+    init_database.session.refresh(expert)
+    assert expert.open_requests == 0
+
+def test_identity_cache(init_database):
+    """Test user snapshots are served from the cache and dropped when the user changes."""
+    from sqlalchemy import event, update, delete
+    from app.identity import load_identity
+    from app.user_admin import set_roles
+    user = User(username="cached_user", email="cached_user@example.com")
+    user.set_password("password")
+    init_database.session.add(user)
+    init_database.session.commit()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(init_database.engine, "before_cursor_execute", listener)
+    try:
+        assert load_identity(user.id).username == "cached_user"
+        queries = len(statements)
+        snapshot = load_identity(user.id)
+        assert snapshot.priority == UserPriority.GENERAL_USER.value
+        assert snapshot.unread_notifications == 0
+        # Only the identity version is read, not the user
+        assert len(statements) == queries + 1 and "identity_version" in statements[-1]
+    finally:
+        event.remove(init_database.engine, "before_cursor_execute", listener)
+
+    # Anything outside the snapshot, and any change, goes through the full row
+    assert snapshot.check_password("password")
+    snapshot.first_name = "Cache"
+    init_database.session.commit()
+    assert load_identity(user.id).first_name == "Cache"
+
+    # Name, email and password changes bump the version other workers check; counters do not
+    version = user.identity_version
+    user.email = "renamed@example.com"
+    init_database.session.commit()
+    user.set_password("new password")
+    init_database.session.commit()
+    assert user.identity_version == version + 2
+    user.open_requests = 3
+    init_database.session.commit()
+    assert user.identity_version == version + 2
+
+    set_roles([user.id], UserPriority.EXPERT.value)
+    assert load_identity(user.id).is_expert()
+
+    init_database.session.add(Notification(user_id=user.id, type="system", message="Hello"))
+    init_database.session.commit()
+    assert load_identity(user.id).unread_notifications == 1
+
+    # Another worker's role change or deletion never reaches this worker's cache, but takes effect at once
+    users, user_id = User.__table__, user.id
+    init_database.session.execute(update(users).where(users.c.id == user_id).values(
+        priority=UserPriority.GENERAL_USER.value, identity_version=users.c.identity_version + 1))
+    init_database.session.commit()
+    assert not load_identity(user_id).is_expert()
+    init_database.session.execute(delete(Notification.__table__).where(Notification.user_id == user_id))
+    init_database.session.execute(delete(users).where(users.c.id == user_id))
+    init_database.session.commit()
+    assert load_identity(user_id) is None
+
+def test_category_registry(init_database, monkeypatch):
+    """Test categories are served from the registry and reloaded when they change here or elsewhere."""
+    from sqlalchemy import event, insert, update
+    from app import versioning
+    from app.models import CacheVersion
+    from app.categories import category_registry, category_name, VERSION_KEY
+    clocks = Category(name="Clocks")
+    init_database.session.add_all([Category(name="art"), clocks])
+    init_database.session.commit()
+
+    assert category_registry().choices() == [(category_registry().by_name["art"].id, "art"), (clocks.id, "Clocks")]
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(init_database.engine, "before_cursor_execute", listener)
+    try:
+        assert category_name(clocks.id) == "Clocks"
+        assert category_name(None) == "Uncategorised"
+        assert statements == []
+    finally:
+        event.remove(init_database.engine, "before_cursor_execute", listener)
+
+    version = category_registry().version
+    init_database.session.delete(clocks)
+    init_database.session.commit()
+    assert category_registry().version != version
+    assert [category.name for category in category_registry()] == ["art"]
+
+    # A category added by another worker is seen at the next version check
+    assert init_database.session.get(CacheVersion, VERSION_KEY).token == category_registry().version
+    init_database.session.execute(insert(Category.__table__).values(name="Bronze"))
+    table = CacheVersion.__table__
+    init_database.session.execute(update(table).where(table.c.key == VERSION_KEY).values(token='elsewhere'))
+    init_database.session.commit()
+    assert [category.name for category in category_registry()] == ["art"]
+    monkeypatch.setattr(versioning, 'VERSION_CHECK_SECONDS', 0)
+    assert [category.name for category in category_registry()] == ["art", "Bronze"]
+    assert category_registry().version == 'elsewhere'
+
+def test_configuration_service(init_database, monkeypatch):
+    """Test settings are typed, defaulted and reloaded when another worker changes them."""
+    from sqlalchemy import event, update
+    from app import versioning
+    from app.models import CacheVersion
+    from app.configuration import configuration, fee_percentage, update_settings, VERSION_KEY
+    assert fee_percentage(authenticated=False) == 0.01
+    assert fee_percentage(authenticated=True) == 0.05
+
+    update_settings({'regular_fee_percentage': 0.02})
+    assert fee_percentage(authenticated=False) == 0.02
+    with pytest.raises(ValueError):
+        update_settings({'unknown_setting': 1})
+    with pytest.raises(ValueError):
+        update_settings({'authenticated_fee_percentage': 'lots'})
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(init_database.engine, "before_cursor_execute", listener)
+    try:
+        assert fee_percentage(authenticated=True) == 0.05
+        assert statements == []
+    finally:
+        event.remove(init_database.engine, "before_cursor_execute", listener)
+
+    # A change written by another worker is seen at the next version check
+    table = SystemConfiguration.__table__
+    init_database.session.execute(update(table).where(table.c.key == 'regular_fee_percentage').values(value='0.03'))
+    versions = CacheVersion.__table__
+    init_database.session.execute(update(versions).where(versions.c.key == VERSION_KEY).values(token='elsewhere'))
+    init_database.session.commit()
+    assert fee_percentage(authenticated=False) == 0.02
+    monkeypatch.setattr(versioning, 'VERSION_CHECK_SECONDS', 0)
+    assert fee_percentage(authenticated=False) == 0.03
+    assert configuration().version == 'elsewhere'
+
+def test_password_hash_parameters(app, init_database):
+    """Test passwords are hashed with the configured parameters and flagged for rehashing when they change."""
+    from app.passwords import needs_rehash
+    user = User(username="hashed_user", email="hashed_user@example.com")
+    user.set_password("password")
+    assert user.password_hash.startswith(app.config["PASSWORD_HASH_METHOD"] + "$")
+    assert not needs_rehash(user.password_hash)
+
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    assert needs_rehash(user.password_hash)
+    assert user.check_password("password")
+    assert not user.check_password("wrong")
+    user.set_password("password")
+    assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+    assert not needs_rehash(user.password_hash)
+    app.config["PASSWORD_SALT_LENGTH"] = 24
+    assert needs_rehash(user.password_hash)
+
+def test_password_hashing_uses_kdf_pool(app, monkeypatch):
+    """Test hashes, like checks, run on the bounded KDF pool rather than the request thread."""
+    import threading
+    from app import passwords
+    threads = []
+    real_hash = passwords.generate_password_hash
+
+    def generate_password_hash(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return real_hash(*args, **kwargs)
+
+    monkeypatch.setattr(passwords, "generate_password_hash", generate_password_hash)
+    password_hash = passwords.hash_password("password")
+    assert passwords.verify_password(password_hash, "password")
+    assert threads and threads[0].startswith("password-kdf")
+
+def test_provision_users(app, init_database):
+    """Test bulk user import validates set-wise and links experts to their categories."""
+    from io import StringIO
+    from app.provisioning import read_users_csv, provision_users
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    init_database.session.add(Category(name="Clocks"))
+    init_database.session.commit()
+    rows = read_users_csv(StringIO(
+        "username,email,password,first_name,role,categories\n"
+        "house_one,one@example.com,secret123,Ann,user,\n"
+        "house_expert,expert@example.com,secret123,,expert,clocks\n"
+        "testuser,taken@example.com,secret123,,user,\n"
+        "house_one,other@example.com,secret123,,user,\n"
+        "house_two,two@example.com,secret123,,user,Clocks\n"
+        "house_three,three@example.com,secret123,,expert,Lamps\n"
+    ))
+
+    report = provision_users(rows, processes=1, batch_size=1)
+    assert report['created'] == 2
+    assert report['expertise'] == 1
+    assert [line for line, _ in report['errors']] == [4, 5, 6, 7]
+
+    expert = User.query.filter_by(username="house_expert").one()
+    assert expert.is_expert()
+    assert expert.check_password("secret123")
+    assert [expertise.category_name for expertise in expert.expertise] == ["Clocks"]
+    assert User.query.filter_by(username="house_one").one().first_name == "Ann"
+
+def test_pay_for_item_once(init_database):
+    """Test paying for an item is idempotent and only open to its winner."""
+    from app.payments import pay_for_item
+    from app.models import DailyRevenue
+    seller = User(username="pay_seller", email="pay_seller@example.com")
+    buyer = User(username="pay_buyer", email="pay_buyer@example.com")
+    seller.set_password("password")
+    buyer.set_password("password")
+    init_database.session.add_all([seller, buyer])
+    init_database.session.flush()
+    item = Item(name="Paid Lamp", minimum_price=50.0, current_price=80.0, seller_id=seller.id, winner_id=buyer.id,
+                status=ItemStatus.PAYING.value, end_time=datetime.utcnow() - timedelta(hours=1))
+    init_database.session.add(item)
+    init_database.session.flush()
+    init_database.session.add(Bid(item_id=item.id, user_id=buyer.id, amount=80.0))
+    init_database.session.commit()
+
+    with pytest.raises(ValueError):
+        pay_for_item(item.id, seller.id)
+    payment, created = pay_for_item(item.id, buyer.id, "attempt-1")
+    assert created
+    assert payment.amount == 80.0 and payment.fee_amount == pytest.approx(0.8)
+    assert init_database.session.get(Item, item.id).status == ItemStatus.SOLD.value
+
+    assert pay_for_item(item.id, buyer.id, "attempt-1") == (payment, False)
+    assert pay_for_item(item.id, buyer.id, "attempt-2") == (payment, False)
+    assert pay_for_item(item.id, buyer.id) == (payment, False)
+    assert Payment.query.filter_by(item_id=item.id).count() == 1
+    assert Notification.query.filter_by(item_id=item.id, type="payment").count() == 2
+    assert init_database.session.get(DailyRevenue, payment.completed_at.date()).payment_count == 1
+
+def test_pay_for_item_concurrently(app, init_database):
+    """Test parallel payment attempts at the same item create one payment."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.payments import pay_for_item
+    seller = User(username="race_seller", email="race_seller@example.com")
+    buyer = User(username="race_buyer", email="race_buyer@example.com")
+    seller.set_password("password")
+    buyer.set_password("password")
+    init_database.session.add_all([seller, buyer])
+    init_database.session.flush()
+    item = Item(name="Contested Vase", minimum_price=10.0, current_price=25.0, seller_id=seller.id, winner_id=buyer.id,
+                status=ItemStatus.PAYING.value, end_time=datetime.utcnow() - timedelta(hours=1))
+    init_database.session.add(item)
+    init_database.session.commit()
+    item_id, buyer_id = item.id, buyer.id
+
+    keys = [None] * 4 + [f"race-{number}" for number in range(4)] + ["race-0"] * 2
+    start = threading.Barrier(len(keys))
+    def attempt(key):
+        with app.app_context():
+            start.wait()
+            payment, created = pay_for_item(item_id, buyer_id, key)
+            return payment.id, created
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+        results = list(pool.map(attempt, keys))
+    assert [created for _, created in results].count(True) == 1
+    assert len({payment_id for payment_id, _ in results}) == 1
+    assert Payment.query.filter_by(item_id=item_id).count() == 1
+    assert Notification.query.filter_by(item_id=item_id, type="payment").count() == 2
+    assert init_database.session.get(User, seller.id).unread_notifications == 1
+
+def test_pay_for_items_checkout(init_database):
+    """Test a basket checkout pays every claimable item in one transaction."""
+    from app.payments import pay_for_items
+    from app.models import DailyRevenue, PerformanceStats
+    seller = User(username="basket_seller", email="basket_seller@example.com")
+    buyer = User(username="basket_buyer", email="basket_buyer@example.com")
+    seller.set_password("password")
+    buyer.set_password("password")
+    init_database.session.add_all([seller, buyer])
+    init_database.session.flush()
+    items = [Item(name=f"Basket item {number}", minimum_price=10.0, current_price=price, seller_id=seller.id,
+                  winner_id=buyer.id, is_authenticated=authenticated, status=status,
+                  end_time=datetime.utcnow() - timedelta(hours=1))
+             for number, (price, authenticated, status) in enumerate([
+                 (100.0, False, ItemStatus.PAYING.value), (200.0, True, ItemStatus.PAYING.value),
+                 (50.0, False, ItemStatus.SOLD.value)])]
+    init_database.session.add_all(items)
+    init_database.session.flush()
+    init_database.session.add(Bid(item_id=items[0].id, user_id=buyer.id, amount=100.0))
+    init_database.session.commit()
+
+    payments, skipped = pay_for_items([item.id for item in items] + [items[0].id], buyer.id)
+    assert sorted((payment.item_id, payment.amount, payment.fee_amount) for payment in payments) == [
+        (items[0].id, 100.0, 1.0), (items[1].id, 200.0, 10.0)]
+    assert skipped == [items[2].id]
+    assert {item.status for item in Item.query.filter(Item.id.in_([items[0].id, items[1].id]))} == {ItemStatus.SOLD.value}
+    assert init_database.session.get(User, buyer.id).unread_notifications == 2
+    assert init_database.session.get(User, seller.id).unread_notifications == 2
+    assert init_database.session.get(DailyRevenue, payments[0].completed_at.date()).payment_count == 2
+    stats = init_database.session.get(PerformanceStats, ('seller', seller.id))
+    assert stats.fees_total == 11.0 and stats.authenticated_fees_total == 10.0
+
+    assert pay_for_items([items[0].id], buyer.id) == ([], [items[0].id])
+
+def test_seller_ledger(init_database):
+    """Test payments post to the seller ledger and balances read from snapshots."""
+    from app.payments import pay_for_items
+    from app.models import LedgerEntry, LedgerSnapshot
+    from app.ledger import seller_balance, statement, record_payout, snapshot_balances
+    seller = User(username="ledger_seller", email="ledger_seller@example.com")
+    buyer = User(username="ledger_buyer", email="ledger_buyer@example.com")
+    seller.set_password("password")
+    buyer.set_password("password")
+    init_database.session.add_all([seller, buyer])
+    init_database.session.flush()
+    items = [Item(name=f"Ledger item {number}", minimum_price=10.0, current_price=100.0, seller_id=seller.id,
+                  winner_id=buyer.id, status=ItemStatus.PAYING.value, end_time=datetime.utcnow())
+             for number in range(2)]
+    init_database.session.add_all(items)
+    init_database.session.commit()
+
+    pay_for_items([item.id for item in items], buyer.id)
+    assert seller_balance(seller.id).balance == pytest.approx(198.0)
+    payout = record_payout(seller.id, 150.0, "Bank transfer")
+    assert (payout.amount, payout.description) == (-150.0, "Bank transfer") and payout.created_at is not None
+    # The balance is checked in the insert itself, so a payout that would overdraw writes nothing
+    with pytest.raises(ValueError):
+        record_payout(seller.id, 100.0)
+    assert LedgerEntry.query.filter_by(seller_id=seller.id, kind="payout").count() == 1
+
+    assert snapshot_balances(min_entries=1, settle=timedelta(0)) == 1
+    record_payout(seller.id, 8.0)
+    balance = seller_balance(seller.id)
+    assert balance.balance == pytest.approx(40.0)
+    assert (balance.sales_total, balance.fees_total, balance.payouts_total) == pytest.approx((200.0, 2.0, 158.0))
+    assert LedgerSnapshot.query.filter_by(seller_id=seller.id).one().balance == pytest.approx(48.0)
+    assert snapshot_balances(min_entries=2, settle=timedelta(0)) == 0
+
+    lines = statement(seller.id)
+    assert [line.entry.kind for line in lines] == ["payout", "payout", "fee", "sale", "fee", "sale"]
+    assert lines[0].balance == pytest.approx(40.0) and lines[-1].balance == pytest.approx(100.0)
+
+    entry = LedgerEntry.query.filter_by(seller_id=seller.id, kind="sale").first()
+    entry.amount = 1000.0
+    with pytest.raises(ValueError):
+        init_database.session.commit()
+    init_database.session.rollback()
+
+def test_money_stored_as_pence(init_database):
+    """Test money is stored as integer pence and totalled exactly."""
+    from datetime import date
+    from decimal import Decimal
+    from sqlalchemy import text
+    from app.money import to_pence, from_pence, apply_rate
+    from app.reports import record_payments, revenue_series, payment_report
+    assert [to_pence(value) for value in (0.1, Decimal("2.675"), "1.005", 3)] == [10, 268, 101, 300]
+    assert from_pence(170) == 1.7 and apply_rate(123.45, 0.05) == 6.17
+
+    seller = User(username="pence_seller", email="pence_seller@example.com")
+    seller.set_password("password")
+    init_database.session.add(seller)
+    init_database.session.flush()
+    items = [Item(name=f"Penny item {number}", minimum_price=Decimal("0.10"), current_price=0.1,
+                  seller_id=seller.id, end_time=datetime(2025, 3, 1)) for number in range(30)]
+    init_database.session.add_all(items)
+    init_database.session.flush()
+    payments = [Payment(item_id=item.id, buyer_id=seller.id, seller_id=seller.id, amount=0.1, fee_percentage=0.1,
+                        fee_amount=0.01, status="completed", completed_at=datetime(2025, 3, 3, 12)) for item in items]
+    init_database.session.add_all(payments)
+    init_database.session.flush()
+    record_payments(payments)
+    init_database.session.commit()
+
+    stored = init_database.session.execute(
+        text("SELECT minimum_price, current_price FROM items WHERE id = :id"), {"id": items[0].id}
+    ).one()
+    assert tuple(stored) == (10, 10)
+    assert init_database.session.get(Item, items[0].id).current_price == 0.1
+    # Thirty 10p payments total exactly £3, which summing floats does not
+    assert sum([0.1] * 30) != 3.0
+    series = revenue_series(date(2025, 3, 2), 3)
+    assert series["revenue"] == [0.0, 3.0, 0.0] and series["total_revenue"] == 3.0 and series["total_fees"] == 0.3
+    report = payment_report(date(2025, 3, 1), date(2025, 3, 31), 'month')
+    assert (report["total_payments"], report["total_revenue"], report["total_fees"]) == (30, 3.0, 0.3)
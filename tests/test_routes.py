@@ -1,7 +1,7 @@
 import pytest
 from app import db
 from flask import url_for
-from app.models import User, Item, ItemStatus, Notification, Bid, Category
+from app.models import User, Item, ItemStatus, Notification, Bid, Category, UserPriority, SystemConfiguration
 from datetime import datetime, timedelta
 
 def test_welcome_page(client):
@@ -46,6 +46,21 @@ def test_login_logout(client, init_database):
     response = client.get(url_for("views.logout"), follow_redirects=True)
     assert response.status_code == 200
 
+def test_login_rehashes_password(client, app, init_database):
+    """ Test logging in upgrades a password hashed with old parameters """
+    user = User(username="old_hash_user", email="old_hash@example.com")
+    user.set_password("password123")
+    db.session.add(user)
+    db.session.commit()
+
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    client.post(url_for("views.login"), data={"username": "old_hash_user", "password": "wrong"})
+    assert not db.session.get(User, user.id).password_hash.startswith("pbkdf2:")
+    client.post(url_for("views.login"), data={"username": "old_hash_user", "password": "password123"})
+    user = db.session.get(User, user.id)
+    assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+    assert user.check_password("password123")
+
 def test_list_item(authenticated_client, init_database):
     """ Test listing an auction item """
     category = Category(name="Art", description="Artwork and paintings")
@@ -166,6 +181,100 @@ def test_place_bid(authenticated_client, init_database):
     item = Item.query.get(item.id)
     assert item.current_price == 120  # Ensure bid updated price
 
+def test_minimum_bid_in_pence(authenticated_client, init_database):
+    """ Test the 10% minimum raise is worked out in whole pence """
+    seller = User(username="pence_bid_seller", email="pence_bid_seller@example.com")
+    seller.set_password("password")
+    db.session.add(seller)
+    db.session.commit()
+    item = Item(name="Penny Whistle", description="A tin whistle", minimum_price=1.01, current_price=1.01,
+                seller_id=seller.id, status=ItemStatus.ACTIVE.value, end_time=datetime.utcnow() + timedelta(days=1))
+    db.session.add(item)
+    db.session.commit()
+
+    url = url_for("views.auction_detail", item_id=item.id)
+    response = authenticated_client.post(url, data={"bid_amount": "1.11"}, follow_redirects=True)
+    assert "Bid must be at least £1.12".encode() in response.data
+    response = authenticated_client.post(url, data={"bid_amount": "1.12"}, follow_redirects=True)
+    assert b"Bid placed successfully" in response.data
+    assert db.session.get(Item, item.id).current_price == 1.12
+
+def test_watch_and_unwatch(authenticated_client, init_database):
+    """ Test watching an auction from its page """
+    seller = User(username="watched_seller", email="watched_seller@example.com")
+    seller.set_password("password")
+    db.session.add(seller)
+    db.session.commit()
+    item = Item(name="Silver Spoon", description="A polished spoon", minimum_price=10.0, current_price=10.0, seller_id=seller.id,
+                status=ItemStatus.ACTIVE.value, end_time=datetime.utcnow() + timedelta(days=1))
+    db.session.add(item)
+    db.session.commit()
+
+    response = authenticated_client.post(url_for("views.watch_item", item_id=item.id), follow_redirects=True)
+    assert b"Unwatch Auction" in response.data
+    assert db.session.get(Item, item.id).watcher_count == 1
+    assert b"Silver Spoon" in authenticated_client.get(url_for("views.watching")).data
+
+    response = authenticated_client.post(url_for("views.unwatch_item", item_id=item.id), follow_redirects=True)
+    assert b"Watch Auction" in response.data and b"Unwatch Auction" not in response.data
+    assert db.session.get(Item, item.id).watcher_count == 0
+
+def test_process_payment_twice(authenticated_client, init_database):
+    """ Test repeating a payment request does not pay twice """
+    from app.models import Payment
+    buyer = User.query.filter_by(username="testuser2").first()
+    seller = User(username="paid_seller", email="paid_seller@example.com")
+    seller.set_password("password")
+    db.session.add(seller)
+    db.session.commit()
+    item = Item(name="Brass Bell", minimum_price=10.0, current_price=30.0, seller_id=seller.id, winner_id=buyer.id,
+                status=ItemStatus.PAYING.value, end_time=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(item)
+    db.session.commit()
+
+    response = authenticated_client.get(url_for("views.process_payment", item_id=item.id, key="retry"), follow_redirects=True)
+    assert b"Payment processed successfully" in response.data
+    response = authenticated_client.get(url_for("views.process_payment", item_id=item.id, key="retry"), follow_redirects=True)
+    assert b"already been paid for" in response.data
+    assert Payment.query.filter_by(item_id=item.id).count() == 1
+
+def test_basket_checkout(authenticated_client, init_database):
+    """ Test paying for several basket items at once """
+    from app.models import Payment
+    buyer = User.query.filter_by(username="testuser2").first()
+    seller = User(username="checkout_seller", email="checkout_seller@example.com")
+    seller.set_password("password")
+    db.session.add(seller)
+    db.session.commit()
+    items = [Item(name=f"Checkout item {number}", minimum_price=10.0, current_price=20.0, seller_id=seller.id,
+                  winner_id=buyer.id, status=ItemStatus.PAYING.value, end_time=datetime.utcnow() - timedelta(hours=1))
+             for number in range(3)]
+    db.session.add_all(items)
+    db.session.commit()
+    item_ids = [item.id for item in items]
+
+    response = authenticated_client.post(url_for("views.checkout"), data={"item_ids": item_ids}, follow_redirects=True)
+    assert b"Save your card details" in response.data
+    buyer.card_number_hash, buyer.card_expiry = "hashed", "12/30"
+    db.session.commit()
+    response = authenticated_client.post(url_for("views.checkout"), data={"item_ids": item_ids[:2]}, follow_redirects=True)
+    assert b"for 2 items" in response.data
+    assert b"Checkout item 2" in response.data and b"Checkout item 0" not in response.data
+    assert Payment.query.filter(Payment.item_id.in_(item_ids)).count() == 2
+
+def test_my_auctions_shows_earnings(authenticated_client, init_database):
+    """ Test sellers see their ledger balance and statement """
+    from app.models import LedgerEntry
+    seller = User.query.filter_by(username="testuser2").first()
+    db.session.add_all([LedgerEntry(seller_id=seller.id, kind="sale", amount=120.0, description="Sale of Tin Robot"),
+                        LedgerEntry(seller_id=seller.id, kind="fee", amount=-1.2)])
+    db.session.commit()
+
+    response = authenticated_client.get(url_for("views.my_auctions"))
+    assert response.status_code == 200
+    assert b"Sale of Tin Robot" in response.data
+    assert b"\xc2\xa3118.80" in response.data
+
 def test_notifications(authenticated_client, init_database):
     """ Test viewing user notifications """
     user = User.query.filter_by(username="testuser2").first()
@@ -177,3 +286,290 @@ def test_notifications(authenticated_client, init_database):
     assert response.status_code == 200
     assert b"You have been outbid" in response.data
 
+
+def test_notifications_paginated(authenticated_client, init_database):
+    """ Test notifications are listed newest first, one page at a time """
+    user = User.query.filter_by(username="testuser2").first()
+    now = datetime.utcnow()
+    for i in range(25):
+        db.session.add(Notification(user_id=user.id, type="outbid", message=f"Message number {i:02d}", created_at=now + timedelta(seconds=i)))
+    db.session.commit()
+
+    response = authenticated_client.get(url_for("views.notifications"))
+    assert b"Message number 24" in response.data
+    assert b"Message number 04" not in response.data
+    assert b"Page 1 of 2" in response.data
+
+    response = authenticated_client.get(url_for("views.notifications", page=2))
+    assert b"Message number 04" in response.data
+    assert b"Message number 24" not in response.data
+
+def test_mark_all_notifications_read(authenticated_client, init_database):
+    """ Test the navbar badge and bulk mark-as-read """
+    user = User.query.filter_by(username="testuser2").first()
+    db.session.add_all([Notification(user_id=user.id, type="outbid", message="Unread one"),
+                        Notification(user_id=user.id, type="outbid", message="Unread two")])
+    db.session.commit()
+
+    response = authenticated_client.get(url_for("views.home"))
+    assert b'<span class="badge rounded-pill bg-danger">2</span>' in response.data
+
+    response = authenticated_client.post(url_for("views.mark_notifications_read"), follow_redirects=True)
+    assert response.status_code == 200
+    assert b"All notifications marked as read" in response.data
+    assert Notification.query.filter_by(user_id=user.id, is_read=False).count() == 0
+    assert User.query.filter_by(username="testuser2").first().unread_notifications == 0
+
+def test_outbid_notifications_coalesced(authenticated_client, init_database):
+    """ Test repeated outbids on the same item update one unread notification """
+    seller = User(username="seller_user", email="seller@example.com")
+    rival = User(username="rival_user", email="rival@example.com")
+    seller.set_password("password")
+    rival.set_password("password")
+    db.session.add_all([seller, rival])
+    db.session.commit()
+
+    item = Item(name="Contested Watch",
+        description="A much wanted watch",
+        minimum_price=100.0,
+        current_price=100.0,
+        seller_id=seller.id,
+        status=ItemStatus.ACTIVE.value,
+        start_time=datetime.utcnow(),
+        end_time=datetime.utcnow() + timedelta(days=5)
+    )
+    db.session.add(item)
+    db.session.commit()
+
+    for amount in [120, 150]:
+        db.session.add(Bid(item_id=item.id, user_id=rival.id, amount=amount - 10))
+        db.session.commit()
+        authenticated_client.post(url_for("views.auction_detail", item_id=item.id), data={"bid_amount": amount}, follow_redirects=True)
+
+    outbids = Notification.query.filter_by(user_id=rival.id, item_id=item.id, type="outbid").all()
+    assert len(outbids) == 1
+    assert outbids[0].occurrences == 2
+    assert "£150.00" in outbids[0].message
+    assert User.query.get(rival.id).unread_notifications == 1
+
+def login_as_manager(client):
+    manager = User(username="manager_user", email="manager@example.com", priority=UserPriority.MANAGER.value)
+    manager.set_password("password123")
+    db.session.add(manager)
+    db.session.commit()
+    client.post(url_for("views.login"), data={"username": "manager_user", "password": "password123"})
+    return manager
+
+def test_configure_fees(client, init_database):
+    """ Test managers can change the fees charged on payments """
+    from app.configuration import fee_percentage
+    manager = login_as_manager(client)
+    response = client.get(url_for("views.configure_fees"))
+    assert b'value="1.00"' in response.data
+
+    client.post(url_for("views.configure_fees"), data={"default_fee": "2", "expert_fee": "7.5"})
+    assert fee_percentage(authenticated=False) == 0.02
+    assert fee_percentage(authenticated=True) == 0.075
+    assert SystemConfiguration.query.filter_by(key="regular_fee_percentage").first().updated_by == manager.id
+
+def test_weekly_costs_uses_rollup(client, init_database):
+    """ Test the weekly costs page, its JSON data and its cached SVG chart """
+    from app.models import Payment
+    from app.reports import record_payment
+    login_as_manager(client)
+    payment = Payment(item_id=1, buyer_id=1, seller_id=1, amount=200.0, fee_percentage=0.05,
+                      fee_amount=10.0, status="completed", completed_at=datetime.utcnow())
+    db.session.add(payment)
+    record_payment(payment)
+    db.session.commit()
+
+    response = client.get(url_for("views.weekly_costs"))
+    assert response.status_code == 200
+    assert b"Total sales revenue: \xc2\xa3200.00" in response.data
+    assert b"Percentage earnings: 5.00%" in response.data
+
+    data = client.get(url_for("views.weekly_costs_data")).get_json()
+    assert len(data["days"]) == 8
+    assert data["revenue"][-1] == 200.0
+    assert data["fees"][-1] == 10.0
+
+    chart = client.get(url_for("views.weekly_costs_chart"))
+    assert chart.mimetype == "image/svg+xml"
+    assert client.get(url_for("views.weekly_costs_chart")).data == chart.data
+
+def test_weekly_costs_paginates_payments(client, init_database):
+    """ Test the weekly costs page lists one page of payments at a time, newest first """
+    from app.models import Payment
+    from app.reports import payment_page, PAYMENTS_PER_PAGE
+    login_as_manager(client)
+    now = datetime.utcnow()
+    db.session.add_all([Payment(item_id=1000 + minutes, buyer_id=1, seller_id=1, amount=float(minutes + 1), fee_percentage=0.05,
+                                fee_amount=0.05, status="completed", completed_at=now - timedelta(minutes=minutes))
+                        for minutes in range(PAYMENTS_PER_PAGE + 1)])
+    db.session.commit()
+
+    first = payment_page(now - timedelta(days=7))
+    assert len(first.items) == PAYMENTS_PER_PAGE
+    assert first.items[0].amount == 1.0
+    assert first.pages == 2
+    assert [payment.amount for payment in payment_page(now - timedelta(days=7), page=2).items] == [PAYMENTS_PER_PAGE + 1.0]
+
+    response = client.get(url_for("views.weekly_costs"))
+    assert response.status_code == 200
+    assert b"Page 1 of 2" in response.data
+    assert b"Download all payments (CSV)" in response.data
+
+def test_weekly_costs_data_requires_manager(authenticated_client, init_database):
+    """ Test non-managers cannot read financial data """
+    response = authenticated_client.get(url_for("views.weekly_costs_data"))
+    assert response.status_code == 403
+
+def test_financial_report(client, init_database):
+    """ Test managers can run reports over any date range as a page or JSON """
+    from app.models import Payment
+    login_as_manager(client)
+    db.session.add(Payment(item_id=1, buyer_id=1, seller_id=1, amount=80.0, fee_percentage=0.01,
+                           fee_amount=0.8, status="completed", completed_at=datetime(2024, 6, 15, 12)))
+    db.session.commit()
+
+    response = client.get(url_for("views.financial_report"))
+    assert response.status_code == 200
+
+    query = {"start": "2024-01-01", "end": "2024-12-31", "group_by": "month"}
+    response = client.get(url_for("views.financial_report", **query))
+    assert b"2024-06" in response.data
+    assert b"Total sales revenue: \xc2\xa380.00" in response.data
+
+    data = client.get(url_for("views.financial_report", format="json", **query)).get_json()
+    assert data["rows"] == [{"key": "2024-06", "payments": 1, "revenue": 80.0, "fees": 0.8}]
+
+    response = client.get(url_for("views.financial_report", format="json", start="2024-12-31", end="2024-01-01", group_by="day"))
+    assert response.status_code == 400
+
+def test_streamed_exports(client, init_database):
+    """ Test tables are exported as streamed CSV and NDJSON """
+    import csv, io, json
+    login_as_manager(client)
+    db.session.add_all([Bid(item_id=1, user_id=1, amount=10.0 + i) for i in range(3)])
+    db.session.commit()
+
+    response = client.get(url_for("views.export_data", name="bids", format="csv"))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ["id", "item_id", "user_id", "amount", "created_at"]
+    assert [row[3] for row in rows[1:]] == ["10.0", "11.0", "12.0"]
+
+    response = client.get(url_for("views.export_data", name="items", format="ndjson"))
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[0]["name"] == "Vintage Clock"
+    assert lines[0]["end_time"] == "2025-03-02T23:59:59"
+
+    assert client.get(url_for("views.export_data", name="users", format="csv")).status_code == 404
+
+def test_manager_dashboard_query_count(client, init_database):
+    """ Test the manager dashboard issues the same number of queries however many experts there are """
+    from sqlalchemy import event
+    from app.models import ExpertCategory, ExpertAvailability
+    login_as_manager(client)
+
+    def add_experts(start, count):
+        now = datetime.utcnow()
+        for number in range(start, start + count):
+            expert = User(username=f"roster_expert{number}", email=f"roster_expert{number}@example.com",
+                          priority=UserPriority.EXPERT.value)
+            expert.set_password("password123")
+            db.session.add(expert)
+            db.session.flush()
+            db.session.add_all([
+                ExpertCategory(user_id=expert.id, category="Art"),
+                ExpertCategory(user_id=expert.id, category="Clocks"),
+                ExpertAvailability(user_id=expert.id, day_of_week="Monday",
+                                   start_time=now - timedelta(hours=1) if number % 2 else now + timedelta(days=1),
+                                   end_time=now + timedelta(hours=1) if number % 2 else now + timedelta(days=1, hours=2)),
+            ])
+        db.session.commit()
+
+    def dashboard_queries():
+        client.get(url_for("views.manager"))  # load the per-process caches first
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(url_for("views.manager"))
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        assert response.status_code == 200
+        return response, len(statements)
+
+    add_experts(0, 2)
+    response, few = dashboard_queries()
+    assert b"roster_expert1" in response.data
+    assert b"Art, Clocks" in response.data
+    add_experts(2, 10)
+    response, many = dashboard_queries()
+    assert b"roster_expert11" in response.data
+    assert many == few
+
+def test_manage_users_search_and_bulk_roles(client, init_database):
+    """ Test user administration pages by keyset, filters by prefix and role, and changes roles in bulk """
+    from app.user_admin import user_page
+    manager = login_as_manager(client)
+    users = [User(username=f"Member{number:02d}", email=f"member{number:02d}@example.com") for number in range(5)]
+    users.append(User(username="zed", email="member_zed@example.com", priority=UserPriority.EXPERT.value))
+    for user in users:
+        user.set_password("password123")
+    db.session.add_all(users)
+    db.session.commit()
+
+    first, after = user_page(search="mem", per_page=3)
+    assert [user.username for user in first] == ["Member00", "Member01", "Member02"]
+    second, after = user_page(search="mem", after=after, per_page=3)
+    assert [user.username for user in second] == ["Member03", "Member04", "zed"]
+    assert after is None
+    assert [user.username for user in user_page(search="MEMBER_Z")[0]] == ["zed"]
+    assert [user.username for user in user_page(role=UserPriority.MANAGER.value)[0]] == [manager.username]
+
+    response = client.get(url_for("views.manage_users", q="member0", role=UserPriority.GENERAL_USER.value))
+    assert response.status_code == 200
+    assert b"Member04" in response.data
+    assert b"zed" not in response.data
+
+    response = client.post(url_for("views.manage_users"), data={
+        "user_ids": [users[0].id, users[1].id], "new_role": UserPriority.EXPERT.value
+    })
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert [user.priority for user in users[:3]] == [UserPriority.EXPERT.value, UserPriority.EXPERT.value, UserPriority.GENERAL_USER.value]
+
+    client.post(url_for("views.manage_users"), data={"user_id": users[2].id, "new_role": UserPriority.MANAGER.value})
+    db.session.expire_all()
+    assert users[2].priority == UserPriority.MANAGER.value
+
+def test_expert_work_queue_pages(client, init_database):
+    """ Test the expert page and its JSON queue show joined names and reject other roles """
+    from app.models import AuthenticationRequest
+    expert = User(username="queue_page_expert", email="queue_page_expert@example.com", priority=UserPriority.EXPERT.value)
+    expert.set_password("password123")
+    category = Category(name="Queue Clocks")
+    db.session.add_all([expert, category])
+    db.session.flush()
+    item = Item.query.first()
+    item.category_id = category.id
+    db.session.add(AuthenticationRequest(item_id=item.id, requester_id=item.seller_id, expert_id=expert.id))
+    db.session.commit()
+    client.post(url_for("views.login"), data={"username": "queue_page_expert", "password": "password123"})
+
+    response = client.get(url_for("views.expert", order="sla"))
+    assert response.status_code == 200
+    assert b"Queue Clocks" in response.data
+    assert b"testuser" in response.data
+
+    data = client.get(url_for("views.expert_queue_data", order="sla")).get_json()
+    assert data["total"] == 1
+    assert data["entries"][0]["category"] == "Queue Clocks"
+    assert data["entries"][0]["seller"] == "testuser"
+    assert data["entries"][0]["status"] == "pending"
+    assert 47 * 3600 < data["entries"][0]["seconds_remaining"] <= 48 * 3600
+    assert client.get(url_for("views.expert_queue_data", order="random")).status_code == 400